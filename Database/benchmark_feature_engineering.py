@@ -0,0 +1,108 @@
+"""
+Measure how fast the plant_features table is made from a large, synthetic plant_raw_data table:
+- feature_engineering.make_features_notebook: the for loops of Step2_Feature_Engineering.ipynb.
+- feature_engineering.make_features: vectorised, whole table in memory.
+- feature_engineering.build_features: vectorised, read from and written to SQLite in chunks.
+The outputs of the notebook and vectorised versions are checked to be the same.
+
+The synthetic plants are made by sampling each column of the real plant_raw_data table.
+
+Run from the top directory of the repository:
+python Database/benchmark_feature_engineering.py --n_plants 1000000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from feature_engineering import (CHUNK_SIZE, FEATURE_COLUMNS, apply_manual_fixes, build_features,
+                                 make_features, make_features_notebook)
+
+DATABASE_LOC = "Database/house_plants.db"
+
+
+def make_synthetic_raw_data(raw_df: pd.DataFrame, n_plants: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Make a plant_raw_data table of synthetic plants, each column sampled (independently) from a real one.
+
+    Parameters
+    ----------
+    raw_df : pd.DataFrame
+        The real plant_raw_data table.
+
+    n_plants : int
+        Number of plants to make.
+
+    seed : int
+        Random seed.
+
+    Returns
+    -------
+    pd.DataFrame
+        The synthetic plant_raw_data table.
+    """
+    rng = np.random.default_rng(seed)
+    # sample from the fixed values, so the notebook version (which has no error handling) can run.
+    raw_df = apply_manual_fixes(raw_df)
+    synthetic_df = pd.DataFrame({"Plant_Name": [f"Synthetic plant {idx}" for idx in range(n_plants)]})
+    for column in raw_df.columns[1:]:
+        synthetic_df[column] = raw_df[column].to_numpy()[rng.integers(0, len(raw_df), n_plants)]
+    return synthetic_df
+
+
+def time_it(function, *args, **kwargs) -> tuple:
+    """Output of the function and the seconds it took."""
+    start = time.perf_counter()
+    output = function(*args, **kwargs)
+    return output, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Benchmark making the plant_features table from a large synthetic plant_raw_data table."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database (the real plant_raw_data table is sampled from).")
+    parser.add_argument("--n_plants", type=int, default=1000000,
+                        help="Number of synthetic plants.")
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE,
+                        help="Number of plants read/written at a time by build_features.")
+    parser.add_argument("--skip_notebook", action="store_true",
+                        help="Do not time the (slow) notebook version.")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.database)
+    raw_df = pd.read_sql_query("SELECT * FROM plant_raw_data", conn)
+    conn.close()
+
+    synthetic_df = make_synthetic_raw_data(raw_df, n_plants=args.n_plants)
+    print(f"Number of synthetic plants: {len(synthetic_df)}")
+
+    vectorised_df, vectorised_seconds = time_it(make_features, synthetic_df)
+    print(f"make_features (vectorised):      {vectorised_seconds:7.2f}s "
+          f"({len(synthetic_df) / vectorised_seconds:12,.0f} plants/s)")
+
+    if not args.skip_notebook:
+        notebook_df, notebook_seconds = time_it(make_features_notebook, synthetic_df)
+        print(f"make_features_notebook (loops):  {notebook_seconds:7.2f}s "
+              f"({len(synthetic_df) / notebook_seconds:12,.0f} plants/s)")
+        same = notebook_df[FEATURE_COLUMNS].equals(vectorised_df[FEATURE_COLUMNS])
+        print(f"Outputs the same: {same}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_database = os.path.join(tmp_dir, "benchmark.db")
+        conn = sqlite3.connect(tmp_database)
+        synthetic_df.to_sql("plant_raw_data", con=conn, index=False)
+        conn.commit()
+
+        n_plants, stream_seconds = time_it(build_features, conn, chunk_size=args.chunk_size)
+        print(f"build_features (SQLite, chunks): {stream_seconds:7.2f}s "
+              f"({n_plants / stream_seconds:12,.0f} plants/s, chunks of {args.chunk_size})")
+
+        saved_df = pd.read_sql_query("SELECT * FROM plant_features", conn)
+        print(f"Saved table the same: {saved_df.equals(vectorised_df)}")
+        conn.close()
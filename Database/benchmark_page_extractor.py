@@ -0,0 +1,156 @@
+"""
+Compare the speed of the two ways of extracting the plant details from a missouribotanicalgarden.org webpage:
+get_plant_details.parse_soup_plant_page (BeautifulSoup, the original) and
+page_extractor.extract_plant_page (lxml, single pass).
+
+Both are run over the same saved webpages, either a folder of .html files or the webpages
+in the download cache (see: http_cache.py), and their outputs are checked to be the same.
+
+Run from the top folder of the repo, e.g.:
+python Database/benchmark_page_extractor.py --pages_dir path/to/saved/pages
+or with webpages made in the same layout (see: generate_page_fixtures.py):
+python Database/generate_page_fixtures.py
+python Database/benchmark_page_extractor.py --pages_dir Database/benchmark_pages
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import time
+from typing import Tuple
+
+from get_plant_details import parse_soup_plant_page
+from http_cache import CACHE_DIR, HTTPCache
+from page_extractor import extract_plant_page
+
+PLANT_PAGE_URL = "PlantFinderDetails"
+
+
+def load_pages(pages_dir: str = None, cache_dir: str = CACHE_DIR) -> dict:
+    """
+    Read the webpages to benchmark with.
+
+    Parameters
+    ----------
+    pages_dir : str
+        Folder of saved webpages (.html files). If None, the plant webpages in the download cache are used.
+
+    cache_dir : str
+        Folder of the download cache.
+
+    Returns
+    -------
+    dict
+        Keys are the file names (or URLs) and values the HTML of each webpage.
+    """
+    pages = {}
+    if pages_dir is not None:
+        for file_path in sorted(glob.glob(os.path.join(pages_dir, "*.htm*"))):
+            with open(file_path, "rb") as handler:
+                pages[os.path.basename(file_path)] = handler.read()
+        return pages
+
+    if not os.path.exists(os.path.join(cache_dir, "index.db")):
+        return pages
+    cache = HTTPCache(cache_dir, offline=True)
+    conn = sqlite3.connect(os.path.join(cache_dir, "index.db"))
+    c = conn.cursor()
+    c.execute("""SELECT Url FROM responses WHERE Url LIKE ?""", (f"%{PLANT_PAGE_URL}%",))
+    for (url,) in c.fetchall():
+        entry = cache.lookup(url)
+        if entry is not None:
+            pages[url] = cache.replay(entry).content
+    conn.close()
+    return pages
+
+
+def check_same_output(pages: dict) -> Tuple[list, list]:
+    """
+    Check both functions give the same output for every page.
+
+    Parameters
+    ----------
+    pages : dict
+        Output of load_pages.
+
+    Returns
+    -------
+    list
+        Names of the pages where the outputs differ.
+
+    list
+        Names of the pages the original function fails on (not compared).
+    """
+    different, skipped = [], []
+    for name, content in pages.items():
+        try:
+            expected = parse_soup_plant_page(content)
+        except Exception as error:  # the original can fail on malformed pages, nothing to compare to.
+            print(f"Skipped (original failed with {error!r}): {name}")
+            skipped.append(name)
+            continue
+        if extract_plant_page(content) != expected:
+            different.append(name)
+    return different, skipped
+
+
+def pages_per_second(parse, pages: dict, repeats: int = 3) -> float:
+    """
+    Time a function over all pages, best of several repeats.
+
+    Parameters
+    ----------
+    parse : Callable
+        Called with the HTML of each page.
+
+    pages : dict
+        Output of load_pages.
+
+    repeats : int
+        Number of times to time the function.
+
+    Returns
+    -------
+    float
+        Number of pages parsed per second.
+    """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for content in pages.values():
+            try:
+                parse(content)
+            except Exception:  # see: check_same_output
+                pass
+        best = min(best, time.perf_counter() - start)
+    return len(pages) / best
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Benchmark the extraction of plant details from saved webpages."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--pages_dir", type=str, default=None,
+                        help="Folder of saved webpages (.html), default is the webpages in the download cache.")
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR,
+                        help="Folder of the download cache.")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Number of times to time each function (the best is kept).")
+    args = parser.parse_args()
+
+    pages = load_pages(pages_dir=args.pages_dir, cache_dir=args.cache_dir)
+    if not pages:
+        raise SystemExit("No webpages found, run get_plant_details.py first or give --pages_dir.")
+    print(f"Number of webpages: {len(pages)}")
+
+    different, skipped = check_same_output(pages)
+    for name in different:
+        print(f"Outputs differ: {name}")
+    n_compared = len(pages) - len(skipped)
+    print(f"Outputs the same for {n_compared - len(different)} out of {n_compared} webpages.")
+
+    soup_speed = pages_per_second(parse_soup_plant_page, pages, repeats=args.repeats)
+    lxml_speed = pages_per_second(extract_plant_page, pages, repeats=args.repeats)
+    print(f"BeautifulSoup (parse_soup_plant_page): {soup_speed:8.1f} pages/s")
+    print(f"lxml (extract_plant_page):             {lxml_speed:8.1f} pages/s")
+    print(f"Speed up: {lxml_speed / soup_speed:.1f}x")
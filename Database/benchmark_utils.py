@@ -0,0 +1,447 @@
+"""
+Measure how fast the Dash app answers a user as the number of plants grows, for synthetic catalogs of
+each size in --sizes (by default 147, 1k, 10k and 100k plants). The cases timed (see: make_cases) are:
+- utils.recommend_plants, with 1, 3 and 10 plants selected.
+- utils.get_plant_details and utils.get_sim_opp_plant_names (for each of the 3 scatter graphs),
+  each looking up SAMPLE_PLANTS plants.
+- the dynamic_dropdown_options callback of app.py, for each of SEARCH_TERMS.
+- the gen_scatter_plot callback of app.py, for each of the 3 scatter graphs
+  (and zoomed in, for catalogs large enough to be drawn with level of detail).
+
+Each case is run once (cold, e.g. the scatter graph's spatial index is built) and then --repeats times,
+the fastest of the repeats is the time compared (noise from the rest of the machine only ever adds time,
+so the fastest run varies much less between runs than the median). A case that looks slower than the
+baseline is timed again once every case of the catalog has been timed (up to CONFIRM_RUNS more times,
+keeping the fastest run) before it counts, as the machine being busy for a few seconds slows down every
+repeat of the cases timed then. The results are saved as JSON (--output). Giving a
+previous results file (--baseline) compares the two: a case more than --threshold slower than in the
+baseline is a regression. A hash of each case's output is saved too, so optimising a function can be
+checked to give exactly the same output as the implementation the baseline was made with.
+The optimised paths are also checked against simple (brute force) versions on every run:
+utils.ScatterIndex against computing the distance to every plant, as the first version of
+get_sim_opp_plant_names did, and ScatterIndex.within_box against checking every plant.
+The script exits with an error if there is any regression, changed output or failed check.
+
+The synthetic plants are made by sampling the real tables (see: generate_synthetic_catalog.py).
+For catalogs larger than --max_dense_plants, the full cosine similarity matrix would not fit in memory
+(100k plants is 80GB), so each row of it is worked out when recommend_plants asks for it instead.
+
+Run from the top directory of the repository, e.g.:
+python Database/benchmark_utils.py --output benchmark_baseline.json
+(optimise something)
+python Database/benchmark_utils.py --baseline benchmark_baseline.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import plotly.utils
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from dash.exceptions import PreventUpdate
+
+from generate_cosine_sim import calc_cosine_sim
+from generate_synthetic_catalog import make_synthetic_catalog
+
+# utils.py and app.py live in the top directory of the repository.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils  # noqa: E402
+import app as dash_app  # noqa: E402
+
+DATABASE_LOC = "Database/house_plants.db"
+
+SIZES = [147, 1000, 10000, 100000]
+REPEATS = 5
+# a case is a regression if its fastest time is more than 25% above the baseline's...
+THRESHOLD = 0.25
+# ...and more than this many seconds above it (timings of very fast cases are mostly noise).
+MIN_REGRESSION_SECONDS = 0.001
+# number of times a case that looks like a regression is timed again before it counts as one,
+# and the pause before each time (so a busy spell of the machine is over).
+CONFIRM_RUNS = 3
+CONFIRM_PAUSE_SECONDS = 2.0
+# largest catalog with the full cosine similarity matrix in memory (10k plants is 800MB).
+MAX_DENSE_PLANTS = 10000
+# number of plants looked up by the get_plant_details and get_sim_opp_plant_names cases.
+SAMPLE_PLANTS = 10
+# typed into the search dropdown.
+SEARCH_TERMS = ["a", "ivy", "Synthetic 12"]
+# size (per axis) of the zoomed in view of the scatter graph, as a fraction of the whole graph.
+ZOOM_FRACTION = 0.1
+
+
+def make_benchmark_catalog(real_tables: dict, n_plants: int, max_dense_plants: int = MAX_DENSE_PLANTS,
+                           seed: int = 0) -> dict:
+    """
+    Make the tables used by the Dash app for a synthetic catalog (see: generate_synthetic_catalog.py).
+
+    Parameters
+    ----------
+    real_tables : dict
+        The real "plant_raw_data", "plant_features" and "plotting" tables (pd.DataFrame).
+
+    n_plants : int
+        Number of plants to make.
+
+    max_dense_plants : int
+        Largest catalog the full cosine similarity matrix is made for,
+        a utils.CosineRows is used for larger catalogs.
+
+    seed : int
+        Random seed.
+
+    Returns
+    -------
+    dict
+        Keys are "plant_df", "features_df", "plotting_df", "image_df" and "cosine_sim".
+    """
+    tables = make_synthetic_catalog(real_tables, n_plants=n_plants, seed=seed)
+    feature_array = tables["plant_features"].drop(columns="Plant_Name").to_numpy()
+    if n_plants <= max_dense_plants:
+        cosine_sim = calc_cosine_sim(feature_array)
+    else:
+        cosine_sim = utils.CosineRows(feature_array)
+
+    return {"plant_df": tables["plant_raw_data"], "features_df": tables["plant_features"],
+            "plotting_df": tables["plotting"], "image_df": tables["plant_images"], "cosine_sim": cosine_sim}
+
+
+def use_catalog(catalog: dict):
+    """Make the callbacks of app.py use the given catalog (they read the module's tables)."""
+    dash_app.plant_df = catalog["plant_df"]
+    dash_app.features_df = catalog["features_df"]
+    dash_app.plotting_df = catalog["plotting_df"]
+    dash_app.image_df = catalog["image_df"]
+    dash_app.cosine_sim = catalog["cosine_sim"]
+    dash_app.plant_search_options = dash_app.make_search_options(catalog["plant_df"])
+    dash_app.sprite_atlas = None
+
+
+def run_callback(callback: Callable, triggered: list, *args):
+    """
+    Call a callback of app.py as Dash would, "triggered" are the ids of the inputs that changed
+    (read with dash.callback_context). Returns None if the callback does not update (PreventUpdate).
+    """
+    context_value.set(AttributeDict(triggered_inputs=[{"prop_id": prop_id} for prop_id in triggered]))
+    try:
+        return callback(*args)
+    except PreventUpdate:
+        return None
+
+
+def zoomed_view(plotting_df: pd.DataFrame, axes_choice: str) -> dict:
+    """relayoutData of the scatter graph zoomed in on the middle of the graph (see: ZOOM_FRACTION)."""
+    relayout_data = {}
+    for axis, column in zip(["xaxis", "yaxis"], utils.AXES_COLUMNS[axes_choice]):
+        values = plotting_df[column].to_numpy()
+        middle, half_width = (values.min() + values.max()) / 2, (values.max() - values.min()) * ZOOM_FRACTION / 2
+        relayout_data[f"{axis}.range[0]"] = middle - half_width
+        relayout_data[f"{axis}.range[1]"] = middle + half_width
+    return relayout_data
+
+
+def sample_plant_names(plant_df: pd.DataFrame, seed: int = 0) -> list:
+    """Names of the plants selected/looked up by the cases (SAMPLE_PLANTS plants, picked at random)."""
+    rng = np.random.default_rng(seed)
+    idxs = rng.choice(len(plant_df), size=min(SAMPLE_PLANTS, len(plant_df)), replace=False)
+    return list(plant_df["Plant_Name"].to_numpy()[idxs])
+
+
+def make_cases(catalog: dict, seed: int = 0) -> dict:
+    """
+    The cases to time for a catalog (which the app must already be using, see: use_catalog).
+
+    Parameters
+    ----------
+    catalog : dict
+        Output of make_benchmark_catalog.
+
+    seed : int
+        Random seed, for picking the plants selected/looked up.
+
+    Returns
+    -------
+    dict
+        Keys are the case names and values functions (no arguments) running the case.
+    """
+    plant_df, image_df = catalog["plant_df"], catalog["image_df"]
+    plotting_df, features_df = catalog["plotting_df"], catalog["features_df"]
+    cosine_sim = catalog["cosine_sim"]
+    plant_names = sample_plant_names(plant_df, seed=seed)
+
+    cases = {}
+    for n_selected in [1, 3, 10]:
+        selection = plant_names[0] if n_selected == 1 else plant_names[:n_selected]
+        cases[f"recommend_plants[{n_selected} selected]"] = (
+            lambda selection=selection: utils.recommend_plants(
+                plant_df=plant_df, plants_selected=selection, cosine_sim=cosine_sim))
+
+    cases["get_plant_details"] = lambda: [
+        utils.get_plant_details(plant_name=plant_name, plant_df=plant_df, image_df=image_df)
+        for plant_name in plant_names]
+
+    for axes_choice in utils.AXES_COLUMNS:
+        cases[f"get_sim_opp_plant_names[{axes_choice}]"] = (
+            lambda axes_choice=axes_choice: [
+                utils.get_sim_opp_plant_names(selected_plant=plant_name, plotting_df=plotting_df,
+                                              axes_choice=axes_choice, features_df=features_df)
+                for plant_name in plant_names])
+
+    for search_term in SEARCH_TERMS:
+        cases[f"dynamic_dropdown_options[{search_term}]"] = (
+            lambda search_term=search_term: run_callback(
+                dash_app.dynamic_dropdown_options, ["dropdown-plant-select.search_value"],
+                search_term, plant_names[:3]))
+
+    for axes_choice in utils.AXES_COLUMNS:
+        cases[f"gen_scatter_plot[{axes_choice}]"] = (
+            lambda axes_choice=axes_choice: run_callback(
+                dash_app.gen_scatter_plot, ["graph_radio_buttons.value"],
+                axes_choice, None, None, None))
+
+    # zooming in only redraws the graph if not every plant is drawn already.
+    if len(plotting_df) > dash_app.LOD_MAX_POINTS:
+        cases["gen_scatter_plot[tsne_all, zoomed]"] = lambda: run_callback(
+            dash_app.gen_scatter_plot, ["scatter-graph.relayoutData"],
+            "tsne_all", None, None, zoomed_view(plotting_df, "tsne_all"))
+
+    return cases
+
+
+def reference_sim_opp_plant_names(selected_plant: str, plotting_df: pd.DataFrame, axes_choice: str) -> list:
+    """
+    get_sim_opp_plant_names without the spatial index: the distance to every plant is worked out.
+    Same as the first version of the function, with ties going to the lowest row (like ScatterIndex).
+    """
+    x_column, y_column = utils.AXES_COLUMNS[axes_choice]
+    names = plotting_df["Plant_Name"].to_numpy()
+    x, y = plotting_df[x_column].to_numpy(dtype=float), plotting_df[y_column].to_numpy(dtype=float)
+    target_index = np.nonzero(names == selected_plant)[0][0]
+
+    diffs = np.abs(x - x[target_index]) + np.abs(y - y[target_index])
+    row_idxs = np.arange(len(diffs))
+    most_similar = np.lexsort((row_idxs, diffs))
+    most_different = np.lexsort((row_idxs, -diffs))
+    most_similar = most_similar[most_similar != target_index][:3]
+    most_different = most_different[most_different != target_index][:3]
+    return list(names[most_similar]) + list(names[most_different])
+
+
+def check_optimised_paths(catalog: dict, seed: int = 0) -> list:
+    """
+    Check the optimised paths give exactly the same output as the brute force versions.
+
+    Parameters
+    ----------
+    catalog : dict
+        Output of make_benchmark_catalog.
+
+    seed : int
+        Random seed, for picking the plants looked up (the same as make_cases).
+
+    Returns
+    -------
+    list
+        Description of each check that failed (empty if all passed).
+    """
+    plotting_df, features_df = catalog["plotting_df"], catalog["features_df"]
+    plant_names = sample_plant_names(catalog["plant_df"], seed=seed)
+
+    failures = []
+    for axes_choice in utils.AXES_COLUMNS:
+        for plant_name in plant_names:
+            optimised = utils.get_sim_opp_plant_names(
+                selected_plant=plant_name, plotting_df=plotting_df, axes_choice=axes_choice,
+                features_df=features_df)
+            reference = reference_sim_opp_plant_names(plant_name, plotting_df, axes_choice)
+            if optimised != reference:
+                failures.append(f"get_sim_opp_plant_names[{axes_choice}] for {plant_name}: "
+                                f"{optimised} != {reference}")
+
+    scatter_index = utils.get_scatter_index(plotting_df=plotting_df, axes_choice="tsne_all")
+    relayout_data = zoomed_view(plotting_df, "tsne_all")
+    x_range = [relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]]
+    y_range = [relayout_data["yaxis.range[0]"], relayout_data["yaxis.range[1]"]]
+    coords = scatter_index.coords
+    reference = np.nonzero((coords[:, 0] >= x_range[0]) & (coords[:, 0] <= x_range[1]) &
+                           (coords[:, 1] >= y_range[0]) & (coords[:, 1] <= y_range[1]))[0]
+    if not np.array_equal(scatter_index.within_box(x_range=x_range, y_range=y_range), reference):
+        failures.append("ScatterIndex.within_box[tsne_all, zoomed]")
+
+    return failures
+
+
+def output_hash(output) -> str:
+    """sha256 of the JSON of a case's output (the same JSON encoding Dash uses)."""
+    encoded = json.dumps(output, cls=plotly.utils.PlotlyJSONEncoder, sort_keys=True)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def time_case(case: Callable, repeats: int) -> dict:
+    """
+    Time a case: once cold and then "repeats" times.
+
+    Returns
+    -------
+    dict
+        "seconds" (median of the repeats), "min_seconds", "first_seconds" (the cold run)
+        and "output_hash" (see: output_hash).
+    """
+    start = time.perf_counter()
+    output = case()
+    first_seconds = time.perf_counter() - start
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        case()
+        times.append(time.perf_counter() - start)
+    times = times or [first_seconds]
+
+    return {"seconds": statistics.median(times), "min_seconds": min(times),
+            "first_seconds": first_seconds, "output_hash": output_hash(output)}
+
+
+def is_regression(result: dict, baseline_result: dict, threshold: float) -> bool:
+    """
+    Whether a case is a regression: its fastest time ("min_seconds") is more than "threshold"
+    (a fraction) and at least MIN_REGRESSION_SECONDS slower than in the baseline.
+    """
+    seconds, baseline_seconds = result["min_seconds"], baseline_result["min_seconds"]
+    return seconds > baseline_seconds * (1 + threshold) and seconds - baseline_seconds > MIN_REGRESSION_SECONDS
+
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compare results to a baseline (both the output of this script).
+
+    Parameters
+    ----------
+    results, baseline : dict
+        Results of this run and of the baseline run.
+
+    threshold : float
+        A case is a regression if it is more than this fraction slower than in the baseline
+        (see: is_regression).
+
+    Returns
+    -------
+    list
+        Description of each regression or changed output (empty if none).
+    """
+    problems = []
+    for size, size_results in results["sizes"].items():
+        baseline_cases = baseline["sizes"].get(size, {}).get("cases", {})
+        for name, result in size_results["cases"].items():
+            if name not in baseline_cases:
+                continue
+            baseline_result = baseline_cases[name]
+            ratio = result["min_seconds"] / max(baseline_result["min_seconds"], 1e-12)
+            result["baseline_ratio"] = ratio
+            if is_regression(result, baseline_result, threshold):
+                problems.append(f"{size} plants, {name}: {ratio:.2f}x slower than the baseline")
+            if result["output_hash"] != baseline_result["output_hash"]:
+                problems.append(f"{size} plants, {name}: output differs from the baseline")
+    return problems
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Benchmark the functions used by the Dash app on synthetic catalogs of several sizes."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database (the real tables are sampled from).")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="Number of synthetic plants of each catalog.")
+    parser.add_argument("--repeats", type=int, default=REPEATS,
+                        help="Number of times each case is timed (after a first, cold, run).")
+    parser.add_argument("--max_dense_plants", type=int, default=MAX_DENSE_PLANTS,
+                        help="Largest catalog the full cosine similarity matrix is made for.")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Path to save the results to (JSON).")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="Path to the results of a previous run to compare to (JSON).")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Fraction slower than the baseline a case must be to count as a regression.")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, "r") as handler:
+            baseline = json.load(handler)
+
+    conn = sqlite3.connect(args.database)
+    real_tables = {table: pd.read_sql_query(f"SELECT * FROM {table}", conn)
+                   for table in ["plant_raw_data", "plant_features", "plotting"]}
+    conn.close()
+
+    results = {
+        "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                        "pandas": pd.__version__, "machine": platform.machine(),
+                        "processor": platform.processor(), "cpu_count": os.cpu_count()},
+        "settings": {"repeats": args.repeats, "max_dense_plants": args.max_dense_plants},
+        "sizes": {},
+    }
+    failures = []
+    for n_plants in args.sizes:
+        catalog = make_benchmark_catalog(real_tables, n_plants=n_plants, max_dense_plants=args.max_dense_plants)
+        use_catalog(catalog)
+        cases = make_cases(catalog)
+        dense = isinstance(catalog["cosine_sim"], np.ndarray)
+        print(f"\n{n_plants:,} plants (cosine similarity {'matrix' if dense else 'rows worked out when needed'}):")
+
+        size_results = {"cosine_sim": "dense" if dense else "rows", "cases": {}}
+        baseline_cases = {} if baseline is None else baseline["sizes"].get(str(n_plants), {}).get("cases", {})
+        for name, case in cases.items():
+            result = time_case(case, repeats=args.repeats)
+            size_results["cases"][name] = result
+            print(f"  {name:45s} {result['seconds'] * 1000:10.2f} ms (fastest: {result['min_seconds'] * 1000:.2f} ms, "
+                  f"first run: {result['first_seconds'] * 1000:.2f} ms)")
+        results["sizes"][str(n_plants)] = size_results
+
+        # time the cases that look slower again, in case the machine was busy when they were timed.
+        for _ in range(CONFIRM_RUNS):
+            slower = [name for name, result in size_results["cases"].items()
+                      if name in baseline_cases and is_regression(result, baseline_cases[name], args.threshold)]
+            if not slower:
+                break
+            print(f"  Timing again (slower than the baseline): {', '.join(slower)}")
+            time.sleep(CONFIRM_PAUSE_SECONDS)
+            for name in slower:
+                result = size_results["cases"][name]
+                result["min_seconds"] = min(result["min_seconds"],
+                                            time_case(cases[name], repeats=args.repeats)["min_seconds"])
+
+        size_failures = check_optimised_paths(catalog)
+        print(f"  Optimised paths give the same output as the brute force versions: {not size_failures}")
+        failures += [f"{n_plants} plants, {failure}" for failure in size_failures]
+        del catalog, cases
+
+    if baseline is not None:
+        problems = compare_to_baseline(results, baseline, threshold=args.threshold)
+        print(f"\nCompared to the baseline ({args.baseline}, threshold: {args.threshold:.0%}):")
+        for size, size_results in results["sizes"].items():
+            for name, result in size_results["cases"].items():
+                if "baseline_ratio" in result:
+                    print(f"  {int(size):>7,} plants, {name:45s} {result['baseline_ratio']:6.2f}x")
+        failures += problems
+
+    if args.output is not None:
+        with open(args.output, "w") as handler:
+            json.dump(results, handler, indent=2)
+        print(f"\nResults saved to: {args.output}")
+
+    if failures:
+        print("\nFailed:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
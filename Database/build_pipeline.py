@@ -0,0 +1,446 @@
+"""
+Builds (or refreshes) the SQL database used by the Dash app in one go, replacing the manual sequence of
+running the Database scripts and then the Step2-Step4 notebooks.
+
+The build is split into named stages (see: STAGES), each runs one of the Database scripts and declares
+the tables (or table columns) of house_plants.db it reads and writes. From these:
+- the order of the stages is worked out (a stage runs after the stages that write what it reads),
+  and stages that do not depend on each other (e.g. the image stages and the feature stages) run at the same time.
+- each stage is fingerprinted by a hash of its inputs (and of its script), saved to the table "build_stages".
+  A stage is only re-run if its fingerprint changed, or its outputs changed/are missing since it last ran.
+
+The scraping stages read websites/use the Google search quota, so they are only run with --scrape
+(always re-run, as their inputs are not in the database, but only their changed outputs make later stages re-run).
+
+The stages are run on a copy of the database, which replaces the database only if every stage succeeded
+(see: bulk_writer.py), so the Dash app never reads a half built database (e.g. new features but an old
+cosine_sim table). Use --in_place to build the database directly.
+
+Run from the top directory of the repository:
+python Database/build_pipeline.py
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Union
+
+from bulk_writer import connect, make_staging_copy, remove_database, swap_in
+
+DATABASE_LOC = "Database/house_plants.db"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_table_spec(spec: str) -> tuple:
+    """
+    Read a table spec ("table" or "table:column1,column2").
+
+    Returns
+    -------
+    tuple
+        Table name and a tuple of the column names (None for the whole table).
+    """
+    table, _, columns = spec.partition(":")
+    return table, tuple(columns.split(",")) if columns else None
+
+
+def _overlap(spec_1: tuple, spec_2: tuple) -> bool:
+    table_1, columns_1 = spec_1
+    table_2, columns_2 = spec_2
+    if table_1 != table_2:
+        return False
+    return columns_1 is None or columns_2 is None or bool(set(columns_1) & set(columns_2))
+
+
+class Stage:
+    """
+    One step of the build.
+
+    Parameters
+    ----------
+    name : str
+        Name of the stage.
+
+    script : str
+        Script (in the Database folder) run by the stage, it must accept --database.
+
+    inputs : list
+        Tables the stage reads, either "table" for the whole table or "table:column1,column2" for some columns.
+
+    outputs : list
+        Tables the stage writes, same format as inputs.
+
+    arguments : list
+        Other command line arguments for the script.
+
+    external : bool
+        If True, the stage also reads from outside the database (e.g. websites),
+        so it is always re-run (and only with --scrape).
+    """
+
+    def __init__(self, name: str, script: str, inputs: list, outputs: list,
+                 arguments: Union[list, None] = None, external: bool = False):
+        self.name = name
+        self.script = script
+        self.inputs = [parse_table_spec(spec) for spec in inputs]
+        self.outputs = [parse_table_spec(spec) for spec in outputs]
+        self.arguments = arguments or []
+        self.external = external
+
+    def command(self, database: str) -> list:
+        """Command line to run the stage."""
+        return [sys.executable, os.path.join(SCRIPT_DIR, self.script), "--database", database] + self.arguments
+
+
+# the columns written by the scripts, stages reading a table only hash these (not e.g. the Scraped_At column).
+RAW_DATA_COLUMNS = ("Plant_Name,Common_Names,Plant_Type,Family,Zones,Native_Range,Heights,Spreads,Bloom_Times,"
+                    "Bloom_Description,Sunlight,Watering,Maintenance,Flowers,Leafs,Fruits")
+PLOTTING_COLUMNS = ("Plant_Name,Maintenance_Ordinal,all_tsne_1,all_tsne_2,maintenance_tsne_1,maintenance_tsne_2,"
+                    "Sunlight_jittered,Watering_jittered,Max_Spread_Capped_jittered,Max_Height_Capped_jittered")
+
+STAGES = [
+    Stage("latin_names", "generate_database.py", inputs=[],
+          outputs=["latin_names:Plant_Name", "hyperlinks:Plant_Name,url"], arguments=["--incremental"],
+          external=True),
+    Stage("plant_details", "get_plant_details.py", inputs=["hyperlinks:Plant_Name,url"],
+          outputs=[f"plant_raw_data:{RAW_DATA_COLUMNS}"], arguments=["--incremental"], external=True),
+    Stage("plant_images", "get_plant_images.py", inputs=["hyperlinks:Plant_Name,url"],
+          outputs=["plant_images:Plant_Name,File_Path,Website"], external=True),
+    Stage("features", "feature_engineering.py", inputs=[f"plant_raw_data:{RAW_DATA_COLUMNS}"],
+          outputs=["plant_features"]),
+    Stage("embeddings", "embeddings.py", inputs=["plant_features"],
+          outputs=[f"plotting:{PLOTTING_COLUMNS}"]),
+    Stage("cosine_sim", "generate_cosine_sim.py", inputs=["plant_features"],
+          outputs=["cosine_sim"]),
+    Stage("sim_diff", "generate_sim_diff_table.py", inputs=[f"plotting:{PLOTTING_COLUMNS}"],
+          outputs=["sim_diff_lookup", "sim_diff_source"]),
+    Stage("normalise_images", "normalise_images.py", inputs=["plant_images:Plant_Name,Website"],
+          outputs=["plant_images:File_Path,Source_Path,Source_Hash"]),
+    Stage("image_variants", "generate_image_variants.py", inputs=["plant_images:Plant_Name,File_Path"],
+          outputs=["plant_images:Webp_Srcset,Avif_Srcset"]),
+    Stage("image_placeholders", "generate_image_placeholders.py", inputs=["plant_images:Plant_Name,File_Path"],
+          outputs=["plant_images:Placeholder"]),
+    Stage("sprite_atlas", "generate_sprite_atlas.py",
+          inputs=["plotting:Plant_Name", "plant_images:Plant_Name,File_Path"],
+          outputs=["plotting:Atlas_Page,Atlas_X,Atlas_Y", "sprite_atlas"]),
+]
+
+
+def stage_dependencies(stages: list) -> dict:
+    """
+    Work out which stages each stage has to wait for (those that write what it reads).
+
+    Parameters
+    ----------
+    stages : list
+        Stages in the build, a stage only depends on the stages before it.
+
+    Returns
+    -------
+    dict
+        Keys are the stage names and values sets of the stage names they depend on.
+    """
+    dependencies = {}
+    for idx, stage in enumerate(stages):
+        dependencies[stage.name] = {
+            other.name for other in stages[:idx]
+            if any(_overlap(output, spec) for output in other.outputs for spec in stage.inputs + stage.outputs)}
+    return dependencies
+
+
+def hash_tables(conn: sqlite3.Connection, specs: list) -> Union[str, None]:
+    """
+    Hash the contents of tables (or some of their columns).
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database.
+
+    specs : list
+        Output of parse_table_spec for each table.
+
+    Returns
+    -------
+    str or None
+        Hex digest, None if a table/column is missing.
+    """
+    hasher = hashlib.sha256()
+    c = conn.cursor()
+    for table, columns in specs:
+        c.execute(f"""PRAGMA table_info("{table}")""")
+        existing_columns = [row[1] for row in c.fetchall()]
+        if not existing_columns or (columns is not None and not set(columns) <= set(existing_columns)):
+            return None
+
+        selected = ", ".join(f'"{column}"' for column in (columns or existing_columns))
+        hasher.update(f"{table}:{selected}".encode())
+        # ordered by rowid so the same rows always give the same hash.
+        c.execute(f"""SELECT {selected} FROM "{table}" ORDER BY rowid""")
+        while True:
+            rows = c.fetchmany(10000)
+            if not rows:
+                break
+            hasher.update(repr(rows).encode())
+    return hasher.hexdigest()
+
+
+def hash_file(file_path: str) -> str:
+    """sha256 hex digest of a file."""
+    with open(file_path, "rb") as handler:
+        return hashlib.sha256(handler.read()).hexdigest()
+
+
+def input_fingerprint(conn: sqlite3.Connection, stage: Stage) -> Union[str, None]:
+    """Hash of everything the stage reads (its inputs, script and command line), None if an input is missing."""
+    inputs_hash = hash_tables(conn, stage.inputs)
+    if inputs_hash is None:
+        return None
+    stage_id = [stage.script, hash_file(os.path.join(SCRIPT_DIR, stage.script))] + stage.arguments
+    return hashlib.sha256((inputs_hash + repr(stage_id)).encode()).hexdigest()
+
+
+class BuildRecord:
+    """
+    Fingerprints of the stages from their last successful run (table: "build_stages").
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database.
+
+    read_only : bool
+        If True, the table is not created (stages without a record count as never run).
+    """
+
+    def __init__(self, conn: sqlite3.Connection, read_only: bool = False):
+        self.conn = conn
+        if read_only:
+            return
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS build_stages(
+            Stage TEXT PRIMARY KEY,
+            Input_Hash TEXT,
+            Output_Hash TEXT,
+            Built_At TEXT,
+            Seconds REAL
+            )
+        """)
+        conn.commit()
+
+    def last_run(self, stage_name: str) -> tuple:
+        """Input and output hashes of the last run, (None, None) if never run."""
+        c = self.conn.cursor()
+        c.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name='build_stages'""")
+        if c.fetchone() is None:
+            return None, None
+        c.execute("""SELECT Input_Hash, Output_Hash FROM build_stages WHERE Stage=?""", (stage_name,))
+        row = c.fetchone()
+        return (None, None) if row is None else row
+
+    def save(self, stage_name: str, input_hash: str, output_hash: str, seconds: float):
+        """Record a successful run."""
+        self.conn.execute("""INSERT OR REPLACE INTO build_stages VALUES (?,?,?,?,?)""",
+                          (stage_name, input_hash, output_hash,
+                           datetime.now(timezone.utc).isoformat(timespec="seconds"), seconds))
+        self.conn.commit()
+
+
+def is_dirty(conn: sqlite3.Connection, record: BuildRecord, stage: Stage) -> bool:
+    """
+    True if the stage needs to be (re-)run.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database.
+
+    record : BuildRecord
+        Fingerprints of the last runs.
+
+    stage : Stage
+        Stage to check.
+
+    Returns
+    -------
+    bool
+        True if the stage is external, its inputs or script changed, or its outputs changed/are missing.
+    """
+    if stage.external:
+        return True
+    last_input_hash, last_output_hash = record.last_run(stage.name)
+    output_hash = hash_tables(conn, stage.outputs)
+    return (input_fingerprint(conn, stage) != last_input_hash or output_hash is None
+            or output_hash != last_output_hash)
+
+
+def run_stage(stage: Stage, database: str) -> float:
+    """
+    Run the script of a stage.
+
+    Parameters
+    ----------
+    stage : Stage
+        Stage to run.
+
+    database : str
+        Path to the SQL database.
+
+    Returns
+    -------
+    float
+        Seconds taken.
+
+    Raises
+    ------
+    RuntimeError
+        If the script failed, with the end of its output.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(stage.command(database), capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+
+    output = (result.stdout + result.stderr).strip()
+    if result.returncode != 0:
+        raise RuntimeError(f"Stage {stage.name} failed:\n" + "\n".join(output.splitlines()[-20:]))
+    for line in output.splitlines():
+        print(f"  [{stage.name}] {line}")
+    return seconds
+
+
+def run_pipeline(database: str, stages: list, max_workers: int = 4, force: Union[list, None] = None,
+                 dry_run: bool = False) -> dict:
+    """
+    Run all dirty stages, each once the stages it depends on have finished,
+    with independent stages run at the same time.
+
+    Parameters
+    ----------
+    database : str
+        Path to the SQL database.
+
+    stages : list
+        Stages to build (see: STAGES).
+
+    max_workers : int
+        Maximum number of stages run at the same time.
+
+    force : list or None
+        Names of stages to re-run even if not dirty.
+
+    dry_run : bool
+        If True, only print which stages would run (assuming each dirty stage changes its outputs).
+        The database is opened read only, so is left unchanged.
+
+    Returns
+    -------
+    dict
+        Keys are the stage names and values one of: "ran", "up to date", "failed" or "skipped"
+        (a stage it depends on failed).
+    """
+    force = set(force or [])
+    dependencies = stage_dependencies(stages)
+    by_name = {stage.name: stage for stage in stages}
+    # shared by the scheduling thread only, the stages write with their own connections.
+    if not dry_run:
+        conn = connect(database)
+    elif os.path.exists(database):
+        # read only, so a dry run leaves the database exactly as it was (connect() would switch it to WAL).
+        conn = sqlite3.connect(f"{Path(database).resolve().as_uri()}?mode=ro", uri=True)
+    else:
+        conn = sqlite3.connect(":memory:")  # nothing built yet, every stage would run.
+    record = BuildRecord(conn, read_only=dry_run)
+
+    status = {}
+    pending = [stage.name for stage in stages]
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name in list(pending):
+                if not dependencies[name] <= set(status):
+                    continue
+                pending.remove(name)
+                stage = by_name[name]
+                if any(status[dependency] in ("failed", "skipped") for dependency in dependencies[name]):
+                    status[name] = "skipped"
+                elif dry_run:
+                    ran_before = any(status[dependency] == "ran" for dependency in dependencies[name])
+                    status[name] = "ran" if (name in force or ran_before or is_dirty(conn, record, stage)) \
+                        else "up to date"
+                elif name in force or is_dirty(conn, record, stage):
+                    print(f"Running stage: {name}")
+                    input_hash = input_fingerprint(conn, stage)
+                    running[executor.submit(run_stage, stage, database)] = (name, input_hash)
+                else:
+                    status[name] = "up to date"
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, input_hash = running.pop(future)
+                try:
+                    seconds = future.result()
+                except RuntimeError as error:
+                    print(error)
+                    status[name] = "failed"
+                    continue
+                # the fingerprint is of the inputs the stage actually ran with.
+                record.save(name, input_hash, hash_tables(conn, by_name[name].outputs), seconds)
+                status[name] = "ran"
+                print(f"Finished stage: {name} ({seconds:.1f}s)")
+
+    conn.close()
+    return status
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Build the SQL database, only re-running the stages whose inputs changed."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    parser.add_argument("--scrape", action="store_true",
+                        help="Also run the scraping stages (websites and Google searches).")
+    parser.add_argument("--stages", type=str, nargs="+", default=None, choices=[stage.name for stage in STAGES],
+                        help="Only build these stages (and not the stages after them).")
+    parser.add_argument("--force", type=str, nargs="+", default=None, choices=[stage.name for stage in STAGES],
+                        help="Re-run these stages even if their inputs have not changed.")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Maximum number of stages run at the same time.")
+    parser.add_argument("--dry_run", action="store_true",
+                        help="Only show which stages would be run.")
+    parser.add_argument("--in_place", action="store_true",
+                        help="Build the database directly, instead of a copy that replaces it once finished.")
+    args = parser.parse_args()
+
+    stages = [stage for stage in STAGES if args.scrape or not stage.external]
+    if args.stages is not None:
+        stages = [stage for stage in stages if stage.name in args.stages]
+
+    start = time.perf_counter()
+    staged = not (args.in_place or args.dry_run)
+    database = make_staging_copy(args.database) if staged else args.database
+    status = run_pipeline(database=database, stages=stages, max_workers=args.workers,
+                          force=args.force, dry_run=args.dry_run)
+    if staged:
+        if "ran" in status.values() and "failed" not in status.values():
+            swap_in(database, args.database)
+        else:
+            remove_database(database)
+            if "failed" in status.values():
+                print(f"\n{args.database} left unchanged, as a stage failed.")
+
+    print(f"\nBuild {'plan' if args.dry_run else 'finished'} ({time.perf_counter() - start:.1f}s):")
+    for name, stage_status in [(stage.name, status[stage.name]) for stage in stages]:
+        if args.dry_run and stage_status == "ran":
+            stage_status = "would run"
+        print(f"  {name}: {stage_status}")
+    if "failed" in status.values():
+        sys.exit(1)
@@ -0,0 +1,227 @@
+"""
+Shared way for the Database scripts to write to the SQL database.
+
+- connect: opens the database in WAL mode, so readers (e.g. the Dash app) keep reading the last committed
+  version of the database while a script writes, and tunes it for bulk loads (synchronous, cache_size).
+- transaction: runs a block of writes as one transaction, e.g. dropping, remaking and refilling a table,
+  so readers see the table either as it was or fully remade.
+- write_rows: inserts (or upserts) rows with one statement, the rows can be a generator so
+  large tables never need to be held in memory.
+- BulkWriter: gives a connection that is committed when the script finishes (rolled back if it fails)
+  and always closed. With staging=True the script writes to a copy of the database, which is only
+  copied back into the database once the script has finished (see: swap_in), so a half built database
+  (e.g. a table dropped but not yet refilled) is never seen by readers.
+
+Example:
+with BulkWriter(args.database, staging=True) as conn:
+    c = conn.cursor()
+    ...
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Union
+
+# seconds to wait for another connection's write to finish.
+BUSY_TIMEOUT = 60
+# memory (in KiB) SQLite can use for caching pages, the default is only 2MB.
+CACHE_SIZE_KIB = 64 * 1024
+STAGING_SUFFIX = ".staging"
+
+
+def connect(database: str, timeout: float = BUSY_TIMEOUT) -> sqlite3.Connection:
+    """
+    Open the database tuned for bulk writes.
+
+    Parameters
+    ----------
+    database : str
+        Path to the SQL database.
+
+    timeout : float
+        Seconds to wait for another connection's write to finish.
+
+    Returns
+    -------
+    sqlite3.Connection
+        Connection to the database.
+    """
+    conn = sqlite3.connect(database, timeout=timeout)
+    # readers do not wait for writers (and the other way round), the setting is saved in the database.
+    conn.execute("""PRAGMA journal_mode=WAL""")
+    # with WAL, NORMAL can only lose the last commits on a power cut (never corrupts the database)
+    # and does not wait for the disk on every commit.
+    conn.execute("""PRAGMA synchronous=NORMAL""")
+    conn.execute(f"""PRAGMA cache_size=-{CACHE_SIZE_KIB}""")
+    conn.execute("""PRAGMA temp_store=MEMORY""")
+    return conn
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Cursor]:
+    """
+    Run a block of writes as one transaction, committed at the end of the block (rolled back on an error).
+
+    sqlite3 only starts a transaction before INSERT/UPDATE/DELETE statements, so without this
+    e.g. a DROP TABLE is committed straight away and readers would see the table missing.
+    The write lock is taken at the start (waiting for other writers to finish), instead of
+    when the first write is made, which can fail if another connection wrote in the meantime.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database (no transaction open).
+
+    Yields
+    ------
+    sqlite3.Cursor
+        Cursor to write with.
+    """
+    c = conn.cursor()
+    c.execute("""BEGIN IMMEDIATE""")
+    try:
+        yield c
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def write_rows(c: sqlite3.Cursor, table: str, columns: list, rows: Iterable,
+               key_column: Union[str, None] = None) -> int:
+    """
+    Insert rows into a table, in the current transaction.
+
+    Parameters
+    ----------
+    c : sqlite3.Cursor
+        Cursor of the database.
+
+    table : str
+        Name of the table.
+
+    columns : list
+        Column names of the values in each row.
+
+    rows : Iterable
+        Each item is a tuple of the values for one row (can be a generator).
+
+    key_column : str or None
+        If given, rows with a key already in the table update that row instead (an "upsert"),
+        the column must be the primary key (or unique).
+
+    Returns
+    -------
+    int
+        Number of rows written.
+    """
+    query = f"""INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})"""
+    if key_column is not None:
+        updates = ", ".join(f"{column}=excluded.{column}" for column in columns if column != key_column)
+        query += f""" ON CONFLICT({key_column}) DO UPDATE SET {updates}"""
+    c.executemany(query, rows)
+    return c.rowcount
+
+
+def make_staging_copy(database: str) -> str:
+    """
+    Copy the database to a staging database next to it (an empty one if the database does not exist yet).
+
+    Parameters
+    ----------
+    database : str
+        Path to the SQL database.
+
+    Returns
+    -------
+    str
+        Path to the staging database.
+    """
+    staging = database + STAGING_SUFFIX
+    remove_database(staging)  # left over from a run that failed.
+    staging_conn = sqlite3.connect(staging)
+    if os.path.exists(database):
+        # a consistent copy, even if another connection is writing.
+        source_conn = sqlite3.connect(database, timeout=BUSY_TIMEOUT)
+        source_conn.backup(staging_conn)
+        source_conn.close()
+    staging_conn.close()
+    return staging
+
+
+def swap_in(staging: str, database: str):
+    """
+    Replace the contents of the database with the staging database and delete the staging database.
+
+    The staging database is copied in with SQLite's backup (one write transaction on the database),
+    rather than replacing the file, as replacing the file of a database in WAL mode while other connections
+    have it open can corrupt it. Readers see either the old or the new database, never a mix.
+
+    Parameters
+    ----------
+    staging : str
+        Path to the staging database (output of make_staging_copy).
+
+    database : str
+        Path to the SQL database.
+    """
+    staging_conn = sqlite3.connect(staging)
+    target_conn = connect(database)
+    staging_conn.backup(target_conn)
+    target_conn.close()
+    staging_conn.close()
+    remove_database(staging)
+
+
+def remove_database(database: str):
+    """Delete a database file and its WAL files (if they exist)."""
+    for suffix in ["", "-wal", "-shm", "-journal"]:
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+
+
+class BulkWriter:
+    """
+    Context manager giving a connection to write to the database with (see: connect).
+    Committed if the block finishes, rolled back if it raises an error, closed either way.
+
+    Parameters
+    ----------
+    database : str
+        Path to the SQL database.
+
+    staging : bool
+        If True, write to a copy of the database that replaces the database only once the block
+        finishes without an error (the database is left as it was otherwise).
+        For scripts that remake tables, as the database is not half built at any point.
+        Anything written to the database by others in the meantime is lost when it is replaced.
+    """
+
+    def __init__(self, database: str, staging: bool = False):
+        self.database = database
+        self.staging = staging
+        self.conn = None
+        self._staging_path = None
+
+    def __enter__(self) -> sqlite3.Connection:
+        path = self.database
+        if self.staging:
+            self._staging_path = path = make_staging_copy(self.database)
+        self.conn = connect(path)
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+
+        if self._staging_path is not None:
+            if exc_type is None:
+                swap_in(self._staging_path, self.database)
+            else:
+                remove_database(self._staging_path)
+        return False  # errors are not suppressed.
@@ -0,0 +1,274 @@
+"""
+Crawls the house plant catalogues of retailers (see: RETAILERS) for the Latin name of every plant they sell,
+used by generate_database.py to fill the "latin_names" table.
+
+Starting from each retailer's start pages, every catalogue page found is downloaded (with fetcher.py, so
+downloads are concurrent, rate limited per website and share one session) and parsed as soon as it arrives:
+- the Latin names on the page are yielded straight away, so they can be saved as the crawl goes on.
+- links to other catalogue pages (categories or pages of a category) are queued, if not seen before.
+- if a page of a category had new names, the next page of that category is queued too, as the
+  retailer's pagination may only be loaded with javascript (so no link to it is found).
+Retailers are crawled at the same time, each only limited by its own rate limit.
+
+For checking the parsing code without using the real websites, the crawl can be run against saved copies of
+the catalogue pages (see: FixtureServer and the "fixtures" folder, one folder per retailer).
+"""
+import functools
+import http.server
+import os
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import lxml.etree
+import requests
+
+from fetcher import Fetcher
+from page_extractor import parse_html
+
+FIXTURE_DIR = "Database/fixtures"
+# stops a crawl running forever if a website links to endless pages.
+MAX_PAGES = 500
+
+_LINKS = lxml.etree.XPath("//a/@href")
+
+
+class Retailer:
+    """
+    Where and how to find the Latin names on a retailer's website.
+
+    Parameters
+    ----------
+    name : str
+        Name of the retailer (also the name of its folder of fixtures).
+
+    base_url : str
+        Scheme and host of the website, e.g. "https://www.blomsterlandet.se".
+
+    start_paths : list
+        Paths of the pages to start the crawl from (e.g. the page listing the categories).
+
+    listing_pattern : str
+        Regex matched against the path of a link, only catalogue pages (categories and their pages)
+        should match so e.g. product pages are not downloaded.
+
+    name_xpath : str
+        XPath to the elements holding the Latin names on a catalogue page.
+
+    page_param : str
+        Query parameter giving the page number of a category.
+    """
+
+    def __init__(self, name: str, base_url: str, start_paths: list, listing_pattern: str,
+                 name_xpath: str, page_param: str = "page"):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.start_paths = start_paths
+        self.listing_pattern = listing_pattern
+        self.name_xpath = name_xpath
+        self.page_param = page_param
+        self._listing_regex = re.compile(listing_pattern)
+        self._find_names = lxml.etree.XPath(name_xpath)
+
+    def rebased(self, base_url: str) -> "Retailer":
+        """Same retailer with a different base_url, e.g. a local copy of the website."""
+        return Retailer(self.name, base_url, self.start_paths, self.listing_pattern, self.name_xpath,
+                        self.page_param)
+
+    def normalise_url(self, url: str) -> Union[str, None]:
+        """
+        URL of a catalogue page without its fragment or query parameters (other than the page number),
+        so the same page is not downloaded twice. None if the URL is not a catalogue page of this retailer.
+        """
+        if not url.startswith(self.base_url + "/"):
+            return None
+        parts = urlsplit(url)
+        base_path = urlsplit(self.base_url).path
+        if not self._listing_regex.match(parts.path[len(base_path):]):
+            return None
+        page = self.page_number(url)
+        return self.with_page(urlunsplit((parts.scheme, parts.netloc, parts.path, "", "")), page)
+
+    def page_number(self, url: str) -> int:
+        """Page number of a catalogue page (1 if not given)."""
+        value = dict(parse_qsl(urlsplit(url).query)).get(self.page_param, "1")
+        return int(value) if value.isdigit() else 1
+
+    def with_page(self, url: str, page: int) -> str:
+        """URL of another page of the same category (the first page has no page number)."""
+        parts = urlsplit(url)
+        query = [(key, value) for key, value in parse_qsl(parts.query) if key != self.page_param]
+        if page > 1:
+            query.append((self.page_param, str(page)))
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+    def parse_page(self, content: bytes, url: str) -> Tuple[list, list]:
+        """
+        Find the Latin names and the links to other catalogue pages on a catalogue page.
+
+        Parameters
+        ----------
+        content : bytes
+            HTML of the page.
+
+        url : str
+            URL of the page (to resolve relative links).
+
+        Returns
+        -------
+        list
+            The Latin names (unique, in order of appearance).
+
+        list
+            URLs of the catalogue pages linked to (normalised, see: normalise_url).
+        """
+        root = parse_html(content)
+        names = []
+        for element in self._find_names(root):
+            name = " ".join("".join(element.itertext()).split())
+            if name and name not in names:
+                names.append(name)
+
+        links = []
+        for href in _LINKS(root):
+            link = self.normalise_url(urljoin(url, href.strip()))
+            if link is not None and link not in links:
+                links.append(link)
+        return names, links
+
+
+RETAILERS = {
+    "blomsterlandet": Retailer(
+        name="blomsterlandet",
+        base_url="https://www.blomsterlandet.se",
+        # the page listing the indoor plant categories, plus the two categories crawled before
+        # (in case the category links are not found).
+        start_paths=["/produkter/vaxter/inomhus/", "/produkter/vaxter/inomhus/grona-vaxter/",
+                     "/produkter/vaxter/inomhus/blommande-vaxter/"],
+        # a category is one folder below "inomhus", product pages are further down.
+        listing_pattern=r"^/produkter/vaxter/inomhus/([^/]+/?)?$",
+        # the class is made by styled-components ("ProductCardBodystyled__ScientificName-<hash> <hash>"),
+        # only the readable part is matched as the hashes change whenever the website is rebuilt.
+        name_xpath="//*[contains(@class, 'ScientificName')]",
+    ),
+}
+
+
+def crawl_catalogs(retailers: list, fetcher: Fetcher, max_pages: int = MAX_PAGES) -> Iterator[Tuple[str, str, list]]:
+    """
+    Crawl the catalogues of several retailers at the same time.
+
+    Parameters
+    ----------
+    retailers : list
+        Retailers to crawl (see: RETAILERS).
+
+    fetcher : Fetcher
+        Used to download the pages, its number of workers sets how many are downloaded at the same time.
+
+    max_pages : int
+        Maximum number of pages downloaded from each retailer.
+
+    Yields
+    ------
+    tuple
+        Name of the retailer, URL of the page and the Latin names found on it,
+        in the order the downloads finish.
+    """
+    queued = set()
+    n_pages = {retailer.name: 0 for retailer in retailers}
+    # names found so far in each category, a category's next page is only tried if its last page added names.
+    category_names = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=fetcher.max_workers) as executor:
+
+        def submit(retailer: Retailer, url: str, guessed: bool = False):
+            if url in queued or n_pages[retailer.name] >= max_pages:
+                return
+            queued.add(url)
+            n_pages[retailer.name] += 1
+            running[executor.submit(fetcher.fetch, url)] = (retailer, url, guessed)
+
+        for retailer in retailers:
+            for path in retailer.start_paths:
+                submit(retailer, retailer.normalise_url(retailer.base_url + path) or retailer.base_url + path)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                retailer, url, guessed = running.pop(future)
+                try:
+                    content = future.result().content
+                except requests.RequestException as error:
+                    if not guessed:  # a guessed next page not existing is how the end of a category is found.
+                        print(f"Failed to download: {url} ({error})")
+                    continue
+
+                names, links = retailer.parse_page(content, url)
+                for link in links:
+                    submit(retailer, link)
+
+                category = retailer.with_page(url, 1)
+                seen = category_names.setdefault(category, set())
+                if set(names) - seen:
+                    seen.update(names)
+                    submit(retailer, retailer.with_page(url, retailer.page_number(url) + 1), guessed=True)
+
+                yield retailer.name, url, names
+
+
+class _FixtureHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves the fixtures, "?page=N" is served from the file "page-N.html" of the folder."""
+
+    def translate_path(self, path: str) -> str:
+        parts = urlsplit(path)
+        page = dict(parse_qsl(parts.query)).get("page", "1")
+        file_path = super().translate_path(parts.path)
+        if page != "1" and os.path.isdir(file_path):
+            return os.path.join(file_path, f"page-{page}.html")
+        return file_path
+
+    def log_message(self, format, *args):
+        pass  # no log line for each request.
+
+
+class FixtureServer:
+    """
+    Context manager serving saved copies of a retailer's catalogue pages on a local port.
+    The fixture folder has the same paths as the website (e.g. "produkter/vaxter/inomhus/index.html"),
+    with "?page=N" of a folder saved as "page-N.html" in it.
+
+    Parameters
+    ----------
+    fixture_dir : str
+        Folder of the fixtures of one retailer.
+
+    Example
+    -------
+    with FixtureServer(os.path.join(FIXTURE_DIR, "blomsterlandet")) as server:
+        retailer = RETAILERS["blomsterlandet"].rebased(server.url)
+    """
+
+    def __init__(self, fixture_dir: str):
+        self.fixture_dir = os.path.abspath(fixture_dir)
+        self._server = None
+
+    def __enter__(self) -> "FixtureServer":
+        handler = functools.partial(_FixtureHandler, directory=self.fixture_dir)
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
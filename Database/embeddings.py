@@ -0,0 +1,422 @@
+"""
+This script makes the 2D coordinates for the scatter graphs in the Dash app (the "plotting" table).
+It replaces the manual steps of Step3_Dimensionality_Reduction.ipynb so the table can be remade automatically.
+
+Three methods are available to make each 2D embedding (see: EMBEDDING_METHODS):
+- "tsne": t-SNE, same as the notebook (needs scikit-learn).
+- "pca": Principal component analysis, very fast but only shows the largest trends in the features.
+- "spectral": Spectral embedding of the k nearest neighbour graph of the plants,
+  fast and keeps similar plants close together (needs scipy).
+
+The embeddings ("all" features and "maintenance" features) are independent, so each is run in its own process.
+Each result is cached to disk, keyed by a hash of the scaled features, the method and its settings,
+so re-running the script without any changes to the "plant_features" table is almost instant.
+
+Run from the top directory of the repository:
+python Database/embeddings.py
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from bulk_writer import connect, transaction
+
+DATABASE_LOC = "Database/house_plants.db"
+CACHE_DIR = "Database/embedding_cache"
+# increase if a method changes, so old cached results are not re-used.
+CACHE_VERSION = 1
+
+# features used for the maintenance embedding, the all embedding uses every column of plant_features.
+MAINTENANCE_FEATURES = ["Sunlight_Ordinal", "Watering_Ordinal",
+                        "Maintenance_Ordinal", "Min_Temp_Degrees_C"]
+
+# number of neighbours each plant is connected to in the graph used by the spectral method.
+N_GRAPH_NEIGHBOURS = 10
+
+
+def min_max_scale(feature_array: np.ndarray) -> np.ndarray:
+    """
+    Scale each feature to be between 0 and 1 (same as sklearn's MinMaxScaler).
+    Features with a single value become 0.
+
+    Parameters
+    ----------
+    feature_array : np.ndarray
+        2D array, rows are plants and columns are features.
+
+    Returns
+    -------
+    np.ndarray
+        Scaled features.
+    """
+    mins = feature_array.min(axis=0)
+    spans = feature_array.max(axis=0) - mins
+    spans[spans == 0] = 1.0
+    return (feature_array - mins) / spans
+
+
+def _fix_signs(coords: np.ndarray) -> np.ndarray:
+    """
+    The sign of each PCA/spectral component is arbitrary, flip them so that the value furthest from 0
+    is always positive, so repeated runs give the same plot.
+    """
+    signs = np.sign(coords[np.abs(coords).argmax(axis=0), np.arange(coords.shape[1])])
+    return coords * np.where(signs == 0, 1, signs)
+
+
+def run_pca(features_scaled: np.ndarray, seed: int) -> np.ndarray:
+    """
+    Project the features onto their first two principal components.
+
+    Parameters
+    ----------
+    features_scaled : np.ndarray
+        2D array of scaled features, rows are plants.
+
+    seed : int
+        Not used (PCA is deterministic), kept so all methods can be called the same way.
+
+    Returns
+    -------
+    np.ndarray
+        2D array of the components (1 and 2), ready to plot as is.
+    """
+    centred = features_scaled - features_scaled.mean(axis=0)
+    _, _, components = np.linalg.svd(centred, full_matrices=False)
+    coords = centred @ components[:2].T
+
+    if coords.shape[1] < 2:
+        coords = np.hstack([coords, np.zeros((len(coords), 2 - coords.shape[1]))])
+    return _fix_signs(coords)
+
+
+def run_tsne(features_scaled: np.ndarray, seed: int) -> np.ndarray:
+    """
+    Run a t-SNE calculation, same settings as Step3_Dimensionality_Reduction.ipynb.
+
+    Parameters
+    ----------
+    features_scaled : np.ndarray
+        2D array of scaled features, rows are plants.
+
+    seed : int
+        Random seed, so the same features always give the same plot.
+
+    Returns
+    -------
+    np.ndarray
+        2D array of the t-SNE components (1 and 2), ready to plot as is.
+    """
+    from sklearn.manifold import TSNE
+
+    # perplexity must be less than the number of plants (only matters for very small catalogs).
+    perplexity = min(30.0, max(1.0, len(features_scaled) - 1.0))
+    tsne = TSNE(n_components=2, perplexity=perplexity, random_state=seed)
+    return tsne.fit_transform(features_scaled)
+
+
+def run_spectral(features_scaled: np.ndarray, seed: int) -> np.ndarray:
+    """
+    Spectral embedding of the k nearest neighbour graph of the plants.
+    Plants with similar features are connected in the graph and end up close together in the plot.
+
+    Parameters
+    ----------
+    features_scaled : np.ndarray
+        2D array of scaled features, rows are plants.
+
+    seed : int
+        Random seed for the eigenvector solver.
+
+    Returns
+    -------
+    np.ndarray
+        2D array of the embedding (components 1 and 2), ready to plot as is.
+    """
+    from scipy import sparse
+    from scipy.sparse.linalg import LinearOperator, eigsh
+
+    n_plants = len(features_scaled)
+    n_neighbours = min(N_GRAPH_NEIGHBOURS, n_plants - 1)
+    norms = (features_scaled ** 2).sum(axis=1)
+
+    rows, cols, dists = [], [], []
+    # done in chunks so the distance matrix stays small for large catalogs.
+    for start in range(0, n_plants, 256):
+        chunk = features_scaled[start:start + 256]
+        squared = norms[start:start + 256, None] + norms[None, :] - 2 * chunk @ features_scaled.T
+        squared[np.arange(len(chunk)), np.arange(start, start + len(chunk))] = np.inf
+        neighbours = np.argpartition(squared, n_neighbours - 1, axis=1)[:, :n_neighbours]
+
+        rows.append(np.repeat(np.arange(start, start + len(chunk)), n_neighbours))
+        cols.append(neighbours.ravel())
+        dists.append(np.sqrt(np.clip(np.take_along_axis(squared, neighbours, axis=1), 0, None)).ravel())
+
+    rows, cols, dists = np.concatenate(rows), np.concatenate(cols), np.concatenate(dists)
+
+    # gaussian weights, scaled by the typical neighbour distance.
+    scale = np.median(dists) if np.median(dists) > 0 else 1.0
+    graph = sparse.csr_matrix((np.exp(-(dists / scale) ** 2), (rows, cols)), shape=(n_plants, n_plants))
+    graph = graph.maximum(graph.T)
+
+    # plants with identical features form separate groups in the graph, a weak link between every pair
+    # of plants (spread over the whole graph) keeps it connected so the embedding does not collapse.
+    teleport = graph.sum() / n_plants ** 2 * 0.1
+    degree = np.asarray(graph.sum(axis=1)).ravel() + teleport * n_plants
+    inv_sqrt_degree = 1.0 / np.sqrt(degree)
+
+    # the eigenvectors with the largest eigenvalues of D^-1/2 (W + teleport) D^-1/2 give the embedding,
+    # the first one is constant (after scaling by D^-1/2) so is skipped.
+    def apply(vectors: np.ndarray) -> np.ndarray:
+        scaled = vectors * inv_sqrt_degree[:, None]
+        return (graph @ scaled + teleport * scaled.sum(axis=0)) * inv_sqrt_degree[:, None]
+
+    if n_plants <= 2000:
+        # a dense solver is quick at this size and, unlike eigsh, always converges.
+        _, eigenvectors = np.linalg.eigh(apply(np.eye(n_plants)))
+        eigenvectors = eigenvectors[:, -3:]
+    else:
+        operator = LinearOperator((n_plants, n_plants), dtype=float,
+                                  matvec=lambda vector: apply(vector.reshape(-1, 1)).ravel(),
+                                  matmat=apply)
+        start_vector = np.random.default_rng(seed).uniform(size=n_plants)
+        _, eigenvectors = eigsh(operator, k=3, which="LA", v0=start_vector, maxiter=n_plants * 10)
+
+    # eigenvalues are in ascending order.
+    return _fix_signs(eigenvectors[:, [1, 0]] * inv_sqrt_degree[:, None])
+
+
+EMBEDDING_METHODS = {
+    "tsne": run_tsne,
+    "pca": run_pca,
+    "spectral": run_spectral,
+}
+
+
+def embedding_cache_key(features_scaled: np.ndarray, method: str, seed: int) -> str:
+    """
+    Make a key for the cache from the features and the settings used.
+
+    Parameters
+    ----------
+    features_scaled : np.ndarray
+        2D array of scaled features, rows are plants.
+
+    method : str
+        Name of the method used (key of EMBEDDING_METHODS).
+
+    seed : int
+        Random seed used.
+
+    Returns
+    -------
+    str
+        Hex digest unique to the inputs.
+    """
+    features = np.ascontiguousarray(features_scaled, dtype=np.float64)
+    settings = {"method": method, "seed": seed, "shape": features.shape,
+                "n_graph_neighbours": N_GRAPH_NEIGHBOURS, "version": CACHE_VERSION}
+
+    hasher = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+    hasher.update(features.tobytes())
+    return hasher.hexdigest()
+
+
+def embed(feature_array: np.ndarray, method: str = "tsne", seed: int = 0,
+          cache_dir: Union[str, None] = CACHE_DIR) -> np.ndarray:
+    """
+    Scale the features and make a 2D embedding, re-using a cached result if there is one.
+
+    Parameters
+    ----------
+    feature_array : np.ndarray
+        2D array of (unscaled) features, rows are plants.
+
+    method : str
+        Method to use, one of the keys of EMBEDDING_METHODS.
+
+    seed : int
+        Random seed, so the same features always give the same plot.
+
+    cache_dir : str or None
+        Folder to save/load results to/from, None to turn off caching.
+
+    Returns
+    -------
+    np.ndarray
+        2D array of the embedding (components 1 and 2).
+    """
+    if method not in EMBEDDING_METHODS:
+        raise ValueError(f"Unknown embedding method: {method}, choose from: {list(EMBEDDING_METHODS)}")
+
+    features_scaled = min_max_scale(np.asarray(feature_array, dtype=float))
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, embedding_cache_key(features_scaled, method, seed) + ".npy")
+        if os.path.exists(cache_path):
+            return np.load(cache_path)
+
+    coords = EMBEDDING_METHODS[method](features_scaled, seed)
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        # written to a temp file first so a crash never leaves a half written result in the cache.
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, coords)
+        os.replace(tmp_path, cache_path)
+
+    return coords
+
+
+def run_embeddings(features_df: pd.DataFrame, method: str = "tsne", seed: int = 0,
+                   cache_dir: Union[str, None] = CACHE_DIR, n_processes: int = 2) -> dict:
+    """
+    Make the "all" and "maintenance" embeddings, each in its own process.
+
+    Parameters
+    ----------
+    features_df : pd.DataFrame
+        The plant_features table.
+
+    method : str
+        Method to use, one of the keys of EMBEDDING_METHODS.
+
+    seed : int
+        Random seed, so the same features always give the same plot.
+
+    cache_dir : str or None
+        Folder to save/load results to/from, None to turn off caching.
+
+    n_processes : int
+        Number of processes to use, 1 to run both in this process.
+
+    Returns
+    -------
+    dict
+        Keys are the column prefixes in the plotting table ("all_tsne" and "maintenance_tsne"),
+        values are the 2D arrays of each embedding.
+    """
+    feature_columns = [column for column in features_df.columns if column != "Plant_Name"]
+    # the column names are kept the same for every method so the app does not need to change.
+    jobs = {
+        "all_tsne": features_df[feature_columns].to_numpy(dtype=float),
+        "maintenance_tsne": features_df[MAINTENANCE_FEATURES].to_numpy(dtype=float),
+    }
+
+    if n_processes <= 1:
+        return {prefix: embed(array, method, seed, cache_dir) for prefix, array in jobs.items()}
+
+    with ProcessPoolExecutor(max_workers=n_processes) as executor:
+        futures = {prefix: executor.submit(embed, array, method, seed, cache_dir)
+                   for prefix, array in jobs.items()}
+        return {prefix: future.result() for prefix, future in futures.items()}
+
+
+def add_jitter(plotting_df: pd.DataFrame, features_df: pd.DataFrame,
+               rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Add the jittered columns to the plotting table (so plants with the same values do not overlap).
+
+    Parameters
+    ----------
+    plotting_df : pd.DataFrame
+        Rows of the plotting table, modified in place.
+
+    features_df : pd.DataFrame
+        Rows of the plant_features table, same row order as plotting_df.
+
+    rng : np.random.Generator
+        Used to make the jitter.
+
+    Returns
+    -------
+    pd.DataFrame
+        plotting_df with the jittered columns added.
+    """
+    n_plants = len(features_df)
+    features_df = features_df.reset_index(drop=True)
+    plotting_df["Sunlight_jittered"] = features_df["Sunlight_Ordinal"].to_numpy() + rng.uniform(-0.35, 0.35, n_plants)
+    plotting_df["Watering_jittered"] = features_df["Watering_Ordinal"].to_numpy() + rng.uniform(-0.35, 0.35, n_plants)
+    plotting_df["Max_Spread_Capped_jittered"] = (features_df["Max_Spread_Capped"].to_numpy()
+                                                 + rng.uniform(-0.5, 0.5, n_plants))
+    plotting_df["Max_Height_Capped_jittered"] = (features_df["Max_Height_Capped"].to_numpy()
+                                                 + rng.uniform(-0.5, 0.5, n_plants))
+    return plotting_df
+
+
+def make_plotting_df(features_df: pd.DataFrame, embeddings: dict, seed: int = 0) -> pd.DataFrame:
+    """
+    Build the plotting table from the embeddings, same columns as Step3_Dimensionality_Reduction.ipynb.
+
+    Parameters
+    ----------
+    features_df : pd.DataFrame
+        The plant_features table.
+
+    embeddings : dict
+        Output of run_embeddings.
+
+    seed : int
+        Random seed for the jitter.
+
+    Returns
+    -------
+    pd.DataFrame
+        The plotting table.
+    """
+    plotting_df = pd.DataFrame({
+        "Plant_Name": features_df["Plant_Name"],
+        "Maintenance_Ordinal": features_df["Maintenance_Ordinal"],
+    })
+    for prefix, coords in embeddings.items():
+        plotting_df[f"{prefix}_1"] = coords[:, 0]
+        plotting_df[f"{prefix}_2"] = coords[:, 1]
+
+    return add_jitter(plotting_df, features_df, np.random.default_rng(seed))
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Make the 2D coordinates for the scatter graphs and save them to the plotting table."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    parser.add_argument("--method", type=str, default="tsne", choices=list(EMBEDDING_METHODS),
+                        help="Method used to make each embedding.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed, so the same features always give the same plot.")
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR,
+                        help="Folder used to cache the embeddings.")
+    parser.add_argument("--no_cache", action="store_true",
+                        help="Always recompute the embeddings.")
+    parser.add_argument("--processes", type=int, default=2,
+                        help="Number of processes to use.")
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    features_df = pd.read_sql_query("SELECT * FROM plant_features", conn)
+    # plants with features that could not be read (see: feature_engineering.check_features) cannot be embedded.
+    is_complete = features_df.drop(columns="Plant_Name").notna().all(axis=1)
+    if not is_complete.all():
+        print(f"Skipped plants with missing features: {', '.join(features_df.loc[~is_complete, 'Plant_Name'])}")
+        features_df = features_df.loc[is_complete].reset_index(drop=True)
+
+    embeddings = run_embeddings(
+        features_df=features_df, method=args.method, seed=args.seed,
+        cache_dir=None if args.no_cache else args.cache_dir, n_processes=args.processes)
+    plotting_df = make_plotting_df(features_df=features_df, embeddings=embeddings, seed=args.seed)
+
+    with transaction(conn) as c:
+        c.execute("""DROP TABLE IF EXISTS plotting""")
+        plotting_df.to_sql("plotting", con=conn, if_exists="append", index=False)
+    conn.close()
+
+    print(f"Number of plants saved to plotting: {len(plotting_df)} (method: {args.method})")
+    print("Now re-run generate_sim_diff_table.py (and generate_sprite_atlas.py if used).")
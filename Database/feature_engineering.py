@@ -0,0 +1,442 @@
+"""
+This script makes the features used by the recommender engine and scatter graphs (the "plant_features" table)
+from the scraped plant details (the "plant_raw_data" table).
+It replaces the manual steps of Step2_Feature_Engineering.ipynb (same features, see the notebook for
+how each was chosen) so the table can be remade automatically, e.g. by build_pipeline.py.
+
+The features are made with vectorised pandas/numpy operations (make_features) instead of the notebook's
+for loops (kept as make_features_notebook, to check the two agree: benchmark_feature_engineering.py),
+and plant_raw_data is read and written in chunks (build_features), so millions of plants fit in memory.
+update_features remakes only some plants, as used by get_plant_details.py --incremental.
+Both fail (saving nothing) if a raw value cannot be read, as the notebook did (see: check_features).
+
+Run from the top directory of the repository:
+python Database/feature_engineering.py
+"""
+import argparse
+import sqlite3
+from typing import Iterator, Union
+
+import numpy as np
+import pandas as pd
+
+from bulk_writer import connect, transaction, write_rows
+
+DATABASE_LOC = "Database/house_plants.db"
+
+# Plants with missing info on their webpage, added by hand as it is available in paragraph form.
+MANUAL_FIXES = {
+    "Asplenium antiquum": {
+        "Sunlight": "Part shade",
+        "Watering": "Medium",
+        "Maintenance": "Low",
+        "Leafs": "None",  # Can be kept as none as this indicates non-colorful leaves which is correct.
+        "Fruits": "None",  # As above, does not produce fruit.
+    },
+    "Basella alba": {"Zones": "6 to 10"},
+}
+
+# The top 5 plant types, all others are moved into the group "Other".
+KEEP_PLANT_TYPES = ["Herbaceous perennial", "Broadleaf evergreen", "Bulb", "Vine", "Fern"]
+
+ZONE_TO_TEMP = {2: -45.6, 3: -40.0, 4: -34.4, 5: -28.9, 6: -23.3, 7: -17.8,
+                8: -12.2, 9: -6.7, 10: -1.1, 11: 4.4, 12: 10}
+
+# max heights and spreads are limited to this (to deal with outliers for modelling).
+SIZE_CAP = 20
+
+NON_FLOWERING_TERMS = ["Non-flowering"]
+RARELY_FLOWERING_TERMS = ["Rarely flowers indoors", "Rarely flowers"]
+
+# Ordinal encoding.
+SUNLIGHT_ORDINAL = {"Part shade": 1, "Part shade to full shade": 2,
+                    "Full sun to part shade": 3, "Full sun": 4}
+WATERING_ORDINAL = {"Dry": 1, "Dry to medium": 2, "Medium": 3, "Medium to wet": 4, "Wet": 5}
+MAINTENANCE_ORDINAL = {"Low": 1, "Medium": 2, "High": 3}
+FLOWERS_ORDINAL = {"No": 1, "Rarely": 2, "Yes": 3}
+
+# One hot encoding, keys are the column names and values the (column, category) they are 1 for.
+# The first category of each column (Broadleaf evergreen, Colorful and No Fruit) is left out.
+ONE_HOT_COLUMNS = {
+    "Type_Bulb": ("Plant_Type", "Bulb"),
+    "Type_Fern": ("Plant_Type", "Fern"),
+    "Type_Herbaceous_perennial": ("Plant_Type", "Herbaceous perennial"),
+    "Type_Other": ("Plant_Type", "Other"),
+    "Type_Vine": ("Plant_Type", "Vine"),
+    "Color_Not_Colorful": ("Colorful_Leaves", "Not Colorful"),
+    "Fruit_Yes": ("Fruit_Or_Not", "Yes"),
+}
+
+# plants read/written at a time.
+CHUNK_SIZE = 100000
+
+FEATURE_COLUMNS = [
+    "Plant_Name",
+    "Min_Temp_Degrees_C", "Min_Height", "Max_Height_Capped",
+    "Min_Spread", "Max_Spread_Capped",
+    "Sunlight_Ordinal", "Watering_Ordinal", "Maintenance_Ordinal",
+    "Flowers_Ordinal", "Type_Bulb", "Type_Fern",
+    "Type_Herbaceous_perennial", "Type_Other", "Type_Vine",
+    "Color_Not_Colorful", "Fruit_Yes"
+]
+
+
+def apply_manual_fixes(plant_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Fill in the info missing from the webpages of some plants (see: MANUAL_FIXES).
+
+    Parameters
+    ----------
+    plant_df : pd.DataFrame
+        Rows of the plant_raw_data table.
+
+    Returns
+    -------
+    pd.DataFrame
+        Copy of plant_df with the fixes applied (plant_df itself if there is nothing to fix).
+    """
+    to_fix = plant_df["Plant_Name"].isin(list(MANUAL_FIXES))
+    if not to_fix.any():
+        return plant_df
+
+    plant_df = plant_df.copy()
+    for idx, plant_name in plant_df.loc[to_fix, "Plant_Name"].items():
+        for column, value in MANUAL_FIXES[plant_name].items():
+            plant_df.at[idx, column] = value
+    return plant_df
+
+
+def make_features_notebook(plant_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Make the features of each plant, same code as Step2_Feature_Engineering.ipynb (slow for many plants).
+
+    Parameters
+    ----------
+    plant_df : pd.DataFrame
+        Rows of the plant_raw_data table.
+
+    Returns
+    -------
+    pd.DataFrame
+        Rows of the plant_features table (columns: FEATURE_COLUMNS).
+    """
+    plant_df = apply_manual_fixes(plant_df).copy()
+
+    plant_types = []
+    for plant in plant_df["Plant_Type"]:
+        if plant not in KEEP_PLANT_TYPES:
+            plant_types.append("Other")
+        else:
+            plant_types.append(plant)
+    plant_df["Plant_Type"] = plant_types
+
+    min_temp = []
+    for plant in plant_df["Zones"]:
+        min_temp.append(ZONE_TO_TEMP[int(float(plant.split(" ")[0]))])
+    plant_df["Min_Temp_Degrees_C"] = min_temp
+
+    # get min and max height and min and max spread.
+    for column, name in [("Heights", "Height"), ("Spreads", "Spread")]:
+        min_sizes, max_sizes = [], []
+        for size in plant_df[column]:
+            min_sizes.append(float(size.split(" ")[0]))
+            max_sizes.append(float(size.split(" ")[2]))
+        plant_df[f"Min_{name}"] = min_sizes
+        plant_df[f"Max_{name}_Capped"] = [min(size, SIZE_CAP) for size in max_sizes]
+
+    flower_or_not = []
+    for descript in plant_df["Bloom_Times"]:
+        if descript in NON_FLOWERING_TERMS:
+            flower_or_not.append("No")
+        elif descript in RARELY_FLOWERING_TERMS:
+            flower_or_not.append("Rarely")
+        else:
+            flower_or_not.append("Yes")
+    plant_df["Flowers_Or_Not"] = flower_or_not
+
+    colorful_leaves = []
+    for descript in plant_df["Leafs"]:
+        if "colorful" in descript.lower():
+            colorful_leaves.append("Colorful")
+        else:
+            colorful_leaves.append("Not Colorful")
+    plant_df["Colorful_Leaves"] = colorful_leaves
+
+    fruit_or_not = []
+    for descript in plant_df["Fruits"]:
+        if descript == "None":
+            fruit_or_not.append("No Fruit")
+        else:
+            fruit_or_not.append("Yes")
+    plant_df["Fruit_Or_Not"] = fruit_or_not
+
+    plant_df["Sunlight_Ordinal"] = plant_df["Sunlight"].map(SUNLIGHT_ORDINAL)
+    plant_df["Watering_Ordinal"] = plant_df["Watering"].map(WATERING_ORDINAL)
+    plant_df["Maintenance_Ordinal"] = plant_df["Maintenance"].map(MAINTENANCE_ORDINAL)
+    plant_df["Flowers_Ordinal"] = plant_df["Flowers_Or_Not"].map(FLOWERS_ORDINAL)
+
+    for one_hot_column, (column, category) in ONE_HOT_COLUMNS.items():
+        plant_df[one_hot_column] = (plant_df[column] == category).astype(int)
+
+    return plant_df[FEATURE_COLUMNS].reset_index(drop=True)
+
+
+def _factorize(values: pd.Series) -> tuple:
+    """
+    Codes and unique values of a column, the free text columns only have a few unique values
+    (e.g. "1.00 to 3.00 feet"), so each can be read once and the results spread with numpy indexing.
+    Missing values are given the code of the None added at the end of the unique values.
+    """
+    codes, uniques = pd.factorize(values)
+    return codes, list(uniques) + [None]
+
+
+def _map_unique(factorized: tuple, function) -> np.ndarray:
+    """
+    Apply a function to each value of a column (output of _factorize), calling it once per unique value.
+    Values the function raises an error for give NaN.
+    """
+    codes, uniques = factorized
+    results = []
+    for value in uniques:
+        try:
+            results.append(function(value))
+        except (ValueError, IndexError, KeyError, AttributeError):
+            results.append(np.nan)
+    return np.array(results, dtype=float)[codes]
+
+
+def _min_temp(zones: str) -> float:
+    # e.g. "10 to 11", the lowest zone gives the min temperature.
+    return ZONE_TO_TEMP[int(float(zones.split(" ")[0]))]
+
+
+# the categories one hot encoded (see: ONE_HOT_COLUMNS), keys are the category columns and values
+# the raw column and the rule giving the category of each value (same rules as the notebook).
+CATEGORY_RULES = {
+    "Plant_Type": ("Plant_Type", lambda plant_type: plant_type if plant_type in KEEP_PLANT_TYPES else "Other"),
+    "Colorful_Leaves": ("Leafs", lambda leafs: "Colorful" if "colorful" in leafs.lower() else "Not Colorful"),
+    "Fruit_Or_Not": ("Fruits", lambda fruits: "No Fruit" if fruits == "None" else "Yes"),
+}
+
+
+def make_features(plant_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Make the features of each plant, same as Step2_Feature_Engineering.ipynb but vectorised.
+
+    Parameters
+    ----------
+    plant_df : pd.DataFrame
+        Rows of the plant_raw_data table.
+
+    Returns
+    -------
+    pd.DataFrame
+        Rows of the plant_features table (columns: FEATURE_COLUMNS).
+        Values that cannot be read (e.g. an unknown zone) are NaN, see: check_features.
+    """
+    plant_df = apply_manual_fixes(plant_df)
+    features = {"Plant_Name": plant_df["Plant_Name"].to_numpy()}
+
+    features["Min_Temp_Degrees_C"] = _map_unique(_factorize(plant_df["Zones"]), _min_temp)
+
+    # e.g. "1.50 to 2.00 feet", max heights and spreads are capped.
+    for column, name in [("Heights", "Height"), ("Spreads", "Spread")]:
+        sizes = _factorize(plant_df[column])
+        features[f"Min_{name}"] = _map_unique(sizes, lambda size: float(size.split(" ")[0]))
+        features[f"Max_{name}_Capped"] = np.minimum(
+            _map_unique(sizes, lambda size: float(size.split(" ")[2])), SIZE_CAP)
+
+    features["Sunlight_Ordinal"] = plant_df["Sunlight"].map(SUNLIGHT_ORDINAL).to_numpy()
+    features["Watering_Ordinal"] = plant_df["Watering"].map(WATERING_ORDINAL).to_numpy()
+    features["Maintenance_Ordinal"] = plant_df["Maintenance"].map(MAINTENANCE_ORDINAL).to_numpy()
+    features["Flowers_Ordinal"] = np.select(
+        [plant_df["Bloom_Times"].isin(NON_FLOWERING_TERMS), plant_df["Bloom_Times"].isin(RARELY_FLOWERING_TERMS)],
+        [FLOWERS_ORDINAL["No"], FLOWERS_ORDINAL["Rarely"]], default=FLOWERS_ORDINAL["Yes"])
+
+    factorized = {column: _factorize(plant_df[raw_column]) for column, (raw_column, _) in CATEGORY_RULES.items()}
+    for one_hot_column, (column, category) in ONE_HOT_COLUMNS.items():
+        rule = CATEGORY_RULES[column][1]
+        is_category = _map_unique(factorized[column], lambda value: rule(value) == category)
+        features[one_hot_column] = (is_category == 1).astype(int)
+
+    return pd.DataFrame(features)
+
+
+def check_features(features_df: pd.DataFrame):
+    """
+    Raise an error if any value could not be read (NaN in features_df), as the notebook did.
+    Saving them would give NaN coordinates on the scatter graphs (see: place_new_plants.py) and
+    NaN similarities, the raw values can be fixed with MANUAL_FIXES.
+
+    Parameters
+    ----------
+    features_df : pd.DataFrame
+        Output of make_features.
+
+    Raises
+    ------
+    ValueError
+        Lists each plant with values that could not be read and the features affected.
+    """
+    unreadable = features_df[FEATURE_COLUMNS[1:]].isna()
+    if not unreadable.to_numpy().any():
+        return
+    problems = [f"{plant_name} ({', '.join(unreadable.columns[row])})"
+                for plant_name, row in zip(features_df["Plant_Name"], unreadable.to_numpy()) if row.any()]
+    raise ValueError(f"Values that could not be read (add a fix to MANUAL_FIXES) for {len(problems)} plant(s): "
+                     + "; ".join(problems))
+
+
+def iter_raw_data(conn: sqlite3.Connection, plant_names: Union[list, None] = None,
+                  chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Read the plant_raw_data table in chunks.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database.
+
+    plant_names : list or None
+        Only read these plants, None to read all.
+
+    chunk_size : int
+        Number of plants in each chunk.
+
+    Yields
+    ------
+    pd.DataFrame
+        Rows of the plant_raw_data table.
+    """
+    query = """SELECT * FROM plant_raw_data"""
+    if plant_names is None:
+        yield from pd.read_sql_query(query, conn, chunksize=chunk_size)
+        return
+
+    # SQLite limits the number of parameters of a query.
+    step = min(chunk_size, 900)
+    for start in range(0, len(plant_names), step):
+        names = list(plant_names[start:start + step])
+        yield pd.read_sql_query(query + f""" WHERE Plant_Name IN ({", ".join("?" * len(names))})""",
+                                conn, params=names)
+
+
+def create_features_table(c: sqlite3.Cursor):
+    """Make the (empty) plant_features table if it does not exist."""
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS plant_features(
+        Plant_Name TEXT PRIMARY KEY,
+        Min_Temp_Degrees_C REAL,
+        Min_Height REAL,
+        Max_Height_Capped REAL,
+        Min_Spread REAL,
+        Max_Spread_Capped REAL,
+        Sunlight_Ordinal INTEGER,
+        Watering_Ordinal INTEGER,
+        Maintenance_Ordinal INTEGER,
+        Flowers_Ordinal INTEGER,
+        Type_Bulb INTEGER,
+        Type_Fern INTEGER,
+        Type_Herbaceous_perennial INTEGER,
+        Type_Other INTEGER,
+        Type_Vine INTEGER,
+        Color_Not_Colorful INTEGER,
+        Fruit_Yes INTEGER
+        )
+    """)
+
+
+def _write_features(c: sqlite3.Cursor, features_df: pd.DataFrame):
+    # tolist gives python types (sqlite3 does not know numpy types), SQLite saves NaN as NULL.
+    rows = zip(*(features_df[column].tolist() for column in FEATURE_COLUMNS))
+    write_rows(c, "plant_features", columns=FEATURE_COLUMNS, rows=rows, key_column="Plant_Name")
+
+
+def build_features(conn: sqlite3.Connection, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Remake the plant_features table from the plant_raw_data table, a chunk of plants at a time
+    (in one transaction).
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database.
+
+    chunk_size : int
+        Number of plants in each chunk.
+
+    Returns
+    -------
+    int
+        Number of plants saved.
+
+    Raises
+    ------
+    ValueError
+        If any value could not be read (see: check_features), nothing is saved.
+    """
+    n_plants = 0
+    # one transaction, so readers see the old table until the new one is complete.
+    with transaction(conn) as c:
+        c.execute("""DROP TABLE IF EXISTS plant_features""")
+        create_features_table(c)
+        for plant_df in iter_raw_data(conn, chunk_size=chunk_size):
+            features_df = make_features(plant_df)
+            check_features(features_df)
+            _write_features(c, features_df)
+            n_plants += len(plant_df)
+    return n_plants
+
+
+def update_features(conn: sqlite3.Connection, plant_names: list, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Remake the features of some plants (e.g. those new or changed in plant_raw_data), the rest are kept.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database.
+
+    plant_names : list
+        Plants to remake.
+
+    chunk_size : int
+        Number of plants in each chunk.
+
+    Returns
+    -------
+    int
+        Number of plants saved.
+
+    Raises
+    ------
+    ValueError
+        If any value could not be read (see: check_features), nothing is saved.
+    """
+    n_plants = 0
+    with transaction(conn) as c:
+        create_features_table(c)
+        for plant_df in iter_raw_data(conn, plant_names=plant_names, chunk_size=chunk_size):
+            features_df = make_features(plant_df)
+            check_features(features_df)
+            _write_features(c, features_df)
+            n_plants += len(plant_df)
+    return n_plants
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Make the features of each plant and save them to the plant_features table."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE,
+                        help="Number of plants read/written at a time.")
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    n_plants = build_features(conn, chunk_size=args.chunk_size)
+    conn.close()
+
+    print(f"Number of plants saved to plant_features: {n_plants}")
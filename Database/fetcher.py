@@ -0,0 +1,267 @@
+"""
+Concurrent, rate limited fetching of webpages for the Database scripts.
+
+Pages are downloaded by a pool of threads sharing one requests.Session (so connections are kept alive
+and re-used) while the calling thread parses the pages as they arrive, so parsing and downloading overlap.
+Requests to each website (host) are limited by a token bucket so the websites are not overloaded,
+failed requests are retried with an exponential backoff.
+Responses can also be cached on disk and replayed offline, see: http_cache.py.
+
+Any URL can be given, so the scripts can also be run against a local copy of a website, e.g.
+python -m http.server (useful for checking the parsing code without hitting the real website).
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from http_cache import CACHE_DIR, HTTPCache, OfflineCacheMiss
+
+# default limits, the scripts previously waited 2 seconds between each request.
+REQUESTS_PER_SECOND = 1.0
+BURST = 2
+MAX_WORKERS = 4
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 1.0
+TIMEOUT_SECONDS = 20.0
+
+# responses worth retrying, others (e.g. 404) will not change by asking again.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36'}
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket, each request takes a token and tokens are added back at a fixed rate.
+    Allows short bursts of requests while keeping the average rate below the limit.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second (the average number of requests per second allowed).
+
+    burst : int
+        Maximum number of tokens that can be saved up.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a token is available and take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last_time) * self.rate)
+                self._last_time = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Fetcher:
+    """
+    Download webpages with a shared connection pool, a per host rate limit, retries and timeouts.
+
+    Parameters
+    ----------
+    requests_per_second : float
+        Average number of requests per second allowed to each host.
+
+    burst : int
+        Number of requests that can be made at once to a host before the rate limit applies.
+
+    max_workers : int
+        Number of pages downloaded at the same time.
+
+    max_retries : int
+        Number of times a failed request is retried.
+
+    backoff_seconds : float
+        Wait before the first retry, doubled for each following retry.
+
+    timeout_seconds : float
+        Timeout for connecting to and for reading from the website.
+
+    cache : HTTPCache
+        If given, responses are saved to/replayed from this cache (see: http_cache.py).
+    """
+
+    def __init__(self, requests_per_second: float = REQUESTS_PER_SECOND, burst: int = BURST,
+                 max_workers: int = MAX_WORKERS, max_retries: int = MAX_RETRIES,
+                 backoff_seconds: float = BACKOFF_SECONDS, timeout_seconds: float = TIMEOUT_SECONDS,
+                 cache: HTTPCache = None):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.cache = cache
+
+        self.session = requests.Session()
+        self.session.headers.update(REQUEST_HEADERS)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._buckets = {}
+        self._buckets_lock = threading.Lock()
+
+    def _bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        with self._buckets_lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.requests_per_second, self.burst)
+            return self._buckets[host]
+
+    def fetch(self, url: str, params: dict = None, **kwargs) -> requests.Response:
+        """
+        Download a single URL, retrying connection errors, timeouts and server errors.
+        If a cache is used, unchanged responses are replayed from it instead of downloaded again.
+
+        Parameters
+        ----------
+        url : str
+            URL to download.
+
+        params : dict
+            Query parameters to send with the request.
+
+        **kwargs
+            Passed on to requests.Session.get (e.g. headers or stream).
+
+        Returns
+        -------
+        requests.Response
+            The successful response.
+
+        Raises
+        ------
+        requests.RequestException
+            If the request still fails after all retries
+            (or OfflineCacheMiss if the cache is offline and the request has not been cached).
+        """
+        kwargs.setdefault("timeout", self.timeout_seconds)
+
+        entry = None
+        if self.cache is not None:
+            entry = self.cache.lookup(url, params)
+            if entry is not None and self.cache.is_fresh(entry):
+                return self.cache.replay(entry)
+            if self.cache.offline:
+                raise OfflineCacheMiss(f"Not in the cache: {url}")
+            kwargs["headers"] = {**kwargs.get("headers", {}), **self.cache.conditional_headers(entry)}
+
+        for attempt in range(self.max_retries + 1):
+            self._bucket(url).acquire()
+            wait = self.backoff_seconds * 2 ** attempt * random.uniform(0.5, 1.5)
+            try:
+                response = self.session.get(url, params=params, **kwargs)
+                if response.status_code == 304 and entry is not None:
+                    self.cache.touch(entry)
+                    return self.cache.replay(entry)
+
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    # streamed responses are saved to the cache by the caller, once fully read.
+                    if self.cache is not None and not kwargs.get("stream"):
+                        self.cache.store(url, params, response)
+                    return response
+
+                # website asked us to slow down, respect how long it asked for (if given in seconds).
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    wait = max(wait, float(retry_after))
+                if attempt == self.max_retries:
+                    response.raise_for_status()
+
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            time.sleep(wait)
+
+    def fetch_all(self, urls: dict, parse: Callable = None) -> Iterator[Tuple[str, object]]:
+        """
+        Download many URLs at once and parse each as soon as it arrives.
+
+        Parameters
+        ----------
+        urls : dict
+            Keys are used to identify each result (e.g. plant name), values are the URLs to download.
+
+        parse : Callable
+            Called with the content (bytes) of each page, in the calling thread.
+            If None, the content is returned as is.
+
+        Yields
+        ------
+        tuple
+            The key and the parsed page, in the order the downloads finish.
+            None is given instead of the parsed page if the download failed.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.fetch, url): key for key, url in urls.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    content = future.result().content
+                except requests.RequestException as error:
+                    print(f"Failed to download: {key} ({error})")
+                    yield key, None
+                    continue
+                yield key, content if parse is None else parse(content)
+
+
+def add_fetcher_arguments(parser: argparse.ArgumentParser):
+    """
+    Add the command line options used to make a Fetcher (see: fetcher_from_args) to a script's parser.
+
+    Parameters
+    ----------
+    parser : argparse.ArgumentParser
+        Parser of the script.
+    """
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help="Number of webpages downloaded at the same time.")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND,
+                        help="Average number of requests per second allowed to each website.")
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR,
+                        help="Folder used to cache downloaded webpages/images.")
+    parser.add_argument("--no_cache", action="store_true",
+                        help="Do not use or update the cache.")
+    parser.add_argument("--offline", action="store_true",
+                        help="Only replay cached webpages/images, make no requests.")
+
+
+def fetcher_from_args(args: argparse.Namespace) -> Fetcher:
+    """
+    Make a Fetcher from the command line options added by add_fetcher_arguments.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed command line options.
+
+    Returns
+    -------
+    Fetcher
+        Ready to use.
+    """
+    cache = None if args.no_cache else HTTPCache(cache_dir=args.cache_dir, offline=args.offline)
+    return Fetcher(requests_per_second=args.rate, max_workers=args.workers, cache=cache)
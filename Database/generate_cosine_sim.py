@@ -0,0 +1,97 @@
+"""
+This script makes the cosine similarity matrix used by the recommender engine (the "cosine_sim" table)
+from the features of each plant (the "plant_features" table).
+It replaces the manual steps of Step4_Recommender_System.ipynb so the table can be remade automatically,
+e.g. by build_pipeline.py.
+
+Run from the top directory of the repository:
+python Database/generate_cosine_sim.py
+"""
+import argparse
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from bulk_writer import connect, transaction
+from embeddings import min_max_scale
+
+DATABASE_LOC = "Database/house_plants.db"
+
+
+def normalise_features(feature_array: np.ndarray) -> np.ndarray:
+    """
+    MinMaxScale the features and scale each plant's features to a length of 1,
+    so the dot product of two plants is their cosine similarity.
+
+    Parameters
+    ----------
+    feature_array: np.ndarray
+        Array of features for the calculation.
+
+    Returns
+    ----------
+    np.ndarray
+        Normalised features.
+    """
+    features_scaled = min_max_scale(np.asarray(feature_array, dtype=float))
+    norms = np.linalg.norm(features_scaled, axis=1, keepdims=True)
+    # plants with all features 0 have no direction, their similarity to every plant is 0.
+    norms[norms == 0] = 1.0
+    return features_scaled / norms
+
+
+def calc_cosine_sim(feature_array: np.ndarray) -> np.ndarray:
+    """
+    Calculate the cosine similarity matrix for an array of features.
+    MinMaxScaling performed prior to the calculation (same as sklearn's cosine_similarity).
+
+    Parameters
+    ----------
+    feature_array: np.ndarray
+        Array of features for the calculation.
+
+    Returns
+    ----------
+    np.ndarray
+        Cosine similarity matrix.
+    """
+    features_normed = normalise_features(feature_array)
+    return features_normed @ features_normed.T
+
+
+def save_cosine_sim(conn: sqlite3.Connection, cosine_sim: np.ndarray):
+    """
+    Remake the cosine_sim table (the matrix is stored as json, as read by app.py).
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database.
+
+    cosine_sim : np.ndarray
+        Output of calc_cosine_sim.
+    """
+    with transaction(conn) as c:
+        c.execute("""DROP TABLE IF EXISTS cosine_sim""")
+        c.execute("""CREATE TABLE cosine_sim (id INTEGER PRIMARY KEY, array BLOB)""")
+        c.execute("""INSERT INTO cosine_sim VALUES (?,?)""", (None, json.dumps(cosine_sim.tolist())))
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Make the cosine similarity matrix of the plants and save it to the cosine_sim table."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    features_df = pd.read_sql_query("SELECT * FROM plant_features", conn)
+
+    cosine_sim = calc_cosine_sim(features_df.drop(columns="Plant_Name").to_numpy())
+    save_cosine_sim(conn, cosine_sim)
+    conn.close()
+
+    print(f"Cosine similarity matrix saved for {len(features_df)} plants.")
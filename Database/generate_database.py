@@ -2,137 +2,187 @@
 This script does the following:
 
 1. Extract all unique Latin names for the plant avaialble to buy from blomsterlandet.se
-and stored these in a database.
+(every category and page of each retailer's catalogue, see: catalog_crawler.py)
+and stored these in a database, as they are found.
 
 2. Use google's query function to run X google searches on the first Latin names
 to get the webaddress for a
 (googles query )
 And store this in a database (both those that "worked" and those that did not).
+The searches are queued (see: search_scheduler.py) so update_database.py can carry on with them
+on the following days, once the daily quota has reset.
 
 3.
 """
+import argparse
 import configparser
-import requests
-from bs4 import BeautifulSoup
+import os
 import sqlite3
+from contextlib import ExitStack
+from typing import Tuple
 
 import helper_functions
+from bulk_writer import BulkWriter
+from catalog_crawler import FIXTURE_DIR, MAX_PAGES, RETAILERS, FixtureServer, crawl_catalogs
+from fetcher import Fetcher, add_fetcher_arguments, fetcher_from_args
+from search_scheduler import SearchJobQueue, add_search_arguments, backend_from_args
+from upsert import ensure_tracking_columns, print_report, upsert_rows
 
 
 config = configparser.ConfigParser()
 config.read("Database/config.ini")
-SEARCH_ENGINE_ID = config["Google Params"]["SEARCH_ENGINE_ID"]
-API_KEY = config["Google Params"]["API_KEY"]
-DATABASE_LOC = r"C:\Users\Rory Crean\Dropbox (lkgroup)\Backup_HardDrive\Postdoc\PyForFun\House_Plant_Recommender\Database\house_plants.db"
+# fallback so the script can still be run with --fake_results without a config file.
+SEARCH_ENGINE_ID = config.get("Google Params", "SEARCH_ENGINE_ID", fallback="")
+API_KEY = config.get("Google Params", "API_KEY", fallback="")
+DATABASE_LOC = "Database/house_plants.db"
+# the local copies of the catalogues can be crawled as fast as they are served.
+FIXTURE_REQUESTS_PER_SECOND = 1000
 
-green_url = r"https://www.blomsterlandet.se/produkter/vaxter/inomhus/grona-vaxter/?page=50&sorting=Name&filterDefaults=false"
-flowering_url = r"https://www.blomsterlandet.se/produkter/vaxter/inomhus/blommande-vaxter/?page=50&sorting=Name&filterDefaults=false"
 
-
-# Which range of list items to run through the google search API.
-SUBSET_START = 0
-SUBSET_END = 95
-
-
-def get_blomsterlandet_plants(url: str) -> list:
+def save_catalog_names(conn: sqlite3.Connection, retailers: list, fetcher: Fetcher,
+                       max_pages: int = MAX_PAGES) -> Tuple[dict, set]:
     """
-    Using the website: https://www.blomsterlandet.se to identify all the houseplants they have available
-    on a given product page. Specifically extracts the latin name assinged to each product.
+    Crawl the catalogues of the retailers for the Latin name of each plant they sell (see: catalog_crawler.py)
+    and save the names to the latin_names table as each page arrives.
     Helper function for step 1.
 
     Parameters
     ----------
-    url : str
-        Product page web address from blomsterlandet.se to scrape from.
-
-    Returns
-    -------
-    set
-        The scientific names of each plant.
-    """
-    r = requests.get(url)
-    soup = BeautifulSoup(r.content, 'lxml')
-
-    science_section = soup.find_all(
-        'p', class_="ProductCardBodystyled__ScientificName-lrzi29-3 flSCLr")
-
-    # (first make set to remove duplicates)
-    return list({science_name.get_text() for science_name in science_section})
-
-
-if __name__ == '__main__':
-
-    # 1. Generate a set of all Latin_names available to purchase from blomsterlandet.se
-    green_plants = get_blomsterlandet_plants(url=green_url)
-    flowering_plants = get_blomsterlandet_plants(url=flowering_url)
-    plant_names = list(set(green_plants + flowering_plants))
-
-    # reformat to that desired by the database
-    plant_names_db = [(name, ) for name in plant_names]
-
-    conn = sqlite3.connect(DATABASE_LOC)
-    c = conn.cursor()
-
-    c.execute("""DROP TABLE IF EXISTS latin_names""")
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS latin_names(
-        Plant_Name VARCHAR (100) PRIMARY KEY
-        )
-    """)
-
-    c.executemany("""INSERT INTO latin_names VALUES (?)""", plant_names_db)
-    conn.commit()
+    conn : sqlite3.Connection
+        Connection to the database (the latin_names table must exist).
 
-    # read back out of database to ensure use same order for each follow up run.
-    database_names = []
-    c.execute("""SELECT * FROM 'latin_names'""")
-    for row in c.fetchall():
-        database_names.append(row)
+    retailers : list
+        Retailers to crawl (see: catalog_crawler.RETAILERS).
 
-    conn.close()
+    fetcher : Fetcher
+        Used to download the pages.
 
-    # reformat for easy operations.
-    latin_names = [name[0] for name in database_names]
+    max_pages : int
+        Maximum number of pages downloaded from each retailer.
 
-    # 2. Run google search on the first 95 plants
-    latin_names_subset = list(latin_names)[SUBSET_START:SUBSET_END]
-
-    plant_with_link, plant_no_link = helper_functions.search_for_plant(
-        latin_names=latin_names_subset, api_key=API_KEY, search_engine_id=SEARCH_ENGINE_ID)
+    Returns
+    -------
+    dict
+        Same as upsert.upsert_rows, for all the names found.
 
-    # 2.5 Save these to the database
-    conn = sqlite3.connect(DATABASE_LOC)
+    set
+        The Latin names found.
+    """
     c = conn.cursor()
+    report = {"new": [], "changed": [], "unchanged": []}
+    plant_names = set()
+    for retailer_name, url, names in crawl_catalogs(retailers, fetcher=fetcher, max_pages=max_pages):
+        # the same plant is often listed in several categories (and retailers).
+        new_names = [name for name in names if name not in plant_names]
+        if not new_names:
+            continue
+        plant_names.update(new_names)
+        page_report = upsert_rows(c, table="latin_names", columns=["Plant_Name"],
+                                  rows=[(name, ) for name in new_names])
+        conn.commit()
+        for label, keys in page_report.items():
+            report[label].extend(keys)
+        print(f"{retailer_name}: {len(new_names)} new names from {url} ({len(plant_names)} so far)")
+    return report, plant_names
 
-    c.execute("""DROP TABLE IF EXISTS hyperlinks""")
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS hyperlinks(
-        Plant_Name VARCHAR (100) PRIMARY KEY,
-        url VARCHAR (200)
-        )
-    """)
-
-    c.executemany("""INSERT INTO hyperlinks VALUES (?,?)""", plant_with_link)
-    c.executemany("""INSERT INTO hyperlinks VALUES (?,?)""", plant_no_link)
-    conn.commit()
-
-    c.execute("""SELECT * FROM 'hyperlinks'""")
 
-    output = []
-    found, not_found = 0, 0
-
-    for row in c.fetchall():
-        output.append(row)
+if __name__ == '__main__':
 
-        if row[1] == "no link found":
-            not_found += 1
+    parser_descrip = "Get the plant names from the retailers and google search for a link to each plant."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep the existing tables, add any new plant names and only "
+                             "google search for plants not searched before.")
+    parser.add_argument("--retailers", type=str, nargs="+", default=list(RETAILERS), choices=list(RETAILERS),
+                        help="Retailers to get the plant names from.")
+    parser.add_argument("--max_pages", type=int, default=MAX_PAGES,
+                        help="Maximum number of catalogue pages downloaded from each retailer.")
+    parser.add_argument("--fixture_dir", type=str, default=None,
+                        help=f"Crawl saved copies of the catalogue pages in this folder instead of the websites "
+                             f"(e.g. {FIXTURE_DIR}), use with --fake_results and a test --database.")
+    add_fetcher_arguments(parser)
+    add_search_arguments(parser)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    args = parser.parse_args()
+    fetcher = fetcher_from_args(args)
+    retailers = [RETAILERS[name] for name in args.retailers]
+
+    fixture_servers = ExitStack()
+    if args.fixture_dir is not None:
+        # crawl local copies of the catalogues instead, no need for a rate limit or cache.
+        fetcher = Fetcher(requests_per_second=FIXTURE_REQUESTS_PER_SECOND, burst=args.workers,
+                          max_workers=args.workers)
+        retailers = [retailer.rebased(fixture_servers.enter_context(
+            FixtureServer(os.path.join(args.fixture_dir, retailer.name))).url) for retailer in retailers]
+
+    # without --incremental the tables are remade, in a copy of the database that replaces it
+    # once finished, so the app never reads a half built database (see: bulk_writer.py).
+    with BulkWriter(args.database, staging=not args.incremental) as conn:
+        c = conn.cursor()
+
+        if not args.incremental:
+            c.execute("""DROP TABLE IF EXISTS latin_names""")
+
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS latin_names(
+            Plant_Name VARCHAR (100) PRIMARY KEY
+            )
+        """)
+        ensure_tracking_columns(c, "latin_names")
+
+        # 1. Save all Latin_names available to purchase from the retailers, as they are found.
+        report, plant_names = save_catalog_names(conn, retailers=retailers, fetcher=fetcher,
+                                                 max_pages=args.max_pages)
+        fixture_servers.close()
+
+        c.execute("""SELECT Plant_Name FROM latin_names""")
+        removed = [row[0] for row in c.fetchall() if row[0] not in plant_names]
+        print_report("latin_names", report, removed)
+
+        # read back out of database to ensure use same order for each follow up run.
+        database_names = []
+        c.execute("""SELECT Plant_Name FROM 'latin_names'""")
+        for row in c.fetchall():
+            database_names.append(row)
+
+        # reformat for easy operations.
+        latin_names = [name[0] for name in database_names]
+
+        # 2. Google search for the missouribotanicalgarden.org page of each plant.
+        # The searches are queued in the database, each run makes as many as today's quota allows
+        # and update_database.py carries on with the rest on the following days.
+        queue = SearchJobQueue(conn, job_type="hyperlinks")
+        if not args.incremental:
+            c.execute("""DROP TABLE IF EXISTS hyperlinks""")
+            c.execute("""DELETE FROM search_jobs WHERE Job_Type='hyperlinks'""")
+            conn.commit()
         else:
-            found += 1
-
-    print(f"Total number of links now searched: {len(output)}")
-    print(f"Number of links found: {found}")
-    print(f"Number of links not found: {not_found}")
-
-    c.close()
+            # skip plants searched for before the queue was used (plants already in the queue are skipped anyway).
+            c.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name='hyperlinks'""")
+            if c.fetchone() is not None:
+                c.execute("""SELECT Plant_Name FROM 'hyperlinks'""")
+                searched = {row[0] for row in c.fetchall()}
+                latin_names = [name for name in latin_names if name not in searched]
+        print(f"Number of plants added to the search queue: {queue.add(latin_names)}")
+
+        helper_functions.run_link_search_queue(
+            conn, backend=backend_from_args(args, api_key=API_KEY, search_engine_id=SEARCH_ENGINE_ID),
+            daily_quota=args.daily_quota, retry_failed=args.retry_failed)
+
+        c.execute("""SELECT * FROM 'hyperlinks'""")
+
+        output = []
+        found, not_found = 0, 0
+
+        for row in c.fetchall():
+            output.append(row)
+
+            if row[1] == "no link found":
+                not_found += 1
+            else:
+                found += 1
+
+        print(f"Total number of links now searched: {len(output)}")
+        print(f"Number of links found: {found}")
+        print(f"Number of links not found: {not_found}")
@@ -0,0 +1,84 @@
+"""
+This script makes a tiny, blurred copy of each plant image and stores it in the "plant_images" table
+(column: "Placeholder") as an inline data URI.
+
+The Dash app shows the placeholder inside each card until the full image has been loaded,
+the full images are only requested once a card is (nearly) scrolled into view.
+
+Run from the top directory of the repository:
+python Database/generate_image_placeholders.py
+"""
+import argparse
+import base64
+import io
+
+from PIL import Image, ImageFilter
+
+from bulk_writer import connect, transaction
+
+DATABASE_LOC = "Database/house_plants.db"
+
+# width (in pixels) of each placeholder, ~150 bytes each once encoded.
+PLACEHOLDER_WIDTH = 16
+
+
+def make_placeholder(image_path: str, width: int = PLACEHOLDER_WIDTH) -> str:
+    """
+    Shrink and blur an image so it can be inlined into the page as a placeholder.
+
+    Parameters
+    ----------
+    image_path : str
+        Path to the image to make a placeholder for.
+
+    width : int
+        Width (in pixels) of the placeholder, the aspect ratio of the image is kept.
+
+    Returns
+    -------
+    str
+        The placeholder as a data URI, ready to use as the "src" of an image.
+    """
+    image = Image.open(image_path)
+    # draft lets Pillow decode JPEGs at a reduced size, much faster for large files.
+    image.draft("RGB", (width * 4, width * 4))
+    image = image.convert("RGB")
+
+    height = max(1, round(image.height * width / image.width))
+    image = image.resize((width, height), Image.LANCZOS)
+    image = image.filter(ImageFilter.GaussianBlur(radius=1))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=40)
+    encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+    return "data:image/webp;base64," + encoded
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Generate blurred inline placeholders for each plant image used by the Dash app."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    c = conn.cursor()
+    c.execute("""SELECT Plant_Name, File_Path FROM plant_images WHERE File_Path<>'no image found' """)
+    plant_images = c.fetchall()
+
+    placeholders = [(make_placeholder(file_path), plant_name)
+                    for plant_name, file_path in plant_images]
+
+    with transaction(conn) as c:
+        # add the new column if this is the first time the script is run.
+        c.execute("""PRAGMA table_info(plant_images)""")
+        if "Placeholder" not in [row[1] for row in c.fetchall()]:
+            c.execute("""ALTER TABLE plant_images ADD COLUMN Placeholder TEXT""")
+
+        c.executemany("""UPDATE plant_images SET Placeholder=? WHERE Plant_Name=?""", placeholders)
+    conn.close()
+
+    total_size = sum(len(placeholder) for placeholder, _ in placeholders)
+    print(f"Number of placeholders generated: {len(placeholders)}")
+    print(f"Average placeholder size: {total_size / max(1, len(placeholders)):.0f} bytes")
@@ -0,0 +1,187 @@
+"""
+This script generates smaller copies of each plant image in modern image formats
+(WebP and, if the installed version of Pillow supports it, AVIF) for the Dash app.
+
+Several widths are made for each image so the browser can pick the smallest image that
+fills out a card (via the "srcset" and "sizes" attributes). The file name of each copy contains
+a hash of its content, so a file can be cached forever by the browser and a new file name is
+generated whenever the image changes.
+
+The srcset strings for each plant are then saved to the "plant_images" table
+(columns: "Webp_Srcset" and "Avif_Srcset").
+
+Run from the top directory of the repository:
+python Database/generate_image_variants.py
+"""
+import argparse
+import hashlib
+import io
+import os
+
+from PIL import Image, features
+
+from bulk_writer import connect, transaction
+
+DATABASE_LOC = "Database/house_plants.db"
+VARIANT_DIR = "assets/variants"
+
+# widths (in pixels) to generate, cards are at most ~450 px wide so 960 covers 2x screens.
+VARIANT_WIDTHS = (240, 480, 960)
+
+# file extension: (Pillow format name, save options)
+FORMATS = {
+    "webp": ("WEBP", {"quality": 75, "method": 6}),
+    "avif": ("AVIF", {"quality": 55}),
+}
+
+
+def available_formats() -> list:
+    """
+    Determine which of the image formats in FORMATS the installed version of Pillow can write.
+
+    Returns
+    -------
+    list
+        File extensions of the formats that can be generated.
+    """
+    return [ext for ext in FORMATS if features.check(ext)]
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Short hash of a file's content, used to make each file name unique to its content.
+
+    Parameters
+    ----------
+    data : bytes
+        File content to hash.
+
+    Returns
+    -------
+    str
+        First 12 characters of the sha256 hex digest.
+    """
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def make_image_variants(image_path: str, out_dir: str, widths: tuple, file_types: list) -> dict:
+    """
+    Resize an image to each width requested and save each one in each of the requested formats.
+    Images are never enlarged, if the image is smaller than all widths requested,
+    a single copy at the original width is made instead.
+
+    Parameters
+    ----------
+    image_path : str
+        Path to the (square padded) image to make variants from.
+
+    out_dir : str
+        Folder to save the variants to.
+
+    widths : tuple
+        Widths (in pixels) to generate.
+
+    file_types : list
+        File extensions of the formats to generate (keys of FORMATS).
+
+    Returns
+    -------
+    dict[str, list]
+        Keys are the file extensions, values are a list of tuples.
+        First element of each tuple is the width, second is the file path to the variant.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+
+    image = Image.open(image_path)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    widths_to_make = [width for width in widths if width < image.width]
+    if widths_to_make == []:
+        widths_to_make = [image.width]
+
+    variants = {file_type: [] for file_type in file_types}
+    for width in widths_to_make:
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS)
+
+        for file_type in file_types:
+            pil_format, save_options = FORMATS[file_type]
+            buffer = io.BytesIO()
+            resized.save(buffer, format=pil_format, **save_options)
+            data = buffer.getvalue()
+
+            file_name = f"{stem}_{width}w.{content_hash(data)}.{file_type}"
+            file_path = os.path.join(out_dir, file_name).replace(os.sep, "/")
+
+            # same name means same content, so nothing to do.
+            if not os.path.exists(file_path):
+                with open(file_path, "wb") as handler:
+                    handler.write(data)
+
+            variants[file_type].append((width, file_path))
+
+    return variants
+
+
+def build_srcset(variants: list) -> str:
+    """
+    Convert a list of image variants into the format needed for the HTML srcset attribute.
+
+    Parameters
+    ----------
+    variants : list
+        Each list item is a tuple, first element is the width, second is the file path.
+
+    Returns
+    -------
+    str
+        e.g. "assets/variants/Aloe_240w.1a2b3c4d5e6f.webp 240w, assets/variants/Aloe_480w.(...)"
+    """
+    return ", ".join(f"{file_path} {width}w" for width, file_path in variants)
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Generate resized WebP/AVIF copies of each plant image used by the Dash app."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    parser.add_argument("--out_dir", type=str, default=VARIANT_DIR,
+                        help="Folder to save the image variants to.")
+    args = parser.parse_args()
+
+    file_types = available_formats()
+    print(f"Image formats to generate: {file_types}")
+
+    conn = connect(args.database)
+    c = conn.cursor()
+    c.execute("""SELECT Plant_Name, File_Path FROM plant_images WHERE File_Path<>'no image found' """)
+    plant_images = c.fetchall()
+
+    srcsets = []
+    for plant_name, file_path in plant_images:
+        variants = make_image_variants(
+            image_path=file_path, out_dir=args.out_dir,
+            widths=VARIANT_WIDTHS, file_types=file_types)
+
+        srcsets.append((
+            build_srcset(variants.get("webp", [])),
+            build_srcset(variants.get("avif", [])),
+            plant_name
+        ))
+
+    with transaction(conn) as c:
+        # add the new columns if this is the first time the script is run.
+        c.execute("""PRAGMA table_info(plant_images)""")
+        existing_columns = [row[1] for row in c.fetchall()]
+        for column in ["Webp_Srcset", "Avif_Srcset"]:
+            if column not in existing_columns:
+                c.execute(f"""ALTER TABLE plant_images ADD COLUMN {column} TEXT""")
+
+        c.executemany("""UPDATE plant_images SET Webp_Srcset=?, Avif_Srcset=? WHERE Plant_Name=?""",
+                      srcsets)
+    conn.close()
+
+    print(f"Number of plant images with variants generated: {len(srcsets)}")
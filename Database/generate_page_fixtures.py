@@ -0,0 +1,151 @@
+"""
+This script makes plant webpages in the layout of missouribotanicalgarden.org, for benchmark_page_extractor.py
+(e.g. when there are no downloaded webpages in the download cache to benchmark with).
+
+Each page is made at random (from --seed, so the same pages are made each time) and covers the cases
+page_extractor.extract_plant_page has to handle the same way as get_plant_details.parse_soup_plant_page:
+- the divs with the ids in page_extractor.COLUMN_IDS in any order, some missing or empty.
+- text needing HTML escaping (e.g. "&", "<" and quotes) and non-ASCII text.
+- the common names link, with the names separated by "<br/>" or "&bull;" (or no link at all).
+- the flower, leaf and fruit labels in the first "row" div, some inside a comment, and a second "row" div
+  that should be ignored. Some pages have no "row" div or an empty id'd div, which the original function
+  fails on (these are skipped by the benchmark).
+- a header and lots of text after the details, so the pages are about the size of the real ones.
+- some pages encoded with windows-1252 instead of utf-8.
+
+Run from the top directory of the repository, e.g.:
+python Database/generate_page_fixtures.py
+python Database/benchmark_page_extractor.py --pages_dir Database/benchmark_pages
+"""
+import argparse
+import html
+import os
+import random
+
+from page_extractor import COLUMN_IDS, COLUMN_LABELS, COMMON_NAME_ID, COMMON_NAMES_ID
+
+OUTPUT_DIR = "Database/benchmark_pages"
+N_PAGES = 300
+
+# text the values of each page are picked from (including text that has to be escaped).
+WORDS = ["Aglaonema", "snake plant", "Chinese evergreen", "mother-in-law's tongue", "R&D", "a < b",
+         "café été", 'say "hi"', "O'Neil"]
+# chance each part of the page is included.
+ID_DIV_CHANCE = 0.9
+EMPTY_DIV_CHANCE = 0.01
+ROW_DIV_CHANCE = 0.9
+COMMON_NAMES_CHANCE = 0.8
+LABEL_CHANCE = 0.8
+# every n-th page is encoded with windows-1252.
+CP1252_EVERY = 50
+
+
+def make_plant_page(rng: random.Random) -> str:
+    """
+    Make the HTML of a plant webpage.
+
+    Parameters
+    ----------
+    rng : random.Random
+        Used to pick the content of the page.
+
+    Returns
+    -------
+    str
+        HTML of the webpage (declared as utf-8).
+    """
+    parts = ["<!DOCTYPE html><html><head><meta charset='utf-8'><title>Plant Finder</title>"
+             "<script>var label = 'Flower: not this one';</script></head><body>",
+             "<div class='header'>" + "<div class='nav'><a href='#'>link</a></div>" * rng.randint(20, 200) + "</div>"]
+
+    # the details are in the first "row" div (the class can have other names around it).
+    parts.append("<div class=\"col row big\">" if rng.random() < ROW_DIV_CHANCE else "<div class='col'>")
+
+    div_ids = list(COLUMN_IDS.values()) + [COMMON_NAME_ID]
+    rng.shuffle(div_ids)
+    for div_id in div_ids:
+        if rng.random() >= ID_DIV_CHANCE:
+            continue
+        if rng.random() < EMPTY_DIV_CHANCE:
+            parts.append(f"<div id='{div_id}'></div>")
+        else:
+            label = div_id.split("_")[-1][:-len("Row")]
+            value = html.escape(rng.choice(WORDS))
+            parts.append(f"<div id='{div_id}'>\n   {label}: {value} {rng.randint(1, 9)}\n  <span>more</span></div>")
+
+    if rng.random() < COMMON_NAMES_CHANCE:
+        names = [html.escape(rng.choice(WORDS)) for _ in range(rng.randint(0, 5))]
+        separator = rng.choice(["&lt;br/&gt;", " &amp;bull; "])
+        ending = rng.choice(["&quot;end&quot;", "", "'"])
+        parts.append(f"<a id='{COMMON_NAMES_ID}' "
+                     f"data-content=\"Names&lt;br/&gt;{separator.join(names)}&lt;br/&gt;{ending}x\" "
+                     f"class='  a  b '>Disclaimer<br>x &amp; y<!-- c --></a>")
+
+    for label in COLUMN_LABELS.values():
+        if rng.random() >= LABEL_CHANCE:
+            continue
+        value = html.escape(rng.choice(WORDS))
+        if rng.random() < 0.3:
+            parts.append(f"<p><b>x</b>{label}{value}: extra</p>")
+        else:
+            parts.append(f"<p>{label}{value}</p>")
+    if rng.random() < 0.2:
+        parts.append("<!-- Leaf: from a comment -->")
+
+    parts.append("</div><div class='row'><p>Fruit: from the second row</p></div>")
+    parts.append("<p>filler text</p>" * rng.randint(100, 1500) + "</body></html>")
+    return "".join(parts)
+
+
+def save_plant_pages(n_pages: int, out_dir: str = OUTPUT_DIR, seed: int = 0) -> list:
+    """
+    Make and save plant webpages.
+
+    Parameters
+    ----------
+    n_pages : int
+        Number of webpages to make.
+
+    out_dir : str
+        Folder to save the webpages to.
+
+    seed : int
+        Random seed, so the same webpages are made each time.
+
+    Returns
+    -------
+    list
+        File paths of the saved webpages.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = random.Random(seed)
+    file_paths = []
+    for page_idx in range(n_pages):
+        page = make_plant_page(rng)
+        encoding = "utf-8"
+        if page_idx % CP1252_EVERY == 0:
+            encoding = "cp1252"
+            page = page.replace("<meta charset='utf-8'>", "<meta charset='windows-1252'>")
+
+        file_path = os.path.join(out_dir, f"plant_{page_idx:04d}.html")
+        with open(file_path, "wb") as handler:
+            handler.write(page.encode(encoding, errors="replace"))
+        file_paths.append(file_path)
+    return file_paths
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Make plant webpages in the layout of missouribotanicalgarden.org for benchmark_page_extractor.py."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--out_dir", type=str, default=OUTPUT_DIR,
+                        help="Folder to save the webpages to.")
+    parser.add_argument("--n_pages", type=int, default=N_PAGES,
+                        help="Number of webpages to make.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed, so the same webpages are made each time.")
+    args = parser.parse_args()
+
+    file_paths = save_plant_pages(n_pages=args.n_pages, out_dir=args.out_dir, seed=args.seed)
+    print(f"Number of webpages saved to {args.out_dir}: {len(file_paths)}")
+    print(f"Benchmark with them: python Database/benchmark_page_extractor.py --pages_dir {args.out_dir}")
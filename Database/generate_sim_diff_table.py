@@ -0,0 +1,99 @@
+"""
+This script precomputes the three most similar and three most different plants
+for every plant on each of the scatter graphs in the Dash app ("Visualise How all Plants Compare" page).
+
+The coordinates in the "plotting" table only change when Step3_Dimensionality_Reduction.ipynb is re-run,
+so the results can be computed once here and looked up by the app instead of being calculated on every click.
+Re-run this script whenever the "plotting" table changes.
+
+Results are saved to the table "sim_diff_lookup" and the fingerprint of the "plotting" table they were made from
+(see: utils.plotting_fingerprint) to the table "sim_diff_source". The app ignores the results if the "plotting"
+table no longer matches (e.g. after running embeddings.py or place_new_plants.py), until this script is re-run.
+
+Run from the top directory of the repository:
+python Database/generate_sim_diff_table.py
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+from bulk_writer import connect, transaction
+
+# utils.py lives in the top directory of the repository.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils  # noqa: E402
+
+DATABASE_LOC = "Database/house_plants.db"
+
+
+def build_sim_diff_rows(plotting_df: pd.DataFrame, axes_choices: list) -> list:
+    """
+    Find the three most similar and three most different plants for each plant and scatter graph.
+
+    Parameters
+    ----------
+    plotting_df : pd.DataFrame
+        Contains axis values for the possible scatter plots that can be made.
+
+    axes_choices : list
+        The scatter graphs to compute the results for (keys of utils.AXES_COLUMNS).
+
+    Returns
+    -------
+    list
+        Each list item is a tuple for one row of the "sim_diff_lookup" table:
+        (plant name, axes choice, 3 most similar, 3 most different).
+        None is used if there are less than 3 other plants.
+    """
+    rows = []
+    for axes_choice in axes_choices:
+        for plant_name in plotting_df["Plant_Name"].unique():
+            sim_diff_names = utils.get_sim_opp_plant_names(
+                selected_plant=plant_name, plotting_df=plotting_df, axes_choice=axes_choice)
+
+            n_found = len(sim_diff_names) // 2
+            similar = sim_diff_names[:n_found] + [None] * (3 - n_found)
+            different = sim_diff_names[n_found:] + [None] * (3 - n_found)
+            rows.append(tuple([plant_name, axes_choice] + similar + different))
+
+    return rows
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Precompute the most similar/different plants for each scatter graph."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    plotting_df = pd.read_sql_query("SELECT * FROM plotting", conn)
+
+    rows = build_sim_diff_rows(plotting_df=plotting_df, axes_choices=list(utils.AXES_COLUMNS))
+
+    with transaction(conn) as c:
+        c.execute("""DROP TABLE IF EXISTS sim_diff_lookup""")
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS sim_diff_lookup(
+            Plant_Name TEXT,
+            Axes_Choice TEXT,
+            Similar_1 TEXT,
+            Similar_2 TEXT,
+            Similar_3 TEXT,
+            Different_1 TEXT,
+            Different_2 TEXT,
+            Different_3 TEXT,
+            PRIMARY KEY (Plant_Name, Axes_Choice)
+            )
+        """)
+        c.executemany("""INSERT INTO sim_diff_lookup VALUES (?,?,?,?,?,?,?,?)""", rows)
+
+        c.execute("""DROP TABLE IF EXISTS sim_diff_source""")
+        c.execute("""CREATE TABLE IF NOT EXISTS sim_diff_source(Plotting_Fingerprint TEXT)""")
+        c.execute("""INSERT INTO sim_diff_source VALUES (?)""", (utils.plotting_fingerprint(plotting_df),))
+    conn.close()
+
+    print(f"Number of rows saved to sim_diff_lookup: {len(rows)}")
@@ -0,0 +1,178 @@
+"""
+This script combines a small thumbnail of every plant image into a few large images (a "sprite atlas").
+The Dash app uses it to show a thumbnail of each plant when hovering over the scatter graph,
+so only a handful of images have to be downloaded no matter how many plants there are.
+
+The atlas is split into pages of at most PAGE_TILES x PAGE_TILES thumbnails, so each page stays the same size
+(and well under the 16383 pixel limit of WebP) however large the catalog gets, and pages are only
+downloaded by the browser once a plant on them is hovered over.
+
+The page and position of each plant's thumbnail are saved to the "plotting" table
+(columns: "Atlas_Page", "Atlas_X" and "Atlas_Y") and the file path of each page and the thumbnail size
+are saved to the "sprite_atlas" table (one row per page).
+
+Run from the top directory of the repository:
+python Database/generate_sprite_atlas.py
+"""
+import argparse
+import hashlib
+import io
+import math
+import os
+from typing import Tuple
+
+from PIL import Image
+
+from bulk_writer import connect, transaction
+
+DATABASE_LOC = "Database/house_plants.db"
+ATLAS_DIR = "assets/variants"
+
+# width and height (in pixels) of each thumbnail in the atlas.
+TILE_SIZE = 96
+# number of thumbnails along each side of a page (32 x 96 = 3072 pixels, 1024 plants per page).
+PAGE_TILES = 32
+
+
+def build_sprite_atlas(image_paths: list, tile_size: int = TILE_SIZE,
+                       page_tiles: int = PAGE_TILES) -> Tuple[list, list]:
+    """
+    Paste a square thumbnail of each image into pages of at most page_tiles x page_tiles thumbnails,
+    in rows from the top left of each page.
+
+    Parameters
+    ----------
+    image_paths : list
+        Paths to each image to include in the atlas. None can be given if a plant has no image,
+        in which case its tile is left empty.
+
+    tile_size : int
+        Width and height (in pixels) of each thumbnail.
+
+    page_tiles : int
+        Max number of thumbnails along each side of a page.
+
+    Returns
+    -------
+    list
+        The pages of the atlas.
+
+    list
+        Each list item is a tuple of the page and the x and y pixel offset of the corresponding image.
+    """
+    per_page = page_tiles ** 2
+    pages = []
+    for start in range(0, max(1, len(image_paths)), per_page):
+        # the last page is only as large as needed (e.g. the whole atlas of a small catalog).
+        n_images = max(1, min(per_page, len(image_paths) - start))
+        n_columns = max(1, math.ceil(math.sqrt(n_images)))
+        n_rows = max(1, math.ceil(n_images / n_columns))
+        pages.append((Image.new("RGBA", (n_columns * tile_size, n_rows * tile_size), (255, 255, 255, 0)),
+                      n_columns))
+
+    offsets = []
+    for idx, image_path in enumerate(image_paths):
+        page, page_idx = divmod(idx, per_page)
+        atlas, n_columns = pages[page]
+        x_offset = (page_idx % n_columns) * tile_size
+        y_offset = (page_idx // n_columns) * tile_size
+        offsets.append((page, x_offset, y_offset))
+
+        if image_path is None:
+            continue
+
+        image = Image.open(image_path)
+        # draft lets Pillow decode JPEGs at a reduced size, much faster for large files.
+        image.draft("RGB", (tile_size * 2, tile_size * 2))
+        image = image.convert("RGBA")
+        # images are square padded already, but make sure any that are not still fit the tile.
+        image.thumbnail((tile_size, tile_size), Image.LANCZOS)
+
+        paste_at = (x_offset + (tile_size - image.width) // 2,
+                    y_offset + (tile_size - image.height) // 2)
+        atlas.paste(image, paste_at, image)
+
+    return [atlas for atlas, _ in pages], offsets
+
+
+def save_atlas(atlas: Image.Image, out_dir: str) -> str:
+    """
+    Save a page of the atlas as a WebP file with the hash of its content in the file name,
+    so it can be cached forever by the browser.
+
+    Parameters
+    ----------
+    atlas : Image.Image
+        The page to save.
+
+    out_dir : str
+        Folder to save the atlas to.
+
+    Returns
+    -------
+    str
+        File path to the saved page.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    buffer = io.BytesIO()
+    atlas.save(buffer, format="WEBP", quality=80, method=6)
+    data = buffer.getvalue()
+
+    file_name = f"plant_atlas.{hashlib.sha256(data).hexdigest()[:12]}.webp"
+    file_path = os.path.join(out_dir, file_name).replace(os.sep, "/")
+    with open(file_path, "wb") as handler:
+        handler.write(data)
+
+    return file_path
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Generate the sprite atlas of plant thumbnails used by the scatter graph."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    parser.add_argument("--out_dir", type=str, default=ATLAS_DIR,
+                        help="Folder to save the atlas to.")
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    c = conn.cursor()
+    c.execute("""
+    SELECT plotting.Plant_Name, plant_images.File_Path
+    FROM plotting LEFT JOIN plant_images ON plotting.Plant_Name = plant_images.Plant_Name
+    """)
+    rows = c.fetchall()
+
+    plant_names = [row[0] for row in rows]
+    image_paths = [None if row[1] in (None, "no image found") else row[1] for row in rows]
+
+    pages, offsets = build_sprite_atlas(image_paths=image_paths)
+    page_paths = [save_atlas(atlas=atlas, out_dir=args.out_dir) for atlas in pages]
+
+    with transaction(conn) as c:
+        # add the new columns if this is the first time the script is run.
+        c.execute("""PRAGMA table_info(plotting)""")
+        existing_columns = [row[1] for row in c.fetchall()]
+        for column in ["Atlas_Page", "Atlas_X", "Atlas_Y"]:
+            if column not in existing_columns:
+                c.execute(f"""ALTER TABLE plotting ADD COLUMN {column} INTEGER""")
+
+        c.executemany("""UPDATE plotting SET Atlas_Page=?, Atlas_X=?, Atlas_Y=? WHERE Plant_Name=?""",
+                      [(page, x, y, name) for (page, x, y), name in zip(offsets, plant_names)])
+
+        c.execute("""DROP TABLE IF EXISTS sprite_atlas""")
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS sprite_atlas(
+            Page INTEGER PRIMARY KEY,
+            File_Path TEXT,
+            Tile_Size INTEGER
+            )
+        """)
+        c.executemany("""INSERT INTO sprite_atlas VALUES (?,?,?)""",
+                      [(page, page_path, TILE_SIZE) for page, page_path in enumerate(page_paths)])
+    conn.close()
+
+    print(f"Sprite atlas saved to {len(page_paths)} page(s) in: {args.out_dir} "
+          f"(largest page: {pages[0].width}x{pages[0].height} pixels)")
+    print(f"Number of plants in the atlas: {len(plant_names)}")
@@ -0,0 +1,305 @@
+"""
+This script makes a database with the same tables as "house_plants.db" for a catalog of any number of
+synthetic plants, e.g. to check how the Dash app copes with 100k plants (which cannot be scraped).
+
+Each synthetic plant is based on a real plant (a "template", picked at random), so the values that go
+together (e.g. the plant type, sunlight and watering) stay realistic, and is then varied:
+- Plant_Name: the template's genus with the species of another real plant and a cultivar name,
+  e.g. "Ficus elastica 'Synthetic 12'" (cultivar names are numbered so every plant is unique).
+- Common_Names: as many common names as the template, sampled from all the real common names.
+- Zones, Heights and Spreads: the template's, moved up or down a little (keeping the scraped formats,
+  e.g. "10 to 12" and "1.00 to 3.00 feet").
+- every other column of plant_raw_data: the template's.
+
+The other tables are made from plant_raw_data the same way as the real database:
+- plant_features: see feature_engineering.py.
+- plotting: each plant is placed on the real scatter graphs next to its most similar real plants
+  (see: place_new_plants.py), as t-SNE would take far too long for a large catalog.
+- plant_images: one placeholder image per plant type, saved to --assets_dir.
+- cosine_sim: see generate_cosine_sim.py. Only made for up to --max_cosine_plants plants, as the
+  matrix grows with the square of the number of plants (100k plants is 80GB). Without it,
+  the Dash app works out the rows of the matrix when it needs them (see: utils.CosineRows).
+
+Run from the top directory of the repository, e.g.:
+python Database/generate_synthetic_catalog.py --n_plants 100000
+and then run the app with it:
+HOUSE_PLANTS_DB=Database/synthetic_plants.db python app.py
+"""
+import argparse
+import os
+import sqlite3
+import zlib
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from bulk_writer import connect, remove_database, transaction, write_rows
+from feature_engineering import FEATURE_COLUMNS, ZONE_TO_TEMP, apply_manual_fixes, create_features_table, make_features
+from generate_cosine_sim import calc_cosine_sim, save_cosine_sim
+from place_new_plants import place_new_plants
+
+DATABASE_LOC = "Database/house_plants.db"
+OUTPUT_LOC = "Database/synthetic_plants.db"
+# must be inside the app's "assets" folder so Dash serves the images.
+ASSETS_DIR = "assets/synthetic"
+
+N_PLANTS = 10000
+# largest catalog the cosine_sim table is made for (the matrix is saved as JSON, 5k plants is ~500MB).
+MAX_COSINE_PLANTS = 5000
+# width/height of the placeholder images (in pixels).
+PLACEHOLDER_SIZE = 320
+# heights and spreads are multiplied by a random factor with this standard deviation (of its log)
+# and rounded to SIZE_STEP feet.
+SIZE_SPREAD = 0.3
+SIZE_STEP = 0.25
+# columns of the plotting table (any others, e.g. Atlas_X, are made by scripts run afterwards).
+PLOTTING_COLUMNS = ["Plant_Name", "Maintenance_Ordinal", "all_tsne_1", "all_tsne_2",
+                    "maintenance_tsne_1", "maintenance_tsne_2", "Sunlight_jittered", "Watering_jittered",
+                    "Max_Spread_Capped_jittered", "Max_Height_Capped_jittered"]
+
+
+def _vary_zones(zones: pd.Series, rng: np.random.Generator) -> pd.Series:
+    """Move each range of zones (e.g. "10 to 12") up or down by one zone (or not at all), staying in ZONE_TO_TEMP."""
+    parts = zones.str.extract(r"^(\d+) to (\d+)$").astype(float)
+    shift = rng.choice([-1, 0, 1], size=len(zones), p=[0.25, 0.5, 0.25])
+    low = np.clip(parts[0] + shift, min(ZONE_TO_TEMP), max(ZONE_TO_TEMP))
+    high = np.clip(parts[1] + shift, low, max(ZONE_TO_TEMP))
+    varied = low.astype("Int64").astype(str) + " to " + high.astype("Int64").astype(str)
+    # values in other formats (e.g. "None") are kept as they are.
+    return varied.where(parts[0].notna(), zones)
+
+
+def _vary_sizes(sizes: pd.Series, rng: np.random.Generator) -> pd.Series:
+    """Scale each range of sizes (e.g. "1.00 to 3.00 feet") by a random factor, keeping the format."""
+    parts = sizes.str.extract(r"^([\d.]+) to ([\d.]+) feet$").astype(float)
+    factor = np.exp(rng.normal(0, SIZE_SPREAD, len(sizes)))
+    low = np.maximum(np.round(parts[0] * factor / SIZE_STEP) * SIZE_STEP, SIZE_STEP)
+    high = np.maximum(np.round(parts[1] * factor / SIZE_STEP) * SIZE_STEP, low)
+    varied = low.map("{:.2f}".format) + " to " + high.map("{:.2f}".format) + " feet"
+    return varied.where(parts[0].notna(), sizes)
+
+
+def make_synthetic_plants(raw_df: pd.DataFrame, n_plants: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Make a plant_raw_data table of synthetic plants (see the top of this script for how).
+
+    Parameters
+    ----------
+    raw_df : pd.DataFrame
+        The real plant_raw_data table.
+
+    n_plants : int
+        Number of plants to make.
+
+    seed : int
+        Random seed.
+
+    Returns
+    -------
+    pd.DataFrame
+        The synthetic plant_raw_data table.
+    """
+    rng = np.random.default_rng(seed)
+    # templates are taken after the manual fixes, so every plant's features can be made.
+    raw_df = apply_manual_fixes(raw_df).reset_index(drop=True)
+    plant_df = raw_df.iloc[rng.integers(0, len(raw_df), n_plants)].reset_index(drop=True)
+
+    # the template's genus and the species of another real plant.
+    species = raw_df["Plant_Name"].str.split(" ").str[1].dropna().to_numpy()
+    plant_df["Plant_Name"] = [
+        f"{name.split(' ')[0]} {species_name} 'Synthetic {idx}'"
+        for idx, (name, species_name) in enumerate(
+            zip(plant_df["Plant_Name"], species[rng.integers(0, len(species), n_plants)]))]
+
+    common_names = raw_df["Common_Names"].str.split(",").explode().str.strip()
+    common_names = common_names[common_names != ""].unique()
+    n_names = np.minimum(plant_df["Common_Names"].str.count(",").to_numpy() + 1, len(common_names))
+    plant_df["Common_Names"] = [",".join(rng.choice(common_names, size=size, replace=False)) for size in n_names]
+
+    plant_df["Zones"] = _vary_zones(plant_df["Zones"], rng)
+    plant_df["Heights"] = _vary_sizes(plant_df["Heights"], rng)
+    plant_df["Spreads"] = _vary_sizes(plant_df["Spreads"], rng)
+    return plant_df
+
+
+def placeholder_path(plant_type: str, assets_dir: str = ASSETS_DIR) -> str:
+    """Path to the placeholder image of a plant type, e.g. "assets/synthetic/broadleaf_evergreen.jpg"."""
+    return f"{assets_dir}/{plant_type.lower().replace(' ', '_')}.jpg"
+
+
+def save_placeholder_images(plant_types: list, assets_dir: str = ASSETS_DIR, size: int = PLACEHOLDER_SIZE):
+    """
+    Save a placeholder image for each plant type, a square of one colour (picked from the name of the type).
+
+    Parameters
+    ----------
+    plant_types : list
+        Plant types to save an image for.
+
+    assets_dir : str
+        Folder to save the images to.
+
+    size : int
+        Width/height of the images (in pixels).
+    """
+    os.makedirs(assets_dir, exist_ok=True)
+    for plant_type in plant_types:
+        hue = zlib.crc32(plant_type.encode()) % 256
+        image = Image.new("HSV", (size, size), (hue, 90, 200)).convert("RGB")
+        image.save(placeholder_path(plant_type, assets_dir), quality=85)
+
+
+def make_synthetic_catalog(real_tables: dict, n_plants: int, assets_dir: str = ASSETS_DIR,
+                           seed: int = 0) -> dict:
+    """
+    Make every table of the synthetic catalog (apart from cosine_sim, see: calc_cosine_sim).
+
+    Parameters
+    ----------
+    real_tables : dict
+        The real "plant_raw_data", "plant_features" and "plotting" tables (pd.DataFrame).
+
+    n_plants : int
+        Number of plants to make.
+
+    assets_dir : str
+        Folder of the placeholder images (see: save_placeholder_images).
+
+    seed : int
+        Random seed.
+
+    Returns
+    -------
+    dict
+        Keys are the table names ("plant_raw_data", "plant_features", "plotting" and "plant_images"),
+        values the tables (pd.DataFrame), all in the same row order.
+    """
+    plant_df = make_synthetic_plants(real_tables["plant_raw_data"], n_plants=n_plants, seed=seed)
+    features_df = make_features(plant_df)
+
+    # placed onto the real scatter graphs, the real plants are then removed.
+    real_plotting = real_tables["plotting"][PLOTTING_COLUMNS]
+    new_rows, _ = place_new_plants(
+        features_df=pd.concat([real_tables["plant_features"], features_df], ignore_index=True),
+        plotting_df=real_plotting, seed=seed)
+    plotting_df = new_rows.set_index("Plant_Name").loc[plant_df["Plant_Name"]].reset_index()
+
+    image_df = pd.DataFrame({
+        "Plant_Name": plant_df["Plant_Name"],
+        "File_Path": [placeholder_path(plant_type, assets_dir) for plant_type in plant_df["Plant_Type"]],
+        "Website": "synthetic",
+    })
+
+    return {"plant_raw_data": plant_df, "plant_features": features_df,
+            "plotting": plotting_df, "plant_images": image_df}
+
+
+def save_catalog(conn: sqlite3.Connection, catalog: dict):
+    """
+    Save the tables of a synthetic catalog (output of make_synthetic_catalog) in one transaction,
+    with the same schemas as the real database.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the (new) database.
+
+    catalog : dict
+        Output of make_synthetic_catalog.
+    """
+    plant_df = catalog["plant_raw_data"]
+    with transaction(conn) as c:
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS latin_names(
+            Plant_Name VARCHAR (100) PRIMARY KEY
+            )
+        """)
+        write_rows(c, "latin_names", columns=["Plant_Name"], rows=((name,) for name in plant_df["Plant_Name"]))
+
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS plant_raw_data(
+            Plant_Name VARCHAR (100) PRIMARY KEY,
+            Common_Names VARCHAR (500),
+            Plant_Type VARCHAR (80),
+            Family VARCHAR (80),
+            Zones VARCHAR (50),
+            Native_Range VARCHAR (400),
+            Heights VARCHAR (80),
+            Spreads VARCHAR (80),
+            Bloom_Times VARCHAR (100),
+            Bloom_Description VARCHAR (200),
+            Sunlight VARCHAR (100),
+            Watering VARCHAR (60),
+            Maintenance VARCHAR (50),
+            Flowers VARCHAR (100),
+            Leafs VARCHAR (50),
+            Fruits VARCHAR (50)
+            )
+        """)
+        columns = list(plant_df.columns)
+        write_rows(c, "plant_raw_data", columns=columns,
+                   rows=zip(*(plant_df[column].tolist() for column in columns)))
+
+        create_features_table(c)
+        features_df = catalog["plant_features"]
+        # tolist gives python types (sqlite3 does not know numpy types), SQLite saves NaN as NULL.
+        write_rows(c, "plant_features", columns=FEATURE_COLUMNS,
+                   rows=zip(*(features_df[column].tolist() for column in FEATURE_COLUMNS)))
+
+        catalog["plotting"].to_sql("plotting", con=conn, if_exists="append", index=False)
+
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS plant_images(
+            Plant_Name TEXT PRIMARY KEY,
+            File_Path TEXT,
+            Website TEXT
+            )
+        """)
+        image_df = catalog["plant_images"]
+        write_rows(c, "plant_images", columns=list(image_df.columns),
+                   rows=image_df.itertuples(index=False, name=None))
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Make a database of synthetic plants (sampled from the real database) for scale testing."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the real SQL database (sampled from).")
+    parser.add_argument("--output", type=str, default=OUTPUT_LOC,
+                        help="Path to save the synthetic database to (replaced if it exists).")
+    parser.add_argument("--n_plants", type=int, default=N_PLANTS,
+                        help="Number of synthetic plants.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed, so the same catalog is made each time.")
+    parser.add_argument("--assets_dir", type=str, default=ASSETS_DIR,
+                        help="Folder to save the placeholder images to (inside the app's assets folder).")
+    parser.add_argument("--max_cosine_plants", type=int, default=MAX_COSINE_PLANTS,
+                        help="Largest catalog the cosine_sim table is made for.")
+    args = parser.parse_args()
+
+    if os.path.abspath(args.output) == os.path.abspath(args.database):
+        parser.error("--output must not be the real database.")
+
+    conn = sqlite3.connect(args.database)
+    real_tables = {table: pd.read_sql_query(f"SELECT * FROM {table}", conn)
+                   for table in ["plant_raw_data", "plant_features", "plotting"]}
+    conn.close()
+
+    catalog = make_synthetic_catalog(real_tables, n_plants=args.n_plants, assets_dir=args.assets_dir,
+                                     seed=args.seed)
+    save_placeholder_images(sorted(catalog["plant_raw_data"]["Plant_Type"].unique()), assets_dir=args.assets_dir)
+
+    remove_database(args.output)
+    conn = connect(args.output)
+    save_catalog(conn, catalog)
+    if args.n_plants <= args.max_cosine_plants:
+        save_cosine_sim(conn, calc_cosine_sim(catalog["plant_features"].drop(columns="Plant_Name").to_numpy()))
+    conn.close()
+
+    print(f"Number of synthetic plants saved to {args.output}: {args.n_plants}")
+    if args.n_plants > args.max_cosine_plants:
+        print(f"No cosine_sim table (more than {args.max_cosine_plants} plants), "
+              "the app works out the similarities when needed.")
+    print(f"Run the app with it: HOUSE_PLANTS_DB={args.output} python app.py")
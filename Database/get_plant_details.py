@@ -6,15 +6,18 @@ as well as some manual curation.
 After extracting information for each plant the results are then saved
 to the SQL database for later use.
 """
+import argparse
 import re
-import requests
-from typing import Tuple
-from time import sleep
 from bs4 import BeautifulSoup
 import pandas as pd
-import sqlite3
 
-DATABASE_LOC = r"C:\Users\Rory Crean\Dropbox (lkgroup)\Backup_HardDrive\Postdoc\PyForFun\House_Plant_Recommender\Database\house_plants.db"
+from bulk_writer import BulkWriter
+from feature_engineering import update_features
+from fetcher import Fetcher, add_fetcher_arguments, fetcher_from_args
+from page_extractor import COLUMN_IDS, extract_plant_page
+from upsert import ensure_tracking_columns, find_stale, print_report, upsert_rows
+
+DATABASE_LOC = "Database/house_plants.db"
 
 
 def search_info_with_id(soup: BeautifulSoup, id_string: str) -> str:
@@ -112,149 +115,184 @@ def extract_common_names(soup: BeautifulSoup) -> list:
     return common_names
 
 
-def extract_all_plant_info(plant_with_link: dict) -> pd.DataFrame:
+COLUMN_NAMES = [
+    "Plant_Name", "Common_Names", "Plant_Type", "Family",
+    "Zones", "Native_Range",
+    "Heights", "Spreads",
+    "Bloom_Times", "Bloom_Description",
+    "Sunlight", "Watering", "Maintenance",
+    "Flowers", "Leafs", "Fruits"
+]
+
+def parse_soup_plant_page(content: bytes) -> dict:
+    """
+    Extract the desired information about a plant from its missouribotanicalgarden.org webpage.
+
+    Original (slower) version of page_extractor.extract_plant_page, kept to check the two agree
+    (see: benchmark_page_extractor.py).
+
+    Parameters
+    ----------
+    content : bytes
+        HTML of the webpage.
+
+    Returns
+    -------
+    dict
+        Keys are the column names (see: COLUMN_NAMES, except "Plant_Name") and values the extracted info.
+    """
+    soup = BeautifulSoup(content, 'lxml')
+
+    # special care as can be a list or str or none.
+    plant_info = {"Common_Names": extract_common_names(soup)}
+
+    for column, id_string in COLUMN_IDS.items():
+        plant_info[column] = search_info_with_id(soup=soup, id_string=id_string)
+
+    # These 3 don't have specific ids to search through..
+    plant_info["Flowers"] = search_info_without_id(soup=soup, string_to_match="Flower: ")
+    plant_info["Leafs"] = search_info_without_id(soup=soup, string_to_match="Leaf: ")
+    plant_info["Fruits"] = search_info_without_id(soup=soup, string_to_match="Fruit: ")
+
+    return plant_info
+
+
+def parse_plant_page(content: bytes) -> dict:
+    """
+    Extract the desired information about a plant from its missouribotanicalgarden.org webpage.
+
+    The page is parsed once with lxml, see: page_extractor.py.
+
+    Parameters
+    ----------
+    content : bytes
+        HTML of the webpage.
+
+    Returns
+    -------
+    dict
+        Keys are the column names (see: COLUMN_NAMES, except "Plant_Name") and values the extracted info.
+    """
+    return extract_plant_page(content)
+
+
+def extract_all_plant_info(plant_with_link: dict, fetcher: Fetcher = None) -> pd.DataFrame:
     """
     Using the web address of a given plant, extract the desired information about it from:
     missouribotanicalgarden.org.
 
+    Pages are downloaded concurrently (rate limited) and parsed as they arrive, see: fetcher.py.
+
     Parameters
     ----------
     plant_with_link : dict
         Keys are the latin names of the plants and values are web adresss to search through.
 
+    fetcher : Fetcher
+        Used to download the webpages, if None one with the default settings is made.
+
     Returns
     -------
     pd.DataFrame
         Each row is a different plant with all of the extracted features stored in different columns.
+        Plants whose webpage could not be downloaded are left out.
     """
-    common_names, types, families = [], [], []
-    zones, native_ranges = [], []
-    heights, spreads = [], []
-    bloom_times, bloom_descrips = [], []
-    sunlights, waterings, maintenances = [], [], []
-    flowers, leafs, fruits = [], [], []
-
-    for latin_name, url in plant_with_link.items():
-        r = requests.get(url)
-        soup = BeautifulSoup(r.content, 'lxml')
-
-        # special care as can be a list or str or none.
-        common_names.append(extract_common_names(soup))
-
-        types.append(search_info_with_id(
-            soup=soup, id_string="MainContentPlaceHolder_TypeRow"))
-        families.append(search_info_with_id(
-            soup=soup, id_string="MainContentPlaceHolder_FamilyRow"))
-
-        zones.append(search_info_with_id(
-            soup=soup, id_string="MainContentPlaceHolder_ZoneRow"))
-        native_ranges.append(search_info_with_id(
-            soup=soup, id_string="MainContentPlaceHolder_NativeRangeRow"))
-
-        heights.append(search_info_with_id(
-            soup=soup, id_string="MainContentPlaceHolder_HeightRow"))
-        spreads.append(search_info_with_id(
-            soup=soup, id_string="MainContentPlaceHolder_SpreadRow"))
-
-        bloom_times.append(search_info_with_id(
-            soup=soup, id_string="MainContentPlaceHolder_BloomTimeRow"))
-        bloom_descrips.append(search_info_with_id(
-            soup=soup, id_string="MainContentPlaceHolder_ColorTextRow"))
-
-        sunlights.append(search_info_with_id(
-            soup=soup, id_string="MainContentPlaceHolder_SunRow"))
-        waterings.append(search_info_with_id(
-            soup=soup, id_string="MainContentPlaceHolder_WaterRow"))
-        maintenances.append(search_info_with_id(
-            soup=soup, id_string="MainContentPlaceHolder_MaintenanceRow"))
-
-        # These 3 don't have specific ids to search through..
-        flowers.append(search_info_without_id(
-            soup=soup, string_to_match="Flower: "))
-        leafs.append(search_info_without_id(
-            soup=soup, string_to_match="Leaf: "))
-        fruits.append(search_info_without_id(
-            soup=soup, string_to_match="Fruit: "))
-
-        sleep(2)  # don't want to make a load of requests at once...
-
-    all_columns = list(zip(
-        list(plant_with_link.keys()), common_names, types, families,
-        zones, native_ranges,
-        heights, spreads,
-        bloom_times, bloom_descrips,
-        sunlights, waterings, maintenances,
-        flowers, leafs, fruits
-    ))
-
-    column_names = [
-        "Plant_Name", "Common_Names", "Plant_Type", "Family",
-        "Zones", "Native_Range",
-        "Heights", "Spreads",
-        "Bloom_Times", "Bloom_Description",
-        "Sunlight", "Watering", "Maintenance",
-        "Flowers", "Leafs", "Fruits"
-    ]
-
-    return pd.DataFrame(all_columns, columns=column_names)
+    if fetcher is None:
+        fetcher = Fetcher()
+
+    plant_infos = {}
+    for latin_name, plant_info in fetcher.fetch_all(urls=plant_with_link, parse=parse_plant_page):
+        if plant_info is not None:
+            plant_infos[latin_name] = plant_info
+
+    # keep the same order as the input.
+    rows = [[latin_name] + [plant_infos[latin_name][column] for column in COLUMN_NAMES[1:]]
+            for latin_name in plant_with_link if latin_name in plant_infos]
+
+    return pd.DataFrame(rows, columns=COLUMN_NAMES)
 
 
 if __name__ == '__main__':
 
-    # Read in those plant with urls available.
-    conn = sqlite3.connect(DATABASE_LOC)
-    c = conn.cursor()
-    # <> is != in SQL.
-    c.execute("""SELECT * FROM 'hyperlinks' WHERE url<>'no link found' """)
-    plants_found_list = [row for row in c.fetchall()]
-    c.close()
-
-    # Convert to dictionary for easier handling.
-    plants_found = {name[0]: name[1] for name in plants_found_list}
-
-    # extract all the plant info
-    plant_df = extract_all_plant_info(plant_with_link=plants_found)
-
-    # convert this column from a list to a str so easy to save into SQL database.
-    plant_df["Common_Names"] = [','.join(
-        map(str, plant_names_list)) for plant_names_list in plant_df["Common_Names"]]
-
-    # Now create the new database and save the generated dataframe into it.
-    conn = sqlite3.connect(DATABASE_LOC)
-    c = conn.cursor()
-
-    c.execute("""DROP TABLE IF EXISTS plant_raw_data""")
-
-    # This was used to determine comfortable values for each column.
-    # for c in plant_df:
-    #     if plant_df[c].dtype == 'object':
-    #         print('Max length of column %s: %s\n' %  (c, plant_df[c].map(len).max()))
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS plant_raw_data(
-        Plant_Name VARCHAR (100) PRIMARY KEY,
-        Common_Names VARCHAR (500),
-        Plant_Type VARCHAR (80),
-        Family VARCHAR (80),
-        Zones VARCHAR (50),
-        Native_Range VARCHAR (400),
-        Heights VARCHAR (80),
-        Spreads VARCHAR (80),
-        Bloom_Times VARCHAR (100),
-        Bloom_Description VARCHAR (200),
-        Sunlight VARCHAR (100),
-        Watering VARCHAR (60),
-        Maintenance VARCHAR (50),
-        Flowers VARCHAR (100),
-        Leafs VARCHAR (50),
-        Fruits VARCHAR (50)
-        )
-    """)
-    conn.commit()
-
-    plant_df.to_sql("plant_raw_data", con=conn,
-                    if_exists="append", index=False)
-    # Can be read back into a df using:
-    # df = pd.read_sql_query("SELECT * FROM plant_raw_data", conn)
-
-    c.close()
+    parser_descrip = "Scrape the details of each plant from missouribotanicalgarden.org."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only scrape plants that are new or have not been scraped for --max_age_days "
+                             "and update the table in place, instead of remaking it.")
+    parser.add_argument("--max_age_days", type=float, default=30,
+                        help="With --incremental, plants last scraped longer ago than this are scraped again.")
+    add_fetcher_arguments(parser)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    args = parser.parse_args()
+
+    # without --incremental the tables are remade, in a copy of the database that replaces it
+    # once finished, so the app never reads a half built database (see: bulk_writer.py).
+    with BulkWriter(args.database, staging=not args.incremental) as conn:
+        # Read in those plant with urls available.
+        c = conn.cursor()
+        # <> is != in SQL.
+        c.execute("""SELECT * FROM 'hyperlinks' WHERE url<>'no link found' """)
+        plants_found_list = [row for row in c.fetchall()]
+
+        # Convert to dictionary for easier handling.
+        plants_found = {name[0]: name[1] for name in plants_found_list}
+
+        if not args.incremental:
+            c.execute("""DROP TABLE IF EXISTS plant_raw_data""")
+
+        # This was used to determine comfortable values for each column.
+        # for c in plant_df:
+        #     if plant_df[c].dtype == 'object':
+        #         print('Max length of column %s: %s\n' %  (c, plant_df[c].map(len).max()))
+
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS plant_raw_data(
+            Plant_Name VARCHAR (100) PRIMARY KEY,
+            Common_Names VARCHAR (500),
+            Plant_Type VARCHAR (80),
+            Family VARCHAR (80),
+            Zones VARCHAR (50),
+            Native_Range VARCHAR (400),
+            Heights VARCHAR (80),
+            Spreads VARCHAR (80),
+            Bloom_Times VARCHAR (100),
+            Bloom_Description VARCHAR (200),
+            Sunlight VARCHAR (100),
+            Watering VARCHAR (60),
+            Maintenance VARCHAR (50),
+            Flowers VARCHAR (100),
+            Leafs VARCHAR (50),
+            Fruits VARCHAR (50)
+            )
+        """)
+        ensure_tracking_columns(c, "plant_raw_data")
+
+        # only new or stale plants in incremental mode (every plant otherwise, as the table is empty).
+        to_scrape = find_stale(c, table="plant_raw_data", key_column="Plant_Name",
+                               keys=list(plants_found), max_age_days=args.max_age_days)
+
+        # extract all the plant info
+        plant_df = extract_all_plant_info(
+            plant_with_link={name: plants_found[name] for name in to_scrape},
+            fetcher=fetcher_from_args(args))
+        print(f"Number of plants scraped: {len(plant_df)} out of {len(to_scrape)}")
+
+        # convert this column from a list to a str so easy to save into SQL database.
+        plant_df["Common_Names"] = [','.join(
+            map(str, plant_names_list)) for plant_names_list in plant_df["Common_Names"]]
+
+        report = upsert_rows(c, table="plant_raw_data", columns=COLUMN_NAMES,
+                             rows=list(plant_df.itertuples(index=False, name=None)))
+        conn.commit()
+
+        c.execute("""SELECT Plant_Name FROM plant_raw_data""")
+        removed = [row[0] for row in c.fetchall() if row[0] not in plants_found]
+        print_report("plant_raw_data", report, removed)
+
+        if args.incremental:
+            # only the features of the new/changed plants need remaking.
+            n_updated = update_features(conn, plant_names=report["new"] + report["changed"])
+            print(f"Number of plants updated in plant_features: {n_updated}")
+        # Can be read back into a df using:
+        # df = pd.read_sql_query("SELECT * FROM plant_raw_data", conn)
@@ -5,94 +5,102 @@ in the SQL database.
 The images are saved to the folder images and their file paths and what
 website they were taken from are stored inside the  SQL database for later use.
 
-Needs to be run twice (with 24 hours gap between).
-Take first 50, then take remaning 97 on the next day.
+Google's search API only allows 100 searches per day, so the searches are queued (see: search_scheduler.py).
+Each run makes as many searches as are left of today's quota, run it once a day until none are pending.
+
+Searching and downloading are separate stages (--stage), the images found are downloaded
+all at once and streamed to disk (see: image_downloader.py), so a failed download can be
+retried without searching again.
 
 """
 import configparser
-import sqlite3
 import argparse
 
 import helper_functions
+from bulk_writer import BulkWriter
+from fetcher import add_fetcher_arguments, fetcher_from_args
+from image_downloader import MAX_IMAGE_BYTES
+from search_scheduler import SearchJobQueue, add_search_arguments, backend_from_args
 
 
 config = configparser.ConfigParser()
 config.read("Database/config.ini")
-SEARCH_ENGINE_ID = config["Google Params"]["SEARCH_ENGINE_ID"]
-API_KEY = config["Google Params"]["API_KEY"]
-DATABASE_LOC = r"C:\Users\Rory Crean\Dropbox (lkgroup)\Backup_HardDrive\Postdoc\PyForFun\House_Plant_Recommender\Database\house_plants.db"
+# fallback so the script can still be run with --fake_results without a config file.
+SEARCH_ENGINE_ID = config.get("Google Params", "SEARCH_ENGINE_ID", fallback="")
+API_KEY = config.get("Google Params", "API_KEY", fallback="")
+DATABASE_LOC = "Database/house_plants.db"
 
 
 if __name__ == '__main__':
 
-    parser_descrip = "Define the range of names from latin_names to run through the google search API."
+    parser_descrip = "Google image search for a picture of each plant and download it."
     parser = argparse.ArgumentParser(description=parser_descrip)
-
-    help_start = "first number to make the index the list of names, either 0 or 50"
-    help_end = "second number to make the index the list of names, either 50 or 150"
-    help_restart = "Type: 'restart' if starting afresh, otherwise any string will do."
-    parser.add_argument("subset_start", type=int, help=help_start)
-    parser.add_argument("subset_end", type=int, help=help_end)
-    parser.add_argument("restart", type=str, help=help_restart)
-
+    parser.add_argument("--restart", action="store_true",
+                        help="Start afresh, forgetting all images found and searches made before.")
+    parser.add_argument("--stage", choices=["search", "download", "all"], default="all",
+                        help="Only search for images, only download the images found so far, or both.")
+    parser.add_argument("--max_image_mb", type=float, default=MAX_IMAGE_BYTES / 1024 / 1024,
+                        help="Images larger than this (in MB) are not downloaded.")
+    add_fetcher_arguments(parser)
+    add_search_arguments(parser)
+
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
     args = parser.parse_args()
 
-    # Read in those plant with urls available.
-    conn = sqlite3.connect(DATABASE_LOC)
-    c = conn.cursor()
-    # <> is != in SQL.
-    c.execute("""SELECT Plant_Name FROM 'hyperlinks' WHERE url<>'no link found' """)
-    plants_found_list = [row for row in c.fetchall()]
-    c.close()
-
-    # Convert to list for easier handling.
-    plants_found = [name[0] for name in plants_found_list]
-    # filter to range to search.
-    latin_names_subset = list(plants_found)[args.subset_start:args.subset_end]
-
-    plant_with_image, plant_no_image = helper_functions.search_save_plant_image(
-        latin_names=latin_names_subset,
-        api_key=API_KEY,
-        search_engine_id=SEARCH_ENGINE_ID
-    )
-
-    # Save these to the database
-    conn = sqlite3.connect(DATABASE_LOC)
-    c = conn.cursor()
-
-    # drops table only if starting over.
-    if args.restart == "restart":
-        c.execute("""DROP TABLE IF EXISTS plant_images""")
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS plant_images(
-        Plant_Name TEXT PRIMARY KEY,
-        File_Path TEXT,
-        Website TEXT
-        )
-    """)
-
-    c.executemany("""INSERT INTO plant_images VALUES (?,?,?)""",
-                  plant_with_image)
-    c.executemany("""INSERT INTO plant_images VALUES (?,?,?)""",
-                  plant_no_image)
-    conn.commit()
-
-    # update on current status.
-    c.execute("""SELECT * FROM 'plant_images'""")
-    output = []
-    found, not_found = 0, 0
-
-    for row in c.fetchall():
-        output.append(row)
-
-        if row[1] == "no image found":
-            not_found += 1
-        else:
-            found += 1
-
-    print(f"Total number of images now searched: {len(output)}")
-    print(f"Number of images found: {found}")
-    print(f"Number of images not found: {not_found}")
-
-    c.close()
+    with BulkWriter(args.database) as conn:
+        # Read in those plant with urls available.
+        c = conn.cursor()
+        # <> is != in SQL.
+        c.execute("""SELECT Plant_Name FROM 'hyperlinks' WHERE url<>'no link found' """)
+        plants_found_list = [row for row in c.fetchall()]
+
+        # Convert to list for easier handling.
+        plants_found = [name[0] for name in plants_found_list]
+
+        queue = SearchJobQueue(conn, job_type="plant_images")
+        # drops table only if starting over.
+        if args.restart:
+            c.execute("""DROP TABLE IF EXISTS plant_images""")
+            c.execute("""DELETE FROM search_jobs WHERE Job_Type='plant_images'""")
+            conn.commit()
+
+        # skip plants with an image from before the queue was used (plants already in the queue are skipped anyway).
+        c.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name='plant_images'""")
+        if c.fetchone() is not None:
+            c.execute("""SELECT Plant_Name FROM 'plant_images'""")
+            searched = {row[0] for row in c.fetchall()}
+            plants_found = [name for name in plants_found if name not in searched]
+        print(f"Number of plants added to the search queue: {queue.add(plants_found)}")
+
+        if args.stage in ("search", "all"):
+            helper_functions.run_image_search_queue(
+                conn, backend=backend_from_args(args, api_key=API_KEY, search_engine_id=SEARCH_ENGINE_ID),
+                daily_quota=args.daily_quota, retry_failed=args.retry_failed)
+        if args.stage in ("download", "all"):
+            helper_functions.run_image_downloads(conn, fetcher=fetcher_from_args(args),
+                                                 max_bytes=int(args.max_image_mb * 1024 * 1024))
+
+        # update on current status.
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS plant_images(
+            Plant_Name TEXT PRIMARY KEY,
+            File_Path TEXT,
+            Website TEXT
+            )
+        """)
+        c.execute("""SELECT * FROM 'plant_images'""")
+        output = []
+        found, not_found = 0, 0
+
+        for row in c.fetchall():
+            output.append(row)
+
+            if row[1] == "no image found":
+                not_found += 1
+            else:
+                found += 1
+
+        print(f"Total number of images now searched: {len(output)}")
+        print(f"Number of images found: {found}")
+        print(f"Number of images not found: {not_found}")
@@ -1,20 +1,177 @@
 """
 Functions to help generate the various databases are stored here.
+
+The searches are split into making the search term (..._query) and reading the results (parse_...),
+so they can be run through the resumable search queue in search_scheduler.py.
 """
 
 import requests
+import sqlite3
 from typing import Tuple
-from time import sleep
-from googleapiclient.discovery import build
+
+from fetcher import Fetcher, TokenBucket
+from image_downloader import IMAGE_DIR, MAX_IMAGE_BYTES, ImageStore, download_image, download_images
+from search_scheduler import (DAILY_QUOTA, GoogleSearchBackend, QuotaExceeded, SEARCHES_PER_SECOND,
+                              SearchJobQueue, print_queue_status, run_search_jobs)
+from upsert import ensure_tracking_columns, print_report, upsert_rows
+
+
+def link_search_query(latin_name: str) -> Tuple[str, dict]:
+    """
+    Search term to find the missouribotanicalgarden.org page of a plant.
+
+    Parameters
+    ----------
+    latin_name : str
+        Plant to search for.
+
+    Returns
+    -------
+    str
+        Search term.
+
+    dict
+        Other parameters for the search API.
+    """
+    search_term = "\"" + latin_name + "\"" + \
+        " site:http://www.missouribotanicalgarden.org"
+    return search_term, {}
+
+
+def parse_link_result(latin_name: str, result: dict) -> tuple:
+    """
+    Take the top search result if it is a missouribotanicalgarden.org plant page.
+
+    Parameters
+    ----------
+    latin_name : str
+        Plant searched for.
+
+    result : dict
+        Search results from the API.
+
+    Returns
+    -------
+    tuple
+        First element is plant name, second is the url (or the string: "no link found").
+    """
+    match_me = "https://www.missouribotanicalgarden.org/PlantFinder/PlantFinderDetails"
+
+    try:
+        top_result = result["items"][0]["link"]
+        if top_result != None and match_me in top_result:
+            return (latin_name, top_result)
+        return (latin_name, "no link found")
+
+    except KeyError:  # KeyError: 'items' occurs if no search results.
+        return (latin_name, "no link found")
+
+
+def image_search_query(latin_name: str) -> Tuple[str, dict]:
+    """
+    Search term to find an image (that is free to use or share) of a plant.
+
+    Parameters
+    ----------
+    latin_name : str
+        Plant to search for.
+
+    Returns
+    -------
+    str
+        Search term.
+
+    dict
+        Other parameters for the search API.
+    """
+    search_term = "\"" + latin_name + "\"" + " houseplant buy"
+    # limit search to those that are free to use or share:
+    params = dict(
+        searchType="image",
+        rights="(cc_publicdomain|cc_attribute|cc_sharealike|cc_noncommercial|cc_nonderived)")
+    return search_term, params
+
+
+def parse_image_result(latin_name: str, result: dict) -> tuple:
+    """
+    Take the image url from the top image search result.
+
+    Parameters
+    ----------
+    latin_name : str
+        Plant searched for.
+
+    result : dict
+        Search results from the API.
+
+    Returns
+    -------
+    tuple
+        Plant name, image url, file type and the website the image is from.
+        If there were no results, the last three are the string: "no image found".
+    """
+    try:
+        image_url = result["items"][0]["link"]
+        file_type = (result["items"][0]["fileFormat"]).split("/")[1]
+        website_url = result["items"][0]['displayLink']
+
+    except KeyError:  # KeyError: 'items' occurs if no search results.
+        return (latin_name, "no image found", "no image found", "no image found")
+
+    return (latin_name, image_url, file_type, website_url)
 
 
-def search_for_plant(latin_names: set, api_key: str, search_engine_id: str) -> Tuple[list, list]:
+def save_plant_image(image_result: tuple, fetcher: Fetcher, store: ImageStore = None) -> tuple:
+    """
+    Download the image found by the image search (see: image_downloader.py).
+
+    Parameters
+    ----------
+    image_result : tuple
+        Output of parse_image_result.
+
+    fetcher : Fetcher
+        Used to download the image.
+
+    store : ImageStore
+        Images already stored, so duplicates are not saved twice.
+
+    Returns
+    -------
+    tuple
+        First element is plant name, second is the file path to the image and
+        third is the website url where the image was taken from.
+        If no image was found/could be downloaded, the last two are the string: "no image found".
+    """
+    latin_name, image_url, file_type, website_url = image_result
+    # tuple size same as when an image is found, so easy store in SQL database
+    no_image = (latin_name, "no image found", "no image found")
+    if image_url == "no image found":
+        return no_image
+
+    try:
+        image_path = download_image(fetcher, image_url, file_path=plant_image_path(latin_name, file_type),
+                                    store=store if store is not None else ImageStore(conn=None))
+    except requests.RequestException:  # image could not be downloaded (after retries) or was rejected.
+        return no_image
+
+    # store as tuple for ease with SQL.
+    return (latin_name, image_path, website_url)
+
+
+def plant_image_path(latin_name: str, file_type: str) -> str:
+    """File path an image of a plant is saved to."""
+    return IMAGE_DIR + "/" + latin_name.replace(" ", "_") + "." + file_type
+
+
+def search_for_plant(latin_names: set, api_key: str, search_engine_id: str,
+                     backend: GoogleSearchBackend = None) -> Tuple[list, list]:
     """
     Use Googles API to search for a hyperlink about each plant on the website:
     https://www.missouribotanicalgarden.org/PlantFinder/
 
-    Google's API key allows only 100 requests per day, so this function is called multiple times
-    in order to run enough queries.
+    Google's API key allows only 100 requests per day, for more plants than that
+    use the search queue instead (see: search_scheduler.py and generate_database.py).
 
     Parameters
     ----------
@@ -27,6 +184,9 @@ def search_for_plant(latin_names: set, api_key: str, search_engine_id: str) -> T
     search_engine_id : str
         Google custom search id.
 
+    backend : GoogleSearchBackend
+        Used to search, if None one is made with api_key and search_engine_id.
+
     Returns
     -------
     list
@@ -37,37 +197,36 @@ def search_for_plant(latin_names: set, api_key: str, search_engine_id: str) -> T
         Plants where no match was found. Each list item is a tuple.
         First element is plant name, second is the string: "no link found".
     """
-    plant_with_link, plant_no_link = [], []
+    if backend is None:
+        backend = GoogleSearchBackend(api_key=api_key, search_engine_id=search_engine_id)
+    bucket = TokenBucket(rate=SEARCHES_PER_SECOND, burst=1)
 
+    plant_with_link, plant_no_link = [], []
     for latin_name in latin_names:
-        search_term = "\"" + latin_name + "\"" + \
-            " site:http://www.missouribotanicalgarden.org"
-
-        resource = build("customsearch", 'v1', developerKey=api_key).cse()
-        result = resource.list(q=search_term, cx=search_engine_id).execute()
-
-        match_me = "https://www.missouribotanicalgarden.org/PlantFinder/PlantFinderDetails"
-
+        search_term, params = link_search_query(latin_name)
+        bucket.acquire()
         try:
-            top_result = result["items"][0]["link"]
-            if top_result != None and match_me in top_result:
-                plant_with_link.append((latin_name, top_result))
-            else:
-                plant_no_link.append((latin_name, "no link found"))
+            result = backend.search(search_term, **params)
+        except QuotaExceeded:
+            print("Daily search quota used up.")
+            break
 
-        except KeyError:  # KeyError: 'items' occurs if no search results.
-            plant_no_link.append((latin_name, "no link found"))
+        plant_link = parse_link_result(latin_name, result)
+        if plant_link[1] == "no link found":
+            plant_no_link.append(plant_link)
+        else:
+            plant_with_link.append(plant_link)
 
-        sleep(2)
     return plant_with_link, plant_no_link
 
 
-def search_save_plant_image(latin_names: list, api_key: str, search_engine_id: str) -> Tuple[list, list]:
+def search_save_plant_image(latin_names: list, api_key: str, search_engine_id: str,
+                            fetcher: Fetcher = None, backend: GoogleSearchBackend = None) -> Tuple[list, list]:
     """
     Use Googles search API to search for an image (that is free to use or share) of each plant.
 
-    Google's API key allows only 100 requests per day, so this function is called multiple times
-    in order to run enough queries.
+    Google's API key allows only 100 requests per day, for more plants than that
+    use the search queue instead (see: search_scheduler.py and get_plant_images.py).
 
     Parameters
     ----------
@@ -80,6 +239,12 @@ def search_save_plant_image(latin_names: list, api_key: str, search_engine_id: s
     search_engine_id : str
         Google custom search id.
 
+    fetcher : Fetcher
+        Used to download each image (so it can be cached), if None one with the default settings is made.
+
+    backend : GoogleSearchBackend
+        Used to search, if None one is made with api_key and search_engine_id.
+
     Returns
     -------
     list
@@ -91,47 +256,154 @@ def search_save_plant_image(latin_names: list, api_key: str, search_engine_id: s
         Plants where no match was found. Each list item is a tuple.
         First element is plant name, second is the string: "no image found".
     """
-    request_headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36'}
+    if fetcher is None:
+        fetcher = Fetcher()
+    if backend is None:
+        backend = GoogleSearchBackend(api_key=api_key, search_engine_id=search_engine_id)
+    bucket = TokenBucket(rate=SEARCHES_PER_SECOND, burst=1)
 
     plant_with_image, plant_no_image = [], []
-
     for latin_name in latin_names:
-        search_term = "\"" + latin_name + "\"" + " houseplant buy"
+        search_term, params = image_search_query(latin_name)
+        bucket.acquire()
+        try:
+            result = backend.search(search_term, **params)
+        except QuotaExceeded:
+            print("Daily search quota used up.")
+            break
 
-        resource = build("customsearch", "v1", developerKey=api_key).cse()
-        result = resource.list(
-            q=search_term, cx=search_engine_id, searchType="image",
-            # limit search to those that are free to use or share:
-            rights="(cc_publicdomain|cc_attribute|cc_sharealike|cc_noncommercial|cc_nonderived)").execute()
+        plant_image = save_plant_image(parse_image_result(latin_name, result), fetcher=fetcher)
+        if plant_image[1] == "no image found":
+            plant_no_image.append(plant_image)
+        else:
+            plant_with_image.append(plant_image)
 
-        try:
-            image_url = result["items"][0]["link"]
-            file_type = (result["items"][0]["fileFormat"]).split("/")[1]
-            website_url = result["items"][0]['displayLink']
+    return plant_with_image, plant_no_image
 
-        except KeyError:  # KeyError: 'items' occurs if no search results.
-            # tuple size same as plant_with_image, so easy store in SQL database
-            plant_no_image.append(
-                (latin_name, "no image found", "no image found"))
 
-        else:  # if try was succesful, below executed.
-            image_path = r"Database/images/" + \
-                latin_name.replace(" ", "_") + "." + file_type
+def run_link_search_queue(conn: sqlite3.Connection, backend, daily_quota: int = DAILY_QUOTA,
+                          retry_failed: bool = False):
+    """
+    Carry on with the queued hyperlink searches (see: search_scheduler.py) until they are all done
+    or today's quota is used up, then save all the links found so far to the table "hyperlinks".
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database.
 
-            img_data = requests.get(
-                image_url,
-                headers=request_headers).content
+    backend : GoogleSearchBackend or FakeSearchBackend
+        Used to search.
 
-            with open(image_path, 'wb') as handler:
-                handler.write(img_data)
+    daily_quota : int
+        Number of searches allowed per day.
 
-            # store as tuple for ease with SQL.
-            plant_with_image.append((latin_name, image_path, website_url))
+    retry_failed : bool
+        If True, searches that failed before are tried again.
+    """
+    queue = SearchJobQueue(conn, job_type="hyperlinks")
+    if retry_failed:
+        queue.retry_failed()
+    run_search_jobs(queue, backend, make_query=link_search_query, handle_result=parse_link_result,
+                    daily_quota=daily_quota)
+
+    c = conn.cursor()
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS hyperlinks(
+        Plant_Name VARCHAR (100) PRIMARY KEY,
+        url VARCHAR (200)
+        )
+    """)
+    ensure_tracking_columns(c, "hyperlinks")
+
+    report = upsert_rows(c, table="hyperlinks", columns=["Plant_Name", "url"],
+                         rows=[tuple(result) for result in queue.results()])
+    conn.commit()
+    print_report("hyperlinks", report)
+    print_queue_status(queue, daily_quota)
+
+
+def run_image_search_queue(conn: sqlite3.Connection, backend, daily_quota: int = DAILY_QUOTA,
+                           retry_failed: bool = False):
+    """
+    Carry on with the queued image searches (see: search_scheduler.py) until they are all done
+    or today's quota is used up. The images found are downloaded by run_image_downloads.
 
-        sleep(2)
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database.
 
-    return plant_with_image, plant_no_image
+    backend : GoogleSearchBackend or FakeSearchBackend
+        Used to search.
+
+    daily_quota : int
+        Number of searches allowed per day.
+
+    retry_failed : bool
+        If True, searches that failed before are tried again.
+    """
+    queue = SearchJobQueue(conn, job_type="plant_images")
+    if retry_failed:
+        queue.retry_failed()
+    run_search_jobs(queue, backend, make_query=image_search_query, handle_result=parse_image_result,
+                    daily_quota=daily_quota)
+    print_queue_status(queue, daily_quota)
+
+
+def run_image_downloads(conn: sqlite3.Connection, fetcher: Fetcher, max_bytes: int = MAX_IMAGE_BYTES):
+    """
+    Download the images found by the image searches that are not in the table "plant_images" yet
+    (all at once, see: image_downloader.py) and save them to the table.
+    Plants the image search found no image for are saved as "no image found", plants whose download
+    failed (e.g. a timeout) are left out of the table so the next run tries them again.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database.
+
+    fetcher : Fetcher
+        Used to download the images, its max_workers sets how many are downloaded at once.
+
+    max_bytes : int
+        Largest image allowed.
+    """
+    c = conn.cursor()
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS plant_images(
+        Plant_Name TEXT PRIMARY KEY,
+        File_Path TEXT,
+        Website TEXT
+        )
+    """)
+    ensure_tracking_columns(c, "plant_images")
+
+    c.execute("""SELECT Plant_Name FROM plant_images""")
+    saved = {row[0] for row in c.fetchall()}
+    image_results = [tuple(result) for result in SearchJobQueue(conn, job_type="plant_images").results()
+                     if result[0] not in saved]
+
+    to_download = {latin_name: (image_url, plant_image_path(latin_name, file_type))
+                   for latin_name, image_url, file_type, _ in image_results if image_url != "no image found"}
+    image_paths = download_images(to_download, fetcher=fetcher, store=ImageStore(conn), max_bytes=max_bytes)
+
+    plant_images = []
+    failed = []
+    for latin_name, image_url, _, website_url in image_results:
+        if image_url == "no image found":
+            plant_images.append((latin_name, "no image found", "no image found"))
+        elif image_paths.get(latin_name) is None:
+            failed.append(latin_name)
+        else:
+            plant_images.append((latin_name, image_paths[latin_name], website_url))
+
+    report = upsert_rows(c, table="plant_images", columns=["Plant_Name", "File_Path", "Website"],
+                         rows=plant_images)
+    conn.commit()
+    print_report("plant_images", report)
+    if failed:
+        print(f"Images that failed to download (tried again next run): {len(failed)}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,239 @@
+"""
+Persistent cache of webpages/images downloaded by the Database scripts (see: fetcher.py).
+
+Each response body is saved once, under the hash of its content, and an index (a small SQL database)
+links each request (URL plus parameters) to its body, ETag and Last-Modified headers.
+When a cached URL is requested again the website is only asked if it has changed
+(If-None-Match/If-Modified-Since), so unchanged pages are not downloaded again.
+
+In offline mode no requests are made at all and only cached responses are replayed,
+e.g. to re-run a script after fixing a parsing bug.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Union
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+CACHE_DIR = "Database/http_cache"
+
+
+class OfflineCacheMiss(requests.RequestException):
+    """Raised in offline mode when a request has not been cached before."""
+
+
+class HTTPCache:
+    """
+    On disk cache of HTTP responses.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Folder to save the cache to.
+
+    offline : bool
+        If True, only replay cached responses and never make a request.
+
+    max_age_seconds : float
+        Cached responses younger than this are used without asking the website if they have changed.
+        0 to always check.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, offline: bool = False, max_age_seconds: float = 0):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.max_age_seconds = max_age_seconds
+        os.makedirs(os.path.join(cache_dir, "bodies"), exist_ok=True)
+
+        # shared by the download threads, so access is guarded by a lock.
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "index.db"), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses(
+                Cache_Key TEXT PRIMARY KEY,
+                Url TEXT,
+                Content_Hash TEXT,
+                Content_Type TEXT,
+                ETag TEXT,
+                Last_Modified TEXT,
+                Fetched_At REAL
+                )
+            """)
+            self._conn.commit()
+
+    @staticmethod
+    def cache_key(url: str, params: Union[dict, None] = None) -> str:
+        """
+        Make the key a request is stored under, the URL plus any (sorted) query parameters.
+
+        Parameters
+        ----------
+        url : str
+            URL requested.
+
+        params : dict or None
+            Query parameters sent with the request.
+
+        Returns
+        -------
+        str
+            Hex digest unique to the request.
+        """
+        request_id = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha256(request_id.encode()).hexdigest()
+
+    def _body_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, "bodies", content_hash[:2], content_hash)
+
+    def lookup(self, url: str, params: Union[dict, None] = None) -> Union[dict, None]:
+        """
+        Find the cached entry for a request.
+
+        Parameters
+        ----------
+        url : str
+            URL requested.
+
+        params : dict or None
+            Query parameters sent with the request.
+
+        Returns
+        -------
+        dict or None
+            Keys are the column names of the index, None if not cached (or its body is missing).
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                """SELECT * FROM responses WHERE Cache_Key=?""", (self.cache_key(url, params),))
+            row = cursor.fetchone()
+            columns = [description[0] for description in cursor.description]
+
+        if row is None:
+            return None
+        entry = dict(zip(columns, row))
+        if not os.path.exists(self._body_path(entry["Content_Hash"])):
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        """True if the entry can be used without asking the website if it has changed."""
+        return self.offline or time.time() - entry["Fetched_At"] < self.max_age_seconds
+
+    @staticmethod
+    def conditional_headers(entry: Union[dict, None]) -> dict:
+        """Headers asking the website to only send the page if it changed since it was cached."""
+        headers = {}
+        if entry is not None:
+            if entry["ETag"]:
+                headers["If-None-Match"] = entry["ETag"]
+            if entry["Last_Modified"]:
+                headers["If-Modified-Since"] = entry["Last_Modified"]
+        return headers
+
+    def store(self, url: str, params: Union[dict, None], response: requests.Response):
+        """
+        Save a successful response to the cache.
+
+        Parameters
+        ----------
+        url : str
+            URL requested.
+
+        params : dict or None
+            Query parameters sent with the request.
+
+        response : requests.Response
+            The response to save.
+        """
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        body_path = self._body_path(content_hash)
+        if not os.path.exists(body_path):
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            # written to a temp file first so a crash never leaves half a body in the cache.
+            tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as handler:
+                handler.write(response.content)
+            os.replace(tmp_path, body_path)
+
+        self._save_entry(url, params, response.headers, content_hash)
+
+    def store_file(self, url: str, params: Union[dict, None], headers: dict, file_path: str, content_hash: str):
+        """
+        Save a response that was streamed to a file (e.g. a large image) to the cache.
+
+        Parameters
+        ----------
+        url : str
+            URL requested.
+
+        params : dict or None
+            Query parameters sent with the request.
+
+        headers : dict
+            Headers of the response.
+
+        file_path : str
+            File the body of the response was saved to.
+
+        content_hash : str
+            sha256 hex digest of the file.
+        """
+        body_path = self._body_path(content_hash)
+        if not os.path.exists(body_path):
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+            shutil.copyfile(file_path, tmp_path)
+            os.replace(tmp_path, body_path)
+
+        self._save_entry(url, params, headers, content_hash)
+
+    def _save_entry(self, url: str, params: Union[dict, None], headers: dict, content_hash: str):
+        row = (self.cache_key(url, params), url, content_hash, headers.get("Content-Type"),
+               headers.get("ETag"), headers.get("Last-Modified"), time.time())
+        with self._lock:
+            self._conn.execute("""INSERT OR REPLACE INTO responses VALUES (?,?,?,?,?,?,?)""", row)
+            self._conn.commit()
+
+    def touch(self, entry: dict):
+        """Mark a cached entry as just checked (the website said it has not changed)."""
+        with self._lock:
+            self._conn.execute("""UPDATE responses SET Fetched_At=? WHERE Cache_Key=?""",
+                               (time.time(), entry["Cache_Key"]))
+            self._conn.commit()
+
+    def replay(self, entry: dict) -> requests.Response:
+        """
+        Rebuild a response from a cached entry.
+
+        Parameters
+        ----------
+        entry : dict
+            Output of lookup.
+
+        Returns
+        -------
+        requests.Response
+            Same as the original response (status 200), with the attribute "from_cache" set to True.
+        """
+        with open(self._body_path(entry["Content_Hash"]), "rb") as handler:
+            content = handler.read()
+
+        response = requests.Response()
+        response._content = content
+        # so iter_content (used when streaming) reads from the content instead of a connection.
+        response._content_consumed = True
+        response.status_code = 200
+        response.url = entry["Url"]
+        response.headers = CaseInsensitiveDict(
+            {key: value for key, value in [("Content-Type", entry["Content_Type"]), ("ETag", entry["ETag"]),
+                                           ("Last-Modified", entry["Last_Modified"])] if value})
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.from_cache = True
+        return response
@@ -0,0 +1,196 @@
+"""
+Download the plant images found by the image search (see: get_plant_images.py), as a separate stage.
+
+Images are downloaded at the same time by a pool of threads (see: fetcher.py) and streamed to disk in chunks,
+so a large image is never held in memory. Each download is:
+- checked to be an image (Content-Type) and no larger than MAX_IMAGE_BYTES.
+- written to a temp file first and only moved into place once complete,
+  so a failed or interrupted download never leaves half an image behind.
+- hashed, so identical images (e.g. the same photo used for two plants) are only stored once.
+  The hash and path of each stored image are saved to the table "image_files".
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+import requests
+
+from fetcher import Fetcher
+
+IMAGE_DIR = "Database/images"
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+CHUNK_BYTES = 64 * 1024
+
+
+class ImageRejected(requests.RequestException):
+    """Raised if a download is not an image or is too large."""
+
+
+class ImageStore:
+    """
+    Keeps track of the images already stored (by content hash), so duplicates are not stored twice.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection or None
+        Connection to the database, the table "image_files" is made if needed.
+        If None, duplicates are only found among the images downloaded with this store.
+    """
+
+    def __init__(self, conn: Union[sqlite3.Connection, None]):
+        self.conn = conn
+        self._paths = {}
+        if conn is not None:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS image_files(
+                Content_Hash TEXT PRIMARY KEY,
+                File_Path TEXT
+                )
+            """)
+            conn.commit()
+
+            c = conn.cursor()
+            c.execute("""SELECT Content_Hash, File_Path FROM image_files""")
+            # files deleted by hand since are forgotten, so they can be stored again.
+            self._paths = {content_hash: path for content_hash, path in c.fetchall() if os.path.exists(path)}
+        self._new = {}
+        self._lock = threading.Lock()
+
+    def claim(self, content_hash: str, file_path: str) -> str:
+        """
+        Register a new image, unless one with the same content is already stored.
+
+        Parameters
+        ----------
+        content_hash : str
+            sha256 hex digest of the image.
+
+        file_path : str
+            Where the image will be stored if it is new.
+
+        Returns
+        -------
+        str
+            Path of the stored image, file_path if new, otherwise the path of the existing copy.
+        """
+        with self._lock:
+            if content_hash not in self._paths:
+                self._paths[content_hash] = file_path
+                self._new[content_hash] = file_path
+            return self._paths[content_hash]
+
+    def save(self):
+        """Save the newly stored images to the table "image_files" (call from the thread that made the store)."""
+        if self.conn is None:
+            return
+        self.conn.executemany("""INSERT OR REPLACE INTO image_files VALUES (?,?)""", list(self._new.items()))
+        self.conn.commit()
+        self._new = {}
+
+
+def download_image(fetcher: Fetcher, url: str, file_path: str, store: ImageStore,
+                   max_bytes: int = MAX_IMAGE_BYTES) -> str:
+    """
+    Stream an image to disk.
+
+    Parameters
+    ----------
+    fetcher : Fetcher
+        Used to make the request (rate limits, retries and cache).
+
+    url : str
+        URL of the image.
+
+    file_path : str
+        Where to save the image.
+
+    store : ImageStore
+        Images already stored, if the image is a duplicate it is not saved again.
+
+    max_bytes : int
+        Largest image allowed.
+
+    Returns
+    -------
+    str
+        Path to the image (can be that of an identical image stored before).
+
+    Raises
+    ------
+    requests.RequestException
+        If the download failed (ImageRejected if it is not an image or too large).
+    """
+    with fetcher.fetch(url, stream=True) as response:
+        content_type = response.headers.get("Content-Type", "")
+        if not content_type.startswith("image/"):
+            raise ImageRejected(f"Not an image ({content_type}): {url}")
+        if int(response.headers.get("Content-Length") or 0) > max_bytes:
+            raise ImageRejected(f"Image larger than {max_bytes} bytes: {url}")
+
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        hasher = hashlib.sha256()
+        n_bytes = 0
+        try:
+            with open(tmp_path, "wb") as handler:
+                for chunk in response.iter_content(chunk_size=CHUNK_BYTES):
+                    n_bytes += len(chunk)
+                    # Content-Length can be missing or wrong, so also check while downloading.
+                    if n_bytes > max_bytes:
+                        raise ImageRejected(f"Image larger than {max_bytes} bytes: {url}")
+                    hasher.update(chunk)
+                    handler.write(chunk)
+
+            content_hash = hasher.hexdigest()
+            if fetcher.cache is not None and not getattr(response, "from_cache", False):
+                fetcher.cache.store_file(url, None, response.headers, tmp_path, content_hash)
+
+            stored_path = store.claim(content_hash, file_path)
+            if stored_path == file_path:
+                os.replace(tmp_path, file_path)
+            return stored_path
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def download_images(images: dict, fetcher: Fetcher, store: ImageStore,
+                    max_bytes: int = MAX_IMAGE_BYTES) -> dict:
+    """
+    Download many images at once.
+
+    Parameters
+    ----------
+    images : dict
+        Keys identify each image (e.g. plant name), values are tuples of the URL and where to save it.
+
+    fetcher : Fetcher
+        Used to make the requests, its max_workers sets how many images are downloaded at once.
+
+    store : ImageStore
+        Images already stored.
+
+    max_bytes : int
+        Largest image allowed.
+
+    Returns
+    -------
+    dict
+        Keys as given, values are the paths to each image, or None if the download failed.
+    """
+    def download(key: str) -> Union[str, None]:
+        url, file_path = images[key]
+        try:
+            return download_image(fetcher, url, file_path, store=store, max_bytes=max_bytes)
+        except requests.RequestException as error:
+            print(f"Failed to download image: {key} ({error})")
+            return None
+
+    with ThreadPoolExecutor(max_workers=fetcher.max_workers) as executor:
+        paths = dict(zip(images, executor.map(download, images)))
+
+    store.save()
+    return paths
@@ -0,0 +1,208 @@
+"""
+This script makes every plant image square, so each card of the Dash app is the same size,
+replacing the manual steps of Resize_Images.ipynb.
+
+Same as the notebook's reformat_image, images that are not square are centred on a transparent square
+(saved as "<name>_resized.png", as .jpg does not support transparency) and the "plant_images" table is
+updated to use the new file. Images are also shrunk to at most MAX_SIZE pixels (the largest size used by
+the app, see: generate_image_variants.py), decoding JPEGs at a reduced size (Pillow's draft mode) so large
+supplier images never need to be fully loaded into memory.
+
+The images are processed in a pool of processes (one per core by default). The original file of each image
+and a hash of it are saved to the "plant_images" table (columns: "Source_Path" and "Source_Hash"),
+so images whose original has not changed since the last run are skipped.
+The table is updated in one transaction once all images are done.
+
+A new image file leaves the image variants and placeholders made from the old one (columns: "Webp_Srcset",
+"Avif_Srcset" and "Placeholder") out of date, re-run generate_image_variants.py and
+generate_image_placeholders.py afterwards (build_pipeline.py does this automatically).
+
+Run from the top directory of the repository:
+python Database/normalise_images.py
+"""
+import argparse
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple
+
+from PIL import Image
+
+from bulk_writer import connect, transaction
+from generate_image_variants import VARIANT_WIDTHS
+
+DATABASE_LOC = "Database/house_plants.db"
+
+# largest width/height kept (in pixels).
+MAX_SIZE = max(VARIANT_WIDTHS)
+RESIZED_SUFFIX = "_resized.png"
+NO_IMAGE = "no image found"
+
+
+def resized_path(image_path: str) -> str:
+    """
+    Path to save the normalised version of an image to. An image normalised before (e.g. by
+    Resize_Images.ipynb) keeps its name, so "Aechmea_resized.jpg" gives "Aechmea_resized.png".
+    """
+    stem = os.path.splitext(image_path)[0]
+    if stem.endswith("_resized"):
+        stem = stem[:-len("_resized")]
+    return stem + RESIZED_SUFFIX
+
+
+def source_hash(image_path: str, max_size: int) -> str:
+    """
+    Hash of an image file and the settings it is normalised with (so changing them redoes every image).
+
+    Parameters
+    ----------
+    image_path : str
+        Path to the image.
+
+    max_size : int
+        Largest width/height kept.
+
+    Returns
+    -------
+    str
+        sha256 hex digest.
+    """
+    hasher = hashlib.sha256(f"{max_size}:".encode())
+    with open(image_path, "rb") as handler:
+        for chunk in iter(lambda: handler.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def reformat_image(image_in_path: str, image_out_path: str, max_size: int = MAX_SIZE) -> bool:
+    """
+    Reformat an image so that its width and height are the same.
+    This is done by adding transparent blocks to each end of the smaller side (so the image is still
+    in the centre). Images larger than max_size are shrunk first (keeping their aspect ratio).
+
+    Parameters
+    ----------
+    image_in_path : str
+        Path to the image.
+
+    image_out_path : str
+        Path to save the reformatted image to (.png).
+
+    max_size : int
+        Largest width/height kept.
+
+    Returns
+    -------
+    bool
+        True if a new image was saved, False if the image was already square (and not too large).
+    """
+    image = Image.open(image_in_path, "r")
+    width, height = image.size
+    if width == height and width <= max_size:
+        return False
+
+    # JPEGs are decoded at the smallest scale (1/2, 1/4 or 1/8) still at least max_size, to save memory.
+    image.draft("RGB", (max_size, max_size))
+
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    width, height = image.size
+    bigside = max(width, height)
+    background = Image.new("RGBA", (bigside, bigside), (255, 255, 255, 0))
+    offset = (int(round((bigside - width) / 2, 0)), int(round((bigside - height) / 2, 0)))
+
+    background.paste(image, offset)
+    background.save(image_out_path)
+    return True
+
+
+def normalise_image(job: Tuple[str, str, str, str, int]) -> Tuple[str, str, str, str]:
+    """
+    Normalise one plant's image, run in the worker processes.
+
+    Parameters
+    ----------
+    job : tuple
+        Plant name, path to the original image, hash of the original image from the last run (or None),
+        path to the image used now and max_size.
+
+    Returns
+    -------
+    tuple
+        Plant name, the outcome ("unchanged": skipped as the original has not changed since the last run,
+        "kept": already square so the original is used, "normalised" or "failed: <error>"),
+        the path to the image to use and the hash of the original.
+    """
+    plant_name, image_path, last_hash, current_path, max_size = job
+    try:
+        image_hash = source_hash(image_path, max_size)
+        if image_hash == last_hash and os.path.exists(current_path):
+            return plant_name, "unchanged", current_path, image_hash
+
+        out_path = resized_path(image_path)
+        if reformat_image(image_in_path=image_path, image_out_path=out_path, max_size=max_size):
+            return plant_name, "normalised", out_path, image_hash
+        return plant_name, "kept", image_path, image_hash
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        return plant_name, f"failed: {error}", current_path, last_hash
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Make every plant image square (and at most --max_size pixels) for the Dash app."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    parser.add_argument("--max_size", type=int, default=MAX_SIZE,
+                        help="Largest width/height (in pixels) of the images.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="Number of processes to use.")
+    parser.add_argument("--force", action="store_true",
+                        help="Redo every image, even if its original has not changed.")
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    c = conn.cursor()
+    # add the new columns if this is the first time the script is run.
+    c.execute("""PRAGMA table_info(plant_images)""")
+    existing_columns = [row[1] for row in c.fetchall()]
+    for column in ["Source_Path", "Source_Hash"]:
+        if column not in existing_columns:
+            c.execute(f"""ALTER TABLE plant_images ADD COLUMN {column} TEXT""")
+    conn.commit()
+
+    # images not normalised before have no Source_Path, their current file is the original.
+    c.execute("""
+    SELECT Plant_Name, COALESCE(Source_Path, File_Path), Source_Hash, File_Path
+    FROM plant_images WHERE File_Path<>?
+    """, (NO_IMAGE, ))
+    jobs = [(plant_name, source_path, None if args.force else last_hash, current_path, args.max_size)
+            for plant_name, source_path, last_hash, current_path in c.fetchall()]
+
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        results = list(executor.map(normalise_image, jobs, chunksize=max(1, len(jobs) // (4 * args.processes))))
+
+    outcomes = {}
+    updates = []
+    n_new_files = 0
+    for (plant_name, source_path, _, current_path, _), (_, outcome, file_path, image_hash) in zip(jobs, results):
+        if outcome.startswith("failed"):
+            print(f"Failed to normalise the image of {plant_name} ({source_path}): {outcome[len('failed: '):]}")
+            outcome = "failed"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        n_new_files += file_path != current_path
+        updates.append((file_path, source_path, image_hash, plant_name))
+
+    with transaction(conn) as c:
+        c.executemany("""UPDATE plant_images SET File_Path=?, Source_Path=?, Source_Hash=? WHERE Plant_Name=?""",
+                      updates)
+    conn.close()
+
+    print(f"Number of images normalised: {outcomes.get('normalised', 0)}")
+    print(f"Number of images already square: {outcomes.get('kept', 0)}")
+    print(f"Number of images unchanged since the last run: {outcomes.get('unchanged', 0)}")
+    print(f"Number of images that failed: {outcomes.get('failed', 0)}")
+    derived_columns = {"Webp_Srcset", "Avif_Srcset", "Placeholder"} & set(existing_columns)
+    if n_new_files and derived_columns:
+        print(f"Warning: {n_new_files} image(s) have a new file, so their values of "
+              f"{', '.join(sorted(derived_columns))} are out of date. Re-run generate_image_variants.py and generate_image_placeholders.py "
+              "(build_pipeline.py does this automatically).")
@@ -0,0 +1,206 @@
+"""
+Fast extraction of the plant details from a missouribotanicalgarden.org webpage (see: get_plant_details.py).
+
+The original functions (search_info_with_id, search_info_without_id and extract_common_names)
+build a full BeautifulSoup tree and search it 15 times. Here the page is parsed once with lxml
+and everything needed is collected with a single precompiled XPath query:
+- the divs with the ids in COLUMN_IDS (first match of each id).
+- the first div with the class "row" (for the flower, leaf and fruit descriptions).
+- the link holding the list of common names.
+
+The output is the same as get_plant_details.parse_soup_plant_page (check with: benchmark_page_extractor.py).
+"""
+import re
+from typing import Union
+
+import lxml.etree
+import lxml.html
+
+COMMON_NAMES_ID = "MainContentPlaceHolder_CommonNamesInfo_DisclaimerLink"
+COMMON_NAME_ID = "MainContentPlaceHolder_CommonNameRow"
+
+# HTML ids for each column.
+COLUMN_IDS = {
+    "Plant_Type": "MainContentPlaceHolder_TypeRow",
+    "Family": "MainContentPlaceHolder_FamilyRow",
+    "Zones": "MainContentPlaceHolder_ZoneRow",
+    "Native_Range": "MainContentPlaceHolder_NativeRangeRow",
+    "Heights": "MainContentPlaceHolder_HeightRow",
+    "Spreads": "MainContentPlaceHolder_SpreadRow",
+    "Bloom_Times": "MainContentPlaceHolder_BloomTimeRow",
+    "Bloom_Description": "MainContentPlaceHolder_ColorTextRow",
+    "Sunlight": "MainContentPlaceHolder_SunRow",
+    "Watering": "MainContentPlaceHolder_WaterRow",
+    "Maintenance": "MainContentPlaceHolder_MaintenanceRow",
+}
+
+# Columns without an id, found by the label at the start of their text in the first "row" div.
+COLUMN_LABELS = {
+    "Flowers": "Flower: ",
+    "Leafs": "Leaf: ",
+    "Fruits": "Fruit: ",
+}
+
+# the names are separated by <br/> or &bull; in the (html escaped) link.
+COMMON_NAME_SEPARATORS = re.compile("&lt;br/&gt;| &amp;bull; ")
+
+_ID_DIVS = set(COLUMN_IDS.values()) | {COMMON_NAME_ID}
+_FIND_ELEMENTS = lxml.etree.XPath(
+    "//div[@id] | //a[@id=$link_id] | (//div[contains(concat(' ', normalize-space(@class), ' '), ' row ')])[1]")
+# BeautifulSoup also searches the text of comments.
+_TEXT_NODES = lxml.etree.XPath(".//text() | .//comment()")
+
+_UTF8_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+_PARSER = lxml.html.HTMLParser()
+
+# tags serialised as <tag/> by BeautifulSoup.
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem",
+              "meta", "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame",
+              "image", "isindex", "nextid", "spacer"}
+
+
+def parse_html(content: Union[bytes, str]) -> lxml.etree._Element:
+    """
+    Parse a webpage (utf-8 unless it is not valid utf-8, then the encoding is detected by lxml).
+
+    Parameters
+    ----------
+    content : bytes or str
+        HTML of the webpage.
+
+    Returns
+    -------
+    lxml.etree._Element
+        Root of the document.
+    """
+    if isinstance(content, str):
+        return lxml.html.document_fromstring(content)
+    try:
+        content.decode("utf-8")
+        parser = _UTF8_PARSER
+    except UnicodeDecodeError:
+        parser = _PARSER
+    return lxml.etree.fromstring(content, parser)
+
+
+def _text_after_label(text: Union[str, None]) -> str:
+    # the text is e.g. "Type: Herbaceous perennial", remove the title of the label.
+    if text is None:
+        return "None"
+    parts = text.strip().split(": ")
+    return parts[1] if len(parts) > 1 else "None"
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _serialise(element: lxml.etree._Element) -> str:
+    """HTML of an element the same as str() of the BeautifulSoup tag, as the common names are split on it."""
+    attributes = []
+    # BeautifulSoup (with the lxml parser) lists the attributes sorted by name.
+    for name, value in sorted(element.attrib.items()):
+        if name == "class":  # BeautifulSoup treats class as a list of words.
+            value = " ".join(value.split())
+        value = _escape(value)
+        if '"' in value:
+            if "'" in value:
+                value = '"' + value.replace('"', "&quot;") + '"'
+            else:
+                value = "'" + value + "'"
+        else:
+            value = '"' + value + '"'
+        attributes.append(f" {name}={value}")
+
+    html = f"<{element.tag}{''.join(attributes)}"
+    if element.tag in _VOID_TAGS and len(element) == 0 and not element.text:
+        return html + "/>"
+
+    html += ">" + _escape(element.text or "")
+    for child in element:
+        if isinstance(child.tag, str):
+            html += _serialise(child)
+        elif child.tag is lxml.etree.Comment:
+            html += f"<!--{child.text}-->"
+        html += _escape(child.tail or "")
+    return html + f"</{element.tag}>"
+
+
+def split_common_names(link_html: str) -> list:
+    """
+    Split the html of the common names link into the names.
+
+    Parameters
+    ----------
+    link_html : str
+        HTML of the link (serialised as BeautifulSoup does) or "None" if there is no link.
+
+    Returns
+    -------
+    list
+        The names found (can be empty).
+    """
+    common_names = []
+    for text_block in COMMON_NAME_SEPARATORS.split(link_html)[2:]:
+        if "&quot" in text_block:  # after this, no more names.
+            break
+        if text_block != "":
+            common_names.append(text_block)
+    return common_names
+
+
+def extract_plant_page(content: Union[bytes, str]) -> dict:
+    """
+    Extract the desired information about a plant from its missouribotanicalgarden.org webpage.
+
+    Parameters
+    ----------
+    content : bytes or str
+        HTML of the webpage.
+
+    Returns
+    -------
+    dict
+        Keys are the column names (see: get_plant_details.COLUMN_NAMES, except "Plant_Name")
+        and values the extracted info.
+    """
+    root = parse_html(content)
+
+    id_texts, row_div, link = {}, None, None
+    for element in _FIND_ELEMENTS(root, link_id=COMMON_NAMES_ID):
+        element_id = element.get("id")
+        if element.tag == "a":
+            if link is None:
+                link = element
+            continue
+        if element_id in _ID_DIVS and element_id not in id_texts:
+            id_texts[element_id] = element.text
+        if row_div is None and "row" in (element.get("class") or "").split():
+            row_div = element
+
+    # special care as can be a list or str or none.
+    common_names = split_common_names("None" if link is None else _serialise(link))
+    if common_names == []:  # if only one common name, then no special dialog box, so empty list
+        common_names.append(_text_after_label(id_texts.get(COMMON_NAME_ID)))
+    plant_info = {"Common_Names": common_names}
+
+    for column, id_string in COLUMN_IDS.items():
+        plant_info[column] = _text_after_label(id_texts.get(id_string))
+
+    # These 3 don't have specific ids, take the first piece of text with the label instead.
+    label_texts = dict.fromkeys(COLUMN_LABELS, "None")
+    to_find = dict(COLUMN_LABELS)
+    for node in (_TEXT_NODES(row_div) if row_div is not None else []):
+        text = node if isinstance(node, str) else (node.text or "")
+        for column, label in list(to_find.items()):
+            if label in text:
+                label_texts[column] = str(text)
+                del to_find[column]
+        if not to_find:
+            break
+
+    for column, text in label_texts.items():
+        parts = text.split(": ")
+        plant_info[column] = parts[1] if len(parts) > 1 else "None"
+
+    return plant_info
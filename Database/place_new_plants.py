@@ -0,0 +1,172 @@
+"""
+This script adds plants that are in the "plant_features" table but not yet in the "plotting" table
+to the existing scatter graphs, without re-running t-SNE. Plants no longer in "plant_features"
+(e.g. removed by an upsert) are removed from the "plotting" table.
+
+Re-running t-SNE (embeddings.py) moves every point and is slow, so instead each
+new plant is placed at the weighted average position of its most similar existing plants
+(k nearest neighbours of the scaled features, weighted by 1/distance). This keeps all existing points
+where they are and takes milliseconds. The full t-SNE should still be re-run every now and then
+(e.g. after many plants have been added) as the placement is only an approximation.
+
+The jittered columns for the new plants are made the same way as in "embeddings.py".
+
+Afterwards, re-run "generate_sim_diff_table.py" (and "generate_sprite_atlas.py" if used)
+so that the new plants are included there too.
+
+Run from the top directory of the repository:
+python Database/place_new_plants.py
+"""
+import argparse
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from bulk_writer import connect, transaction
+from embeddings import MAINTENANCE_FEATURES, add_jitter, min_max_scale
+
+DATABASE_LOC = "Database/house_plants.db"
+
+# number of existing plants used to place each new plant.
+N_NEIGHBOURS = 5
+
+
+def knn_place(new_features: np.ndarray, existing_features: np.ndarray,
+              existing_coords: np.ndarray, n_neighbours: int = N_NEIGHBOURS) -> np.ndarray:
+    """
+    Place new points into an existing 2D embedding using the weighted average position
+    of the nearest existing points (by euclidean distance of the features).
+
+    Parameters
+    ----------
+    new_features : np.ndarray
+        Scaled features of the plants to place (rows are plants).
+
+    existing_features : np.ndarray
+        Scaled features of the plants already in the embedding.
+
+    existing_coords : np.ndarray
+        2D coords of the plants already in the embedding (same row order as existing_features).
+
+    n_neighbours : int
+        Number of nearest existing plants to use.
+
+    Returns
+    -------
+    np.ndarray
+        2D coords for each new plant.
+    """
+    n_neighbours = min(n_neighbours, len(existing_features))
+    existing_norms = (existing_features ** 2).sum(axis=1)
+
+    placed = np.empty((len(new_features), 2))
+    # done in chunks so the distance matrix stays small for large catalogs.
+    for start in range(0, len(new_features), 256):
+        chunk = new_features[start:start + 256]
+        squared = ((chunk ** 2).sum(axis=1)[:, None] + existing_norms[None, :]
+                   - 2 * chunk @ existing_features.T)
+        distances = np.sqrt(np.clip(squared, 0, None))
+
+        neighbours = np.argpartition(distances, n_neighbours - 1, axis=1)[:, :n_neighbours]
+        neighbour_distances = np.take_along_axis(distances, neighbours, axis=1)
+
+        # identical plants would get an infinite weight, a small offset avoids dividing by 0.
+        weights = 1.0 / (neighbour_distances + 1e-6)
+        weights /= weights.sum(axis=1, keepdims=True)
+        placed[start:start + 256] = (existing_coords[neighbours] * weights[:, :, None]).sum(axis=1)
+
+    return placed
+
+
+def place_new_plants(features_df: pd.DataFrame, plotting_df: pd.DataFrame,
+                     seed: int = None) -> Tuple[pd.DataFrame, list]:
+    """
+    Make the "plotting" table rows for plants that have features but are not yet plotted.
+
+    Parameters
+    ----------
+    features_df : pd.DataFrame
+        The plant_features table.
+
+    plotting_df : pd.DataFrame
+        The current plotting table.
+
+    seed : int
+        Seed for the random jitter, None for a different jitter each run (as in the notebook).
+
+    Returns
+    -------
+    pd.DataFrame
+        New rows for the plotting table (same columns as the table).
+
+    list
+        Names of the new plants.
+    """
+    feature_columns = [column for column in features_df.columns if column != "Plant_Name"]
+    # plants with features that could not be read (see: feature_engineering.check_features) cannot be placed
+    # (or used to place others), as their coordinates would be NaN.
+    is_complete = features_df[feature_columns].notna().all(axis=1)
+    if not is_complete.all():
+        print(f"Skipped plants with missing features: {', '.join(features_df.loc[~is_complete, 'Plant_Name'])}")
+        features_df = features_df.loc[is_complete]
+    is_new = ~features_df["Plant_Name"].isin(plotting_df["Plant_Name"])
+    new_df = features_df.loc[is_new].reset_index(drop=True)
+    if new_df.empty:
+        return pd.DataFrame(columns=plotting_df.columns), []
+
+    # plants removed from plant_features (e.g. by an upsert) may still be plotted, they cannot be used to place others.
+    plotting_df = plotting_df.loc[plotting_df["Plant_Name"].isin(features_df["Plant_Name"])]
+    # features must be in the same row order as the existing coords.
+    existing_df = features_df.set_index("Plant_Name").loc[plotting_df["Plant_Name"]].reset_index()
+
+    new_rows = pd.DataFrame({
+        "Plant_Name": new_df["Plant_Name"],
+        "Maintenance_Ordinal": new_df["Maintenance_Ordinal"],
+    })
+
+    for columns, prefix in [(feature_columns, "all_tsne"), (MAINTENANCE_FEATURES, "maintenance_tsne")]:
+        # scaled together so the new plants are on the same scale as the existing ones.
+        scaled = min_max_scale(np.vstack([
+            existing_df[columns].to_numpy(dtype=float), new_df[columns].to_numpy(dtype=float)]))
+
+        coords = knn_place(
+            new_features=scaled[len(existing_df):],
+            existing_features=scaled[:len(existing_df)],
+            existing_coords=plotting_df[[f"{prefix}_1", f"{prefix}_2"]].to_numpy(dtype=float))
+        new_rows[f"{prefix}_1"] = coords[:, 0]
+        new_rows[f"{prefix}_2"] = coords[:, 1]
+
+    new_rows = add_jitter(new_rows, new_df, np.random.default_rng(seed))
+
+    # any other columns (e.g. Atlas_X/Atlas_Y) are left empty until their scripts are re-run.
+    new_rows = new_rows.reindex(columns=plotting_df.columns)
+    return new_rows, list(new_df["Plant_Name"])
+
+
+if __name__ == '__main__':
+
+    parser_descrip = "Add newly featurised plants to the existing scatter graphs without re-running t-SNE."
+    parser = argparse.ArgumentParser(description=parser_descrip)
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
+    args = parser.parse_args()
+
+    conn = connect(args.database)
+    features_df = pd.read_sql_query("SELECT * FROM plant_features", conn)
+    plotting_df = pd.read_sql_query("SELECT * FROM plotting", conn)
+
+    new_rows, new_names = place_new_plants(features_df=features_df, plotting_df=plotting_df)
+    removed_names = list(plotting_df.loc[~plotting_df["Plant_Name"].isin(features_df["Plant_Name"]), "Plant_Name"])
+
+    with transaction(conn) as c:
+        # plants no longer in plant_features are removed from the scatter graphs too.
+        c.executemany("""DELETE FROM plotting WHERE Plant_Name=?""", [(name,) for name in removed_names])
+        if new_names:
+            new_rows.to_sql("plotting", con=conn, if_exists="append", index=False)
+    conn.close()
+
+    print(f"Number of new plants placed: {len(new_names)}")
+    print(f"Number of removed plants taken off the scatter graphs: {len(removed_names)}")
+    if new_names or removed_names:
+        print("Now re-run generate_sim_diff_table.py (and generate_sprite_atlas.py if used).")
@@ -0,0 +1,366 @@
+"""
+Quota aware, resumable scheduling of Google custom searches for the Database scripts.
+
+Google's custom search API only allows 100 searches per day. Previously the range of plants to search
+each day was chosen by hand (SUBSET_START/SUBSET_END and the positional ranges of the scripts).
+Instead, each search to do is saved as a job in the SQL database (table: "search_jobs", see: SearchJobQueue)
+and the searches made each day are counted (table: "search_quota"). Each run of a script carries on
+from where the last one stopped and only makes as many searches as are left of today's quota.
+
+The search backend can be swapped, e.g. FakeSearchBackend returns saved results without using the API.
+"""
+import argparse
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Union
+
+from fetcher import TokenBucket
+
+# the free tier of the API.
+DAILY_QUOTA = 100
+# the API also limits searches per minute, stay a little below 100.
+SEARCHES_PER_SECOND = 1.5
+# a job is marked as failed after this many errors.
+MAX_ATTEMPTS = 3
+
+# Google's quota resets at midnight Pacific time (UTC-8, ignoring daylight saving to stay on the safe side).
+QUOTA_TIMEZONE = timezone(timedelta(hours=-8))
+
+
+class QuotaExceeded(Exception):
+    """Raised by a search backend when the daily quota has been used up."""
+
+
+class GoogleSearchBackend:
+    """
+    Searches using Google's custom search API. The API client is built once and re-used for every search.
+
+    Parameters
+    ----------
+    api_key : str
+        Google api key.
+
+    search_engine_id : str
+        Google custom search id.
+    """
+
+    def __init__(self, api_key: str, search_engine_id: str):
+        from googleapiclient.discovery import build
+
+        self.search_engine_id = search_engine_id
+        self.resource = build("customsearch", "v1", developerKey=api_key).cse()
+
+    def search(self, query: str, **params) -> dict:
+        """
+        Run one search.
+
+        Parameters
+        ----------
+        query : str
+            Search term.
+
+        **params
+            Other parameters of the API (e.g. searchType="image").
+
+        Returns
+        -------
+        dict
+            The search results as returned by the API.
+
+        Raises
+        ------
+        QuotaExceeded
+            If the daily quota has been used up.
+        """
+        from googleapiclient.errors import HttpError
+
+        try:
+            return self.resource.list(q=query, cx=self.search_engine_id, **params).execute()
+        except HttpError as error:
+            if error.resp.status == 429 or "dailyLimitExceeded" in str(error):
+                raise QuotaExceeded(str(error)) from error
+            raise
+
+
+class FakeSearchBackend:
+    """
+    Stand in for GoogleSearchBackend that makes no requests, for testing the scripts.
+
+    Parameters
+    ----------
+    results : dict or Callable
+        Keys are the search terms and values the results to give (as returned by the API),
+        or a function called with the search term and parameters that gives the results.
+        Search terms not in the dict give no results.
+
+    daily_quota : int or None
+        If given, QuotaExceeded is raised after this many searches.
+    """
+
+    def __init__(self, results: Union[dict, Callable], daily_quota: Union[int, None] = None):
+        self.results = results
+        self.daily_quota = daily_quota
+        self.n_searches = 0
+
+    def search(self, query: str, **params) -> dict:
+        """Same as GoogleSearchBackend.search."""
+        if self.daily_quota is not None and self.n_searches >= self.daily_quota:
+            raise QuotaExceeded("Fake daily quota used up.")
+        self.n_searches += 1
+
+        if callable(self.results):
+            return self.results(query, **params)
+        return self.results.get(query, {})
+
+
+class SearchJobQueue:
+    """
+    Searches still to do, done and failed, saved in the SQL database so they survive between runs.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the database.
+
+    job_type : str
+        Name of the kind of search (e.g. "hyperlinks" or "plant_images"),
+        so the queues of different scripts do not mix.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, job_type: str):
+        self.conn = conn
+        self.job_type = job_type
+
+        c = conn.cursor()
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS search_jobs(
+            Job_Type TEXT,
+            Plant_Name TEXT,
+            Status TEXT,
+            Attempts INTEGER,
+            Result TEXT,
+            Last_Error TEXT,
+            Updated_At TEXT,
+            PRIMARY KEY (Job_Type, Plant_Name)
+            )
+        """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS search_quota(
+            Day TEXT PRIMARY KEY,
+            Used INTEGER
+            )
+        """)
+        conn.commit()
+
+    def add(self, plant_names: list) -> int:
+        """
+        Add searches to do, plants already in the queue (whatever their status) are skipped.
+
+        Parameters
+        ----------
+        plant_names : list
+            Plants to search for.
+
+        Returns
+        -------
+        int
+            Number of plants added.
+        """
+        c = self.conn.cursor()
+        c.executemany("""
+        INSERT INTO search_jobs VALUES (?,?,'pending',0,NULL,NULL,?)
+        ON CONFLICT(Job_Type, Plant_Name) DO NOTHING
+        """, [(self.job_type, name, _utc_now()) for name in plant_names])
+        self.conn.commit()
+        return c.rowcount
+
+    def retry_failed(self):
+        """Move all failed jobs back to pending."""
+        self.conn.execute("""UPDATE search_jobs SET Status='pending', Attempts=0
+                          WHERE Job_Type=? AND Status='failed'""", (self.job_type,))
+        self.conn.commit()
+
+    def pending(self, limit: int) -> list:
+        """Plant names still to search for, in the order they were added."""
+        c = self.conn.cursor()
+        c.execute("""SELECT Plant_Name FROM search_jobs WHERE Job_Type=? AND Status='pending'
+                  ORDER BY rowid LIMIT ?""", (self.job_type, limit))
+        return [row[0] for row in c.fetchall()]
+
+    def mark_done(self, plant_name: str, result: object):
+        """Save the result of a search (anything json serialisable)."""
+        self.conn.execute("""UPDATE search_jobs SET Status='done', Result=?, Last_Error=NULL, Updated_At=?
+                          WHERE Job_Type=? AND Plant_Name=?""",
+                          (json.dumps(result), _utc_now(), self.job_type, plant_name))
+        self.conn.commit()
+
+    def mark_error(self, plant_name: str, error: Exception):
+        """Record a failed attempt, the job is marked as failed after MAX_ATTEMPTS."""
+        self.conn.execute("""UPDATE search_jobs
+                          SET Attempts=Attempts+1, Last_Error=?, Updated_At=?,
+                              Status=CASE WHEN Attempts+1 >= ? THEN 'failed' ELSE 'pending' END
+                          WHERE Job_Type=? AND Plant_Name=?""",
+                          (repr(error), _utc_now(), MAX_ATTEMPTS, self.job_type, plant_name))
+        self.conn.commit()
+
+    def results(self) -> list:
+        """Results of all done searches, in the order they were added."""
+        c = self.conn.cursor()
+        c.execute("""SELECT Result FROM search_jobs WHERE Job_Type=? AND Status='done' ORDER BY rowid""",
+                  (self.job_type,))
+        return [json.loads(row[0]) for row in c.fetchall()]
+
+    def counts(self) -> dict:
+        """Number of jobs with each status."""
+        c = self.conn.cursor()
+        c.execute("""SELECT Status, COUNT(*) FROM search_jobs WHERE Job_Type=? GROUP BY Status""",
+                  (self.job_type,))
+        return {"pending": 0, "done": 0, "failed": 0, **dict(c.fetchall())}
+
+    def quota_used(self) -> int:
+        """Number of searches made today (shared by all job types, as they share the quota)."""
+        c = self.conn.cursor()
+        c.execute("""SELECT Used FROM search_quota WHERE Day=?""", (_quota_day(),))
+        row = c.fetchone()
+        return 0 if row is None else row[0]
+
+    def use_quota(self, n_searches: int = 1):
+        """Count searches made today."""
+        self.conn.execute("""INSERT INTO search_quota VALUES (?,?)
+                          ON CONFLICT(Day) DO UPDATE SET Used=Used+excluded.Used""",
+                          (_quota_day(), n_searches))
+        self.conn.commit()
+
+    def use_all_quota(self, daily_quota: int):
+        """Mark today's quota as used up (the API said so)."""
+        self.use_quota(max(0, daily_quota - self.quota_used()))
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _quota_day() -> str:
+    return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+
+def run_search_jobs(queue: SearchJobQueue, backend, make_query: Callable, handle_result: Callable,
+                    daily_quota: int = DAILY_QUOTA, searches_per_second: float = SEARCHES_PER_SECOND) -> int:
+    """
+    Run pending searches until they are all done or today's quota is used up.
+
+    Parameters
+    ----------
+    queue : SearchJobQueue
+        Searches to do.
+
+    backend : GoogleSearchBackend or FakeSearchBackend
+        Used to run each search.
+
+    make_query : Callable
+        Called with a plant name, gives a tuple of the search term and a dict of other search parameters.
+
+    handle_result : Callable
+        Called with a plant name and its search results,
+        gives what is saved in the queue for that plant (must be json serialisable).
+
+    daily_quota : int
+        Number of searches allowed per day.
+
+    searches_per_second : float
+        Maximum rate searches are made at.
+
+    Returns
+    -------
+    int
+        Number of searches made.
+    """
+    bucket = TokenBucket(rate=searches_per_second, burst=1)
+    n_searches = 0
+
+    remaining = daily_quota - queue.quota_used()
+    for plant_name in queue.pending(limit=max(0, remaining)):
+        query, params = make_query(plant_name)
+        bucket.acquire()
+        try:
+            result = backend.search(query, **params)
+        except QuotaExceeded:
+            queue.use_all_quota(daily_quota)
+            print("Daily search quota used up, run again tomorrow to carry on.")
+            break
+        except Exception as error:  # any API error, recorded so it is retried next run.
+            queue.use_quota()
+            n_searches += 1
+            queue.mark_error(plant_name, error)
+            continue
+
+        queue.use_quota()
+        n_searches += 1
+        queue.mark_done(plant_name, handle_result(plant_name, result))
+
+    return n_searches
+
+
+def print_queue_status(queue: SearchJobQueue, daily_quota: int = DAILY_QUOTA):
+    """
+    Print how many searches are done/left and how much of today's quota is left.
+
+    Parameters
+    ----------
+    queue : SearchJobQueue
+        Queue to report on.
+
+    daily_quota : int
+        Number of searches allowed per day.
+    """
+    counts = queue.counts()
+    print(f"Searches ({queue.job_type}): {counts['done']} done, {counts['pending']} pending, "
+          f"{counts['failed']} failed.")
+    print(f"Searches left today: {max(0, daily_quota - queue.quota_used())}")
+    if counts["pending"]:
+        print("Run this script again (e.g. tomorrow) to carry on with the pending searches.")
+
+
+def add_search_arguments(parser: argparse.ArgumentParser):
+    """
+    Add the command line options used by the search queue to a script's parser.
+
+    Parameters
+    ----------
+    parser : argparse.ArgumentParser
+        Parser of the script.
+    """
+    parser.add_argument("--daily_quota", type=int, default=DAILY_QUOTA,
+                        help="Number of searches allowed per day.")
+    parser.add_argument("--retry_failed", action="store_true",
+                        help="Try the searches that failed before again.")
+    parser.add_argument("--fake_results", type=str, default=None,
+                        help="Path to a json file of search results (keys are the search terms) "
+                             "to use instead of Google's API, for testing.")
+
+
+def backend_from_args(args: argparse.Namespace, api_key: str, search_engine_id: str):
+    """
+    Make the search backend from the command line options added by add_search_arguments.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Parsed command line options.
+
+    api_key : str
+        Google api key.
+
+    search_engine_id : str
+        Google custom search id.
+
+    Returns
+    -------
+    GoogleSearchBackend or FakeSearchBackend
+        Ready to use.
+    """
+    if args.fake_results is not None:
+        with open(args.fake_results) as handler:
+            return FakeSearchBackend(results=json.load(handler))
+    return GoogleSearchBackend(api_key=api_key, search_engine_id=search_engine_id)
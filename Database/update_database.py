@@ -1,75 +1,59 @@
 """
-Uses google's search API on a selected range of plant latin_names
+Carries on with the google searches queued by generate_database.py
 and updates the sql database with the search results.
 
-Google's search API only allows 100 searches per day, so this is broken up over 4 days.
-There are a total of 368 names to search through so:
+Google's search API only allows 100 searches per day, so the searches are spread over several days.
+Each run makes as many searches as are left of today's quota (see: search_scheduler.py),
+so just run this script once a day until there are no pending searches left:
 
-Day 1: Search first 95 with generate_database.py
-Day 2-4: Search (up to) 95 each day using this script (argparser used to control the range on the list).
+Day 1: generate_database.py queues all plants and searches the first ones.
+Day 2 onwards: Run this script.
 """
 import configparser
-import sqlite3
 import argparse
 
 import helper_functions
+from bulk_writer import BulkWriter
+from search_scheduler import add_search_arguments, backend_from_args
 
 
 config = configparser.ConfigParser()
 config.read("Database/config.ini")
-SEARCH_ENGINE_ID = config["Google Params"]["SEARCH_ENGINE_ID"]
-API_KEY = config["Google Params"]["API_KEY"]
-DATABASE_LOC = r"C:\Users\Rory Crean\Dropbox (lkgroup)\Backup_HardDrive\Postdoc\PyForFun\House_Plant_Recommender\Database\house_plants.db"
+# fallback so the script can still be run with --fake_results without a config file.
+SEARCH_ENGINE_ID = config.get("Google Params", "SEARCH_ENGINE_ID", fallback="")
+API_KEY = config.get("Google Params", "API_KEY", fallback="")
+DATABASE_LOC = "Database/house_plants.db"
 
 if __name__ == '__main__':
 
-    parser_descrip = "Define the range of names from latin_names to run through the google search API."
+    parser_descrip = "Carry on with the queued google searches for a link to each plant."
     parser = argparse.ArgumentParser(description=parser_descrip)
+    add_search_arguments(parser)
 
-    help_start = "first number to make the index the list of names, either 95 or 190 or 285"
-    help_end = "second number to make the index the list of names, either 190 or 285 or 380"
-    parser.add_argument("subset_start", type=int, help=help_start)
-    parser.add_argument("subset_end", type=int, help=help_end)
-
+    parser.add_argument("--database", type=str, default=DATABASE_LOC,
+                        help="Path to the SQL database.")
     args = parser.parse_args()
 
-    # Read in latin_names from database
-    conn = sqlite3.connect(DATABASE_LOC)
-    c = conn.cursor()
-
-    database_names = []
-    c.execute("""SELECT * FROM 'latin_names'""")
-    for row in c.fetchall():
-        database_names.append(row)
-
-    # reformat and take a subset to run the calculation on.
-    latin_names = [name[0] for name in database_names]
-    latin_names_subset = list(latin_names)[args.subset_start:args.subset_end]
-
-    # Run the search with the new subset.
-    plant_with_link, plant_no_link = helper_functions.search_for_plant(
-        latin_names=latin_names_subset, api_key=API_KEY, search_engine_id=SEARCH_ENGINE_ID)
-
-    # 2.5 Save these into the already exisiting database
-    c.executemany("""INSERT INTO hyperlinks VALUES (?,?)""", plant_with_link)
-    c.executemany("""INSERT INTO hyperlinks VALUES (?,?)""", plant_no_link)
-    conn.commit()
+    with BulkWriter(args.database) as conn:
+        c = conn.cursor()
 
-    c.execute("""SELECT * FROM 'hyperlinks'""")
+        helper_functions.run_link_search_queue(
+            conn, backend=backend_from_args(args, api_key=API_KEY, search_engine_id=SEARCH_ENGINE_ID),
+            daily_quota=args.daily_quota, retry_failed=args.retry_failed)
 
-    output = []
-    found, not_found = 0, 0
+        c.execute("""SELECT * FROM 'hyperlinks'""")
 
-    for row in c.fetchall():
-        output.append(row)
+        output = []
+        found, not_found = 0, 0
 
-        if row[1] == "no link found":
-            not_found += 1
-        else:
-            found += 1
+        for row in c.fetchall():
+            output.append(row)
 
-    print(f"Total number of links now searched: {len(output)}")
-    print(f"Number of links found: {found}")
-    print(f"Number of links not found: {not_found}")
+            if row[1] == "no link found":
+                not_found += 1
+            else:
+                found += 1
 
-    c.close()
+        print(f"Total number of links now searched: {len(output)}")
+        print(f"Number of links found: {found}")
+        print(f"Number of links not found: {not_found}")
@@ -0,0 +1,163 @@
+"""
+Functions to incrementally update the tables made by the scraping scripts, instead of remaking them.
+
+Each updated table gets two extra columns:
+- "Scraped_At": when the row was last scraped (UTC, ISO format), used to find rows that are stale.
+- "Content_Hash": hash of the row's values, used to tell if a re-scraped row actually changed.
+
+Rows are written with INSERT ... ON CONFLICT (an "upsert"), so only the rows scraped are written
+and the rest of the table is left as it is.
+"""
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from bulk_writer import write_rows
+
+
+def utc_now() -> str:
+    """Current time (UTC) in the format stored in "Scraped_At"."""
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def ensure_tracking_columns(c: sqlite3.Cursor, table: str):
+    """
+    Add the "Scraped_At" and "Content_Hash" columns to a table if they are not there yet.
+
+    Parameters
+    ----------
+    c : sqlite3.Cursor
+        Cursor of the database.
+
+    table : str
+        Name of the table.
+    """
+    c.execute(f"""PRAGMA table_info({table})""")
+    existing_columns = [row[1] for row in c.fetchall()]
+    for column in ["Scraped_At", "Content_Hash"]:
+        if column not in existing_columns:
+            c.execute(f"""ALTER TABLE {table} ADD COLUMN {column} TEXT""")
+
+
+def row_hash(values: tuple) -> str:
+    """
+    Hash the values of a row, so it can be compared with a previously scraped version.
+
+    Parameters
+    ----------
+    values : tuple
+        Values of the row (excluding "Scraped_At" and "Content_Hash").
+
+    Returns
+    -------
+    str
+        Hex digest of the values.
+    """
+    return hashlib.sha256(json.dumps(list(values), default=str).encode()).hexdigest()
+
+
+def find_stale(c: sqlite3.Cursor, table: str, key_column: str, keys: list, max_age_days: float) -> list:
+    """
+    Find which keys are not in a table yet or were last scraped too long ago.
+
+    Parameters
+    ----------
+    c : sqlite3.Cursor
+        Cursor of the database.
+
+    table : str
+        Name of the table (must have the "Scraped_At" column).
+
+    key_column : str
+        Name of the primary key column.
+
+    keys : list
+        Keys that should be in the table.
+
+    max_age_days : float
+        Rows scraped longer ago than this are stale.
+
+    Returns
+    -------
+    list
+        Keys to (re-)scrape, same order as given.
+    """
+    c.execute(f"""SELECT {key_column}, Scraped_At FROM {table}""")
+    scraped_at = {key: time for key, time in c.fetchall()}
+
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=max_age_days)).isoformat(timespec="seconds")
+    # rows made before the tracking columns were added have no time, so count as stale.
+    return [key for key in keys if key not in scraped_at or (scraped_at[key] or "") < cutoff]
+
+
+def upsert_rows(c: sqlite3.Cursor, table: str, columns: list, rows: list) -> dict:
+    """
+    Insert new rows and update changed rows of a table. The first column must be the primary key.
+    "Scraped_At" is updated for every row given, even if its values have not changed.
+
+    Parameters
+    ----------
+    c : sqlite3.Cursor
+        Cursor of the database.
+
+    table : str
+        Name of the table (must have the "Scraped_At" and "Content_Hash" columns).
+
+    columns : list
+        Column names of the values in each row (excluding "Scraped_At" and "Content_Hash").
+
+    rows : list
+        Each list item is a tuple of the values for one row.
+
+    Returns
+    -------
+    dict
+        Keys are "new", "changed" and "unchanged", values are lists of the primary keys of each.
+    """
+    key_column = columns[0]
+    c.execute(f"""SELECT {key_column}, Content_Hash FROM {table}""")
+    existing_hashes = {key: content_hash for key, content_hash in c.fetchall()}
+
+    scraped_at = utc_now()
+    report = {"new": [], "changed": [], "unchanged": []}
+    to_write = []
+    for row in rows:
+        content_hash = row_hash(row)
+        key = row[0]
+        if key not in existing_hashes:
+            report["new"].append(key)
+        elif existing_hashes[key] != content_hash:
+            report["changed"].append(key)
+        else:
+            report["unchanged"].append(key)
+        to_write.append(tuple(row) + (scraped_at, content_hash))
+
+    write_rows(c, table, columns=list(columns) + ["Scraped_At", "Content_Hash"], rows=to_write,
+               key_column=key_column)
+
+    return report
+
+
+def print_report(table: str, report: dict, removed: list = None):
+    """
+    Print a summary of what changed in a table.
+
+    Parameters
+    ----------
+    table : str
+        Name of the table.
+
+    report : dict
+        Output of upsert_rows.
+
+    removed : list
+        Keys no longer found (not deleted from the table, only reported).
+    """
+    print(f"Table {table}: {len(report['new'])} new, {len(report['changed'])} changed, "
+          f"{len(report['unchanged'])} unchanged.")
+    for label in ["new", "changed"]:
+        if report[label]:
+            print(f"  {label}: {', '.join(map(str, report[label]))}")
+    if removed:
+        print(f"  no longer found (kept in the table): {', '.join(map(str, removed))}")
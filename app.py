@@ -2,9 +2,13 @@
 Main Dash application.
 To run locally simply do "python app.py" and visit: http://127.0.0.1:8050/ in your web browser.
 """
+import os
 import json
 import sqlite3
-from typing import Tuple
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Union
 import pandas as pd
 import numpy as np
 
@@ -14,6 +18,7 @@ from dash import html
 from dash import dcc
 
 import dash_bootstrap_components as dbc
+from flask import request, jsonify
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 
@@ -37,6 +42,23 @@ banner_color = {"background-color": "#DEDEDE"}
 content_style = {"margin-left": "2rem",
                  "margin-right": "2rem", "margin-top": "0.5rem"}
 
+# Scatter graph level of detail (see: gen_scatter_plot)
+# draw with WebGL instead of SVG above this many plants.
+SCATTERGL_MIN_POINTS = 1000
+# above this many plants in view, plants are aggregated into bins (LOD_BINS x LOD_BINS).
+LOD_MAX_POINTS = 5000
+LOD_BINS = 64
+
+# most search results the JSON API returns for one request (see: api_search).
+API_MAX_SEARCH_LIMIT = 100
+
+# width each card image takes up on the screen (matches the column sizes of the cards),
+# lets the browser pick the smallest image variant needed.
+card_image_sizes = "(min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw"
+
+# shown in a card before its image is loaded if no placeholder is available (1x1 transparent gif).
+blank_image = "data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7"
+
 # horizontal rule styles.
 hr_styles = {"v1": {"border": "2px lightgray solid"}, "v2": {
     "border": "1px lightgray solid"}, "v3": {"border": "0.5px lightgray solid"}}
@@ -120,12 +142,20 @@ heights_spreads_text_block = """Plants separated by possible heights and spreads
     relevant for a houseplant...
 """
 
+custom_axes_text_block = """Choose any two of the features used to make the recommendations as the axes.
+As with the sunlight and watering graph, the points are "jittered" so that plants with the same values
+do not all sit on top of one another.
+"""
+
 tsne_all_text_block = """To seperate each plant below, 16 features were fed into a dimensionality reduction
 method called t-SNE. This allowed me to convert some (not all) of the differences contained within those
 16 features of each plant into just 2 dimensions, which is used to make the below plot. The simple idea of this plot being then that the closer
 together two plants are on the scatter plot below, the more similar they are.
 """
 
+selection_help_text = """Use the "Box Select" or "Lasso Select" tools (top right of the graph)
+to select a group of plants and see a summary of them here."""
+
 most_sim_diff_button_text = """Scroll down to see the 3 most similar and different plants for your selection!"""
 
 ##################### FAQs page text #################
@@ -238,7 +268,9 @@ empty_card_boxes = [
 
 
 ################## load in data ##################
-DATABASE_LOC = r"Database\house_plants.db"
+# another database can be used with the environment variable HOUSE_PLANTS_DB,
+# e.g. a large synthetic catalog (see: Database/generate_synthetic_catalog.py).
+DATABASE_LOC = os.environ.get("HOUSE_PLANTS_DB", "Database/house_plants.db")
 
 # setup connection
 conn = sqlite3.connect(DATABASE_LOC)
@@ -248,46 +280,98 @@ c = conn.cursor()
 plant_df = pd.read_sql_query("SELECT * FROM plant_raw_data", conn)
 # For the scatter plots
 plotting_df = pd.read_sql_query("SELECT * FROM plotting", conn)
+# features of each plant, for scatter plots with user chosen axes.
+features_df = pd.read_sql_query("SELECT * FROM plant_features", conn)
 # plant images paths.
 image_df = pd.read_sql_query("SELECT * FROM plant_images", conn)
 # cosine_similarity matrix.
-c.execute("SELECT * FROM cosine_sim")
-raw_cosine_sim = c.fetchall()
-cosine_sim = np.asarray(json.loads(raw_cosine_sim[0][1]))
+# catalogs too large for the full matrix have no cosine_sim table, each row is worked out when needed instead.
+c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='cosine_sim'")
+if c.fetchone() is not None:
+    c.execute("SELECT * FROM cosine_sim")
+    raw_cosine_sim = c.fetchall()
+    cosine_sim = np.asarray(json.loads(raw_cosine_sim[0][1]))
+else:
+    cosine_sim = utils.CosineRows(features_df.drop(columns="Plant_Name").to_numpy())
+
+# sprite atlas of plant thumbnails (one image per page), for the scatter graph's hover previews.
+# only available once Database/generate_sprite_atlas.py has been run.
+c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sprite_atlas'")
+if c.fetchone() is not None:
+    c.execute("SELECT File_Path, Tile_Size FROM sprite_atlas ORDER BY rowid")
+    atlas_rows = c.fetchall()
+    sprite_atlas = {"pages": [row[0] for row in atlas_rows], "tile_size": atlas_rows[0][1]}
+else:
+    sprite_atlas = None
+
+# precomputed most similar/different plants for each scatter graph.
+# only available once Database/generate_sim_diff_table.py has been run, and only used if the
+# plotting table has not changed since (otherwise the results are worked out on each click).
+c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='sim_diff_source'")
+if c.fetchone() is not None:
+    c.execute("SELECT Plotting_Fingerprint FROM sim_diff_source")
+    sim_diff_up_to_date = c.fetchone() == (utils.plotting_fingerprint(plotting_df),)
+else:
+    sim_diff_up_to_date = False
+if sim_diff_up_to_date:
+    c.execute("SELECT * FROM sim_diff_lookup")
+    sim_diff_lookup = {
+        (row[0], row[1]): [name for name in row[2:5] if name is not None] +
+        [name for name in row[5:8] if name is not None]
+        for row in c.fetchall()
+    }
+else:
+    sim_diff_lookup = {}
 
 # Finally...
 c.close()
+conn.close()
 
 
 ################## data preprocessing ##################
 
+def make_search_options(plant_df: pd.DataFrame) -> list:
+    """
+    Options of the search dropdown, in alphabetical order.
+    Allows a user to search both the latin and common names.
+    """
+    common_names = list(plant_df["Common_Names"])
+    common_names_fixed = [names.replace(",", ", ") for names in common_names]
+
+    # taking only first 5 common names as otherwise too many and lines overlap...
+    common_names_show = []
+    for names in common_names_fixed:
+        first_few_names = names.split(",")[0:3]
+        common_names_show.append(",".join(first_few_names))
+
+    # Create a dict of latin names and selected common_names.
+    intermed_dict = {}
+    for latin_name, common_names in zip(list(plant_df["Plant_Name"]), common_names_show):
+        intermed_dict.update({latin_name: common_names})
+
+    #  dict in alphabetical order.
+    sorted_dict = {key: value for key, value in sorted(intermed_dict.items())}
+
+    # format for dash
+    plant_search_options = []
+    for latin_name, plant_common_names in sorted_dict.items():
+        plant_search_options.append(
+            {"label": str(latin_name + ", Commonly known as: " + plant_common_names),
+             "value": latin_name}
+        )
+    return plant_search_options
+
+
 # for the search dropdown callback.
-# Allows a user to search both the latin and common names.
-common_names = list(plant_df["Common_Names"])
-common_names_fixed = [names.replace(",", ", ") for names in common_names]
-
-# taking only first 5 common names as otherwise too many and lines overlap...
-common_names_show = []
-for names in common_names_fixed:
-    first_few_names = names.split(",")[0:3]
-    common_names_show.append(",".join(first_few_names))
-
-# Create a dict of latin names and selected common_names.
-intermed_dict = {}
-for latin_name, common_names in zip(list(plant_df["Plant_Name"]), common_names_show):
-    intermed_dict.update({latin_name: common_names})
-
-#  dict in alphabetical order.
-sorted_dict = {key: value for key, value in sorted(intermed_dict.items())}
-sorted_dict
-
-# format for dash
-plant_search_options = []
-for latin_name, plant_common_names in sorted_dict.items():
-    plant_search_options.append(
-        {"label": str(latin_name + ", Commonly known as: " + plant_common_names),
-         "value": latin_name}
-    )
+plant_search_options = make_search_options(plant_df)
+
+
+# plant_features columns that can be chosen as the scatter graph axes.
+feature_axis_options = [{"label": column.replace("_", " "), "value": column}
+                        for column in features_df.columns if column != "Plant_Name"]
+
+# integer codes of the plant details, for summarising scatter graph selections.
+feature_codes = utils.build_feature_codes(plant_df=plant_df, plotting_df=plotting_df)
 
 
 ################## App layout ##################
@@ -461,12 +545,37 @@ comparisons_page = [
                              "value": "heights_spreads"},
                             {"label": "Seperate by everything!",
                              "value": "tsne_all", },
+                            {"label": "Choose your own axes",
+                             "value": "custom", },
                         ],
                         value="sunlight_water", id="graph_radio_buttons", inline=True,
                         className="text-center"
                     ),
+                    dbc.Row([
+                        dbc.Col(dcc.Dropdown(
+                            id="custom-x-axis", options=feature_axis_options,
+                            value="Watering_Ordinal", clearable=False), width=6),
+                        dbc.Col(dcc.Dropdown(
+                            id="custom-y-axis", options=feature_axis_options,
+                            value="Min_Temp_Degrees_C", clearable=False), width=6),
+                    ], id="custom-axes-row", style={"display": "none"}),
                     html.P(id="scatter-info-block", children=[]),
-                    dcc.Graph(id="scatter-graph", figure={}),
+                    dcc.Graph(id="scatter-graph", figure={}, clear_on_unhover=True),
+                    dcc.Tooltip(id="scatter-tooltip", children=[
+                        html.Div(id="scatter-hover-image"),
+                        html.P(id="scatter-hover-name", className="text-center mb-0"),
+                    ]),
+                    dcc.Store(id="sprite-atlas-store", data=sprite_atlas),
+                    html.Hr(style=hr_styles["v3"]),
+                    html.H5("Selection Summary", className="text-center"),
+                    html.Div(id="selection-summary", children=[html.P(selection_help_text)]),
+                    dbc.Row([
+                        dbc.Button("Previous", id="selection-prev", color="info",
+                                   className="me-1", n_clicks=0),
+                        dbc.Button("Next", id="selection-next", color="info",
+                                   className="me-1", n_clicks=0),
+                    ], justify="center"),
+                    dcc.Store(id="selection-page", data=1),
                 ]),
             ]),
         ], xs=12, sm=12, md=12, lg=7, xl=7, className="mb-2"),
@@ -594,6 +703,148 @@ faqs_page = [
 ]
 
 
+################## Helper functions ##################
+
+def make_card_image(plant_details: dict) -> html.Picture:
+    """
+    Image for a plant card. If resized WebP/AVIF copies of the image exist
+    (see: Database/generate_image_variants.py) the browser can pick the smallest suitable one,
+    otherwise the original image is used.
+
+    The image is lazy loaded: the real image sources are stored in "data-" attributes
+    and swapped in by assets/lazy_images.js once the card is close to being scrolled into view.
+    Until then a tiny blurred placeholder (inlined in the page) is shown instead.
+    """
+    sources = []
+    if plant_details["avif_srcset"]:
+        sources.append(html.Source(type="image/avif", sizes=card_image_sizes,
+                                   **{"data-srcset": plant_details["avif_srcset"]}))
+    if plant_details["webp_srcset"]:
+        sources.append(html.Source(type="image/webp", sizes=card_image_sizes,
+                                   **{"data-srcset": plant_details["webp_srcset"]}))
+
+    return html.Picture(sources + [
+        html.Img(src=plant_details["placeholder"] or blank_image,
+                 className="card-img lazy-card-img", style={"width": "100%"},
+                 **{"data-src": plant_details["image_path"]})
+    ])
+
+
+def resolve_axes_choice(axes_choice: str, x_feature: str, y_feature: str) -> str:
+    """The axes choice to use, combining the radio buttons and the custom axes dropdowns."""
+    if axes_choice == "custom":
+        return utils.custom_axes_choice(x_column=x_feature, y_column=y_feature)
+    return axes_choice
+
+
+def relayout_axis_range(relayoutData: dict, axis: str) -> Union[None, list]:
+    """
+    [min, max] of an axis ("xaxis" or "yaxis") after the scatter graph was zoomed or panned,
+    None if the axis range did not change (e.g. only the other axis was zoomed).
+    """
+    if f"{axis}.range[0]" in relayoutData and f"{axis}.range[1]" in relayoutData:
+        return [relayoutData[f"{axis}.range[0]"], relayoutData[f"{axis}.range[1]"]]
+    if f"{axis}.range" in relayoutData:
+        return list(relayoutData[f"{axis}.range"])
+    return None
+
+
+def get_atlas_offsets(point_idxs: np.ndarray) -> Union[None, np.ndarray]:
+    """
+    Page and position of each plant's thumbnail in the sprite atlas (see: Database/generate_sprite_atlas.py),
+    for the plotting_df rows given. None if the atlas cannot be used for these plants: the plotting
+    table is remade without the atlas columns by Database/embeddings.py and plants added by
+    Database/place_new_plants.py have no position until the atlas is remade.
+    """
+    atlas_columns = ["Atlas_Page", "Atlas_X", "Atlas_Y"]
+    if sprite_atlas is None or not set(atlas_columns) <= set(plotting_df.columns):
+        return None
+    offsets = plotting_df[atlas_columns].values[point_idxs]
+    if pd.isna(offsets).any() or (offsets[:, 0] >= len(sprite_atlas["pages"])).any():
+        return None
+    return offsets.astype(int)
+
+
+def find_sim_diff_names(plant_name: str, axes_choice: str) -> list:
+    """
+    Names of the 3 most similar and 3 most different plants on a scatter graph.
+    Uses the precomputed results if available, otherwise they are calculated.
+    """
+    sim_diff_names = sim_diff_lookup.get((plant_name, axes_choice))
+    if sim_diff_names is None:
+        sim_diff_names = utils.get_sim_opp_plant_names(
+            selected_plant=plant_name, plotting_df=plotting_df, axes_choice=axes_choice,
+            features_df=features_df)
+    return sim_diff_names
+
+
+# Image variants have the hash of their content in the file name, so they never change.
+@app.server.after_request
+def set_asset_cache_headers(response):
+    """Let browsers cache the image variants forever."""
+    if request.path.startswith("/assets/variants/") and response.status_code == 200:
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+################## Speculative precompute ##################
+# Opt-in (set the environment variable SPECULATIVE_PRECOMPUTE=1).
+# Once the search dropdown is narrowed down to a few plants, the cards each of those plants
+# would produce if selected are built in background threads. So by the time the user has
+# selected a plant, "give_recommendations" and "make_plant_card" usually find their answer cached.
+
+SPECULATIVE_PRECOMPUTE = os.environ.get("SPECULATIVE_PRECOMPUTE", "0") == "1"
+# only speculate when the search has narrowed down to this many plants or fewer.
+SPECULATIVE_MAX_CANDIDATES = 3
+# max number of background threads building cards at once.
+SPECULATIVE_MAX_WORKERS = 2
+
+speculative_executor = ThreadPoolExecutor(
+    max_workers=SPECULATIVE_MAX_WORKERS, thread_name_prefix="speculative")
+speculative_futures = {}
+speculative_lock = threading.Lock()
+
+
+def _speculative_selection(current_value: Union[None, str, list], candidate: str) -> tuple:
+    """What the dropdown value would become if the user selected the candidate plant."""
+    if not current_value:
+        selection = []
+    elif isinstance(current_value, str):
+        selection = [current_value]
+    else:
+        selection = list(current_value)
+
+    if candidate not in selection:
+        selection.append(candidate)
+    return tuple(selection)
+
+
+def _warm_caches(selection: tuple):
+    """Build (and so cache) the cards for a possible selection."""
+    build_recommendation_cards(selection)
+    build_plant_cards(selection[-1])
+
+
+def speculate_recommendations(candidates: list, current_value: Union[None, str, list]):
+    """
+    Queue building the cards for each candidate plant in the background.
+    Queued work for plants no longer among the candidates is cancelled
+    (work already running is left to finish, the result is still cached).
+    """
+    selections = {_speculative_selection(current_value, candidate) for candidate in candidates}
+
+    with speculative_lock:
+        for selection, future in list(speculative_futures.items()):
+            if future.done() or selection not in selections:
+                future.cancel()
+                del speculative_futures[selection]
+
+        for selection in selections:
+            if selection not in speculative_futures:
+                speculative_futures[selection] = speculative_executor.submit(
+                    _warm_caches, selection)
+
+
 ##################  Callbacks ##################
 
 
@@ -636,7 +887,15 @@ def dynamic_dropdown_options(search_value, value):
         raise PreventUpdate
     # Make sure that the set values are in the option list, else they will disappear
     # from the shown select list, but still part of the `value`.
-    return [o for o in plant_search_options if search_value.upper() in o["label"].upper() or o["value"] in (value or [])]
+    options = [o for o in plant_search_options if search_value.upper()
+               in o["label"].upper() or o["value"] in (value or [])]
+
+    if SPECULATIVE_PRECOMPUTE:
+        candidates = [o["value"] for o in options if o["value"] not in (value or [])]
+        if 0 < len(candidates) <= SPECULATIVE_MAX_CANDIDATES:
+            speculate_recommendations(candidates=candidates, current_value=value)
+
+    return options
 
 
 # help popup modal - modulate open vs closed status.
@@ -667,6 +926,15 @@ def make_plant_card(plant_selection: Tuple[str, list]):
     else:
         plant_name = str(plant_selection[-1])
 
+    return build_plant_cards(plant_name)
+
+
+@functools.lru_cache(maxsize=512)
+def build_plant_cards(plant_name: str) -> Tuple[list, list]:
+    """
+    Content of the two cards for the last selected plant (image card and details card).
+    Cached, so repeat (and speculative, see below) requests for the same plant are instant.
+    """
     plant_details = utils.get_plant_details(
         plant_name=plant_name, plant_df=plant_df, image_df=image_df)
 
@@ -674,7 +942,7 @@ def make_plant_card(plant_selection: Tuple[str, list]):
         dbc.Button(f"Last Selected Plant: {plant_name}",
                    color="success", className="me-1"),
         html.Br(),
-        dbc.CardImg(src=plant_details['image_path']),
+        make_card_image(plant_details),
 
         dbc.CardBody([
             html.P(f"Image obtained from: {plant_details['image_source']}",
@@ -731,9 +999,21 @@ def give_recommendations(plant_selection):
     Uses the cosine similarity matrix and user selected plants to
     find top 6 plants to recommend.
     """
+    if isinstance(plant_selection, str):
+        return build_recommendation_cards(plant_selection)
+    return build_recommendation_cards(tuple(plant_selection))
+
+
+@functools.lru_cache(maxsize=512)
+def build_recommendation_cards(plant_selection: Union[str, tuple]) -> list:
+    """
+    Content of the 6 recommendation cards for the plant(s) selected.
+    Cached, so repeat (and speculative, see below) requests for the same selection are instant.
+    """
     top_plants = utils.recommend_plants(
         plant_df=plant_df,
-        plants_selected=plant_selection,
+        plants_selected=plant_selection if isinstance(
+            plant_selection, str) else list(plant_selection),
         cosine_sim=cosine_sim)
 
     all_plant_details = []
@@ -752,7 +1032,7 @@ def give_recommendations(plant_selection):
             dbc.Card([
                 dbc.Button(
                     f"Number {(idx + 1)}: {top_plants[idx]}", color="success", className="card-title text-center"),
-                dbc.CardImg(src=plant_details['image_path']),
+                make_card_image(plant_details),
 
                 dbc.CardBody([
                     html.P(f"Image obtained from: {plant_details['image_source']}",
@@ -800,15 +1080,34 @@ def give_recommendations(plant_selection):
     [Output("scatter-graph", "figure"),
      Output("scatter-info-block", "children"),
      ],
-    Input("graph_radio_buttons", "value"),
+    [Input("graph_radio_buttons", "value"),
+     Input("custom-x-axis", "value"),
+     Input("custom-y-axis", "value"),
+     Input("scatter-graph", "relayoutData")],
 )
-def gen_scatter_plot(axes_choice):
+def gen_scatter_plot(axes_choice, x_feature, y_feature, relayoutData):
     """
     Choose the axes to show for the scatter plot based on user input.
+
+    For large numbers of plants, the graph is drawn with WebGL and only the plants in view are
+    sent to the browser, aggregated into bins if there are too many (see: utils.level_of_detail).
+    Zooming in then redraws the graph with more detail.
     """
+    x_range, y_range = None, None
+    triggered = [trigger["prop_id"] for trigger in dash.callback_context.triggered]
+    if axes_choice != "custom" and set(triggered) <= {"custom-x-axis.value", "custom-y-axis.value"}:
+        raise PreventUpdate  # custom axes not in use.
+    if triggered == ["scatter-graph.relayoutData"]:
+        # every plant is always drawn for small catalogs, so nothing to redraw.
+        if len(plotting_df) <= LOD_MAX_POINTS or not relayoutData:
+            raise PreventUpdate
+        x_range = relayout_axis_range(relayoutData, "xaxis")
+        y_range = relayout_axis_range(relayoutData, "yaxis")
+        autoranged = "xaxis.autorange" in relayoutData or "yaxis.autorange" in relayoutData
+        if x_range is None and y_range is None and not autoranged:
+            raise PreventUpdate  # e.g. graph resized, view unchanged.
+
     if axes_choice == "tsne_all":
-        x = plotting_df["all_tsne_1"]
-        y = plotting_df["all_tsne_2"]
         axis_titles = ["tSNE 1", "tSNE 2"]
         annotations = []
         axis_params = {"x": dict(showticklabels=True),
@@ -817,8 +1116,6 @@ def gen_scatter_plot(axes_choice):
         info_block = tsne_all_text_block
 
     elif axes_choice == "sunlight_water":
-        x = plotting_df["Watering_jittered"]
-        y = plotting_df["Sunlight_jittered"]
         axis_titles = ["", ""]
         axis_params = {"x": dict(showticklabels=False),
                        "y": dict(showticklabels=False)}
@@ -851,8 +1148,6 @@ def gen_scatter_plot(axes_choice):
         info_block = sunlight_water_text_block
 
     else:
-        x = plotting_df["Max_Spread_Capped_jittered"]
-        y = plotting_df["Max_Height_Capped_jittered"]
         axis_titles = ["Max Spread (feet)", "Max Height (feet)"]
         annotations = []
         axis_params = {"x": dict(showticklabels=True),
@@ -860,13 +1155,43 @@ def gen_scatter_plot(axes_choice):
 
         info_block = heights_spreads_text_block
 
+    # user chosen axes (any two plant_features columns).
+    if axes_choice == "custom":
+        axis_titles = [x_feature.replace("_", " "), y_feature.replace("_", " ")]
+        info_block = custom_axes_text_block
+    axes_choice = resolve_axes_choice(axes_choice, x_feature, y_feature)
+
     # Now make the figure object.
-    fig = go.Figure(data=go.Scatter(
-        x=x, y=y, mode="markers",
-        text=plotting_df["Plant_Name"],
+    scatter_index = utils.get_scatter_index(
+        plotting_df=plotting_df, axes_choice=axes_choice, features_df=features_df)
+    # only one axis was zoomed (or reset), use the whole of the other axis (all that can be in view).
+    if x_range is None and y_range is not None:
+        x_range = [scatter_index.coords[:, 0].min(), scatter_index.coords[:, 0].max()]
+    elif y_range is None and x_range is not None:
+        y_range = [scatter_index.coords[:, 1].min(), scatter_index.coords[:, 1].max()]
+    point_idxs, bins = utils.level_of_detail(
+        scatter_index=scatter_index, x_range=x_range, y_range=y_range,
+        max_points=LOD_MAX_POINTS, n_bins=LOD_BINS)
+
+    # WebGL is much faster once there are a lot of points, SVG looks a bit nicer otherwise.
+    scatter_type = go.Scattergl if len(plotting_df) > SCATTERGL_MIN_POINTS else go.Scatter
+    maintenance = plotting_df["Maintenance_Ordinal"].values
+
+    # first item is the plotting_df row, used to find the plant selected.
+    customdata = point_idxs[:, None]
+    atlas_offsets = get_atlas_offsets(point_idxs)
+    if atlas_offsets is not None:
+        customdata = np.column_stack([point_idxs, atlas_offsets])
+
+    fig = go.Figure(data=scatter_type(
+        x=scatter_index.coords[point_idxs, 0], y=scatter_index.coords[point_idxs, 1],
+        mode="markers",
+        text=scatter_index.names[point_idxs],
+        customdata=customdata,
         marker=dict(
             size=10,
-            color=plotting_df["Maintenance_Ordinal"],
+            color=maintenance[point_idxs],
+            cmin=1, cmax=3,
             colorscale='Viridis',
             showscale=True,
             colorbar=dict(
@@ -875,9 +1200,31 @@ def gen_scatter_plot(axes_choice):
         )
     ))
 
-    fig.update_traces(
-        hovertemplate="<b>%{text} </b><extra></extra>",
-    )
+    if atlas_offsets is not None:
+        # thumbnail shown by the "scatter-tooltip" instead of the default hover label.
+        fig.update_traces(hoverinfo="none", hovertemplate=None)
+    else:
+        fig.update_traces(hovertemplate="<b>%{text} </b><extra></extra>")
+
+    if bins:
+        # aggregated plants, bigger markers for more plants, colored by the average maintenance.
+        fig.add_trace(scatter_type(
+            x=bins["x"], y=bins["y"], mode="markers",
+            text=[f"{count} plants, zoom in to see them" for count in bins["count"]],
+            hovertemplate="<b>%{text}</b><extra></extra>",
+            showlegend=False,
+            marker=dict(
+                size=np.clip(4 * np.sqrt(bins["count"]), 6, 40),
+                color=[maintenance[row_idxs].mean() for row_idxs in bins["row_idxs"]],
+                cmin=1, cmax=3, colorscale='Viridis', opacity=0.7,
+            ),
+        ))
+
+    # keeps the user's zoom when the graph is redrawn with more/less detail.
+    fig.update_layout(uirevision=axes_choice, showlegend=False)
+    if x_range is not None:
+        fig.update_xaxes(range=x_range)
+        fig.update_yaxes(range=y_range)
 
     fig.update_layout(
         xaxis_title=axis_titles[0], yaxis_title=axis_titles[1],
@@ -894,9 +1241,118 @@ def gen_scatter_plot(axes_choice):
             title_text="tSNE 1",
             title_standoff=25)
 
+    if x_range is not None:
+        return fig, dash.no_update
     return fig, info_block
 
 
+# Only show the custom axes dropdowns when they are in use.
+@app.callback(
+    Output("custom-axes-row", "style"),
+    Input("graph_radio_buttons", "value"),
+)
+def toggle_custom_axes(axes_choice):
+    if axes_choice == "custom":
+        return {"display": "flex"}
+    return {"display": "none"}
+
+
+# Hover preview for the scatter graph, runs in the browser so no request is made per hover.
+# Each thumbnail is a section of one of the sprite atlas pages (customdata: row, page, x, y).
+app.clientside_callback(
+    """
+    function(hoverData, atlas) {
+        if (!hoverData || !atlas) {
+            const no_update = window.dash_clientside.no_update;
+            return [false, no_update, no_update, no_update];
+        }
+        const point = hoverData.points[0];
+        // aggregated bins (see: gen_scatter_plot) have no thumbnail.
+        if (!point.customdata || point.customdata.length < 4) {
+            const no_update = window.dash_clientside.no_update;
+            return [false, no_update, no_update, no_update];
+        }
+        const style = {
+            width: atlas.tile_size + "px",
+            height: atlas.tile_size + "px",
+            margin: "0 auto",
+            backgroundImage: "url(" + atlas.pages[point.customdata[1]] + ")",
+            backgroundPosition: (-point.customdata[2]) + "px " + (-point.customdata[3]) + "px",
+        };
+        return [true, point.bbox, style, point.text];
+    }
+    """,
+    [Output("scatter-tooltip", "show"),
+     Output("scatter-tooltip", "bbox"),
+     Output("scatter-hover-image", "style"),
+     Output("scatter-hover-name", "children")],
+    Input("scatter-graph", "hoverData"),
+    State("sprite-atlas-store", "data"),
+)
+
+
+# Summary of the plants selected with the box/lasso select tools.
+@app.callback(
+    [Output("selection-summary", "children"),
+     Output("selection-page", "data")],
+    [Input("scatter-graph", "selectedData"),
+     Input("selection-prev", "n_clicks"),
+     Input("selection-next", "n_clicks")],
+    [State("graph_radio_buttons", "value"),
+     State("custom-x-axis", "value"),
+     State("custom-y-axis", "value"),
+     State("selection-page", "data")],
+)
+def summarise_scatter_selection(selectedData, prev_clicks, next_clicks, axes_choice,
+                                x_feature, y_feature, page):
+    """
+    Summarise the plants selected on the scatter graph.
+    Selected plants are found with the scatter graph's spatial index from the selected region.
+    """
+    if not selectedData:
+        return [html.P(selection_help_text)], 1
+
+    triggered = dash.callback_context.triggered[0]["prop_id"]
+    if triggered == "selection-prev.n_clicks":
+        page = page - 1
+    elif triggered == "selection-next.n_clicks":
+        page = page + 1
+    else:  # new selection.
+        page = 1
+
+    scatter_index = utils.get_scatter_index(
+        plotting_df=plotting_df, axes_choice=resolve_axes_choice(axes_choice, x_feature, y_feature),
+        features_df=features_df)
+    if "range" in selectedData:
+        selected_idxs = scatter_index.within_box(
+            x_range=selectedData["range"]["x"], y_range=selectedData["range"]["y"])
+    elif "lassoPoints" in selectedData:
+        selected_idxs = scatter_index.within_polygon(
+            xs=selectedData["lassoPoints"]["x"], ys=selectedData["lassoPoints"]["y"])
+    else:  # e.g. points selected by clicking.
+        selected_idxs = np.array(sorted({point["customdata"][0]
+                                         for point in selectedData.get("points", [])
+                                         if "customdata" in point}), dtype=int)
+
+    summary = utils.summarise_selection(
+        selected_idxs=selected_idxs, names=scatter_index.names,
+        feature_codes=feature_codes, page=page)
+
+    summary_content = [
+        html.P(html.B(f"Number of plants selected: {summary['count']}")),
+        dbc.ListGroup([
+            dbc.ListGroupItem(f"{label}: " + ", ".join(
+                f"{category} ({count})" for category, count in breakdown.items()))
+            for label, breakdown in summary["breakdowns"].items()
+        ], className="card-text", flush=True),
+        html.Br(),
+        html.Ul([html.Li(plant_name) for plant_name in summary["plants"]]),
+        html.P(f"Page {summary['page']} of {summary['n_pages']}", className="text-center"),
+    ]
+
+    return summary_content, summary["page"]
+
+
 # Update Info cards generated for the scatter graph selection.
 @ app.callback(
     [Output("scatter-info-card", "children"),
@@ -907,11 +1363,19 @@ def gen_scatter_plot(axes_choice):
      Output("most_diff_card_2", "children"),
      Output("most_diff_card_3", "children")],
     [Input("scatter-graph", "clickData"),
-     Input("graph_radio_buttons", "value")],
+     Input("graph_radio_buttons", "value"),
+     Input("custom-x-axis", "value"),
+     Input("custom-y-axis", "value")],
     prevent_initial_call=True  # because I am reliant on a user click.
 )
-def make_scatter_cards(clickData, axes_choice):
+def make_scatter_cards(clickData, axes_choice, x_feature, y_feature):
     """Update card when user clicks on the scatter graph"""
+    axes_choice = resolve_axes_choice(axes_choice, x_feature, y_feature)
+
+    # clicking an aggregated bin of plants (see: gen_scatter_plot) does nothing.
+    if clickData is not None and "customdata" not in clickData["points"][0]:
+        raise PreventUpdate
+
     if clickData is not None:
         plant_name = clickData["points"][0]["text"]
 
@@ -923,7 +1387,7 @@ def make_scatter_cards(clickData, axes_choice):
             dbc.Card([
                 dbc.Button(
                     f"Selected Plant: {plant_name}", color="success", className="card-title text-center"),
-                dbc.CardImg(src=plant_details['image_path']),
+                make_card_image(plant_details),
                 dbc.CardBody([
                     html.P(f"Image obtained from: {plant_details['image_source']}",
                            className="card-text text-right font-italic"),
@@ -962,10 +1426,8 @@ def make_scatter_cards(clickData, axes_choice):
 
         # Now build cards for suggested plants.
         # 1st 3 are most similar, next 3 are most different.
-        sim_diff_names = utils.get_sim_opp_plant_names(
-            selected_plant=plant_name,
-            plotting_df=plotting_df,
-            axes_choice=axes_choice)
+        sim_diff_names = find_sim_diff_names(
+            plant_name=plant_name, axes_choice=axes_choice)
 
         sim_diff_plant_details = []
         for plant_name in sim_diff_names:
@@ -987,7 +1449,7 @@ def make_scatter_cards(clickData, axes_choice):
                 dbc.Card([
                     dbc.Button(
                         f"Number {(rank + 1)}: {sim_diff_names[idx]}", color=button_color, className="card-title text-center"),
-                    dbc.CardImg(src=plant_details['image_path']),
+                    make_card_image(plant_details),
 
                     dbc.CardBody([
                         html.P(f"Image obtained from: {plant_details['image_source']}",
@@ -1033,6 +1495,143 @@ def make_scatter_cards(clickData, axes_choice):
             sim_diff_card_content[5])
 
 
+################## JSON API ##################
+# Lightweight endpoints for other clients (e.g. mobile app, partner shops) that want
+# recommendations without going through Dash's callbacks. Responses only contain plant names
+# (and details if asked for) rather than whole component trees.
+
+# Plant names that can be searched with, used to validate requests.
+valid_plant_names = set(plant_df["Plant_Name"])
+valid_axes_choices = {"tsne_all", "sunlight_water", "heights_spreads"}
+valid_feature_columns = {option["value"] for option in feature_axis_options}
+
+
+def _api_plant_names(params: dict) -> list:
+    """Get and validate the plant name(s) given to an API endpoint."""
+    plant_names = params.get("plant")
+    if isinstance(plant_names, str):
+        plant_names = [plant_names]
+    if not plant_names:
+        raise ValueError("At least one 'plant' must be given.")
+    # e.g. a JSON batch request can give any type, not only strings.
+    if not isinstance(plant_names, list) or not all(isinstance(name, str) for name in plant_names):
+        raise ValueError("'plant' must be a plant name or a list of plant names.")
+    # a plant given more than once is only used once (keeping the order given).
+    plant_names = list(dict.fromkeys(plant_names))
+
+    unknown = [name for name in plant_names if name not in valid_plant_names]
+    if unknown:
+        raise ValueError(f"Unknown plant(s): {', '.join(unknown)}")
+    return plant_names
+
+
+def api_recommend(params: dict) -> dict:
+    """Top 6 recommendations for one or more plants."""
+    plant_names = _api_plant_names(params)
+    top_plants = utils.recommend_plants(
+        plant_df=plant_df,
+        plants_selected=plant_names[0] if len(plant_names) == 1 else plant_names,
+        cosine_sim=cosine_sim)
+    return {"plants": plant_names, "recommendations": top_plants}
+
+
+def api_details(params: dict) -> dict:
+    """Plant details (as shown on the cards) for one or more plants."""
+    plant_names = _api_plant_names(params)
+    return {plant_name: utils.get_plant_details(
+        plant_name=plant_name, plant_df=plant_df, image_df=image_df)
+        for plant_name in plant_names}
+
+
+def api_similar(params: dict) -> dict:
+    """Three most similar and three most different plants on one of the scatter graphs."""
+    plant_names = _api_plant_names(params)
+    axes_choice = str(params.get("axes", "tsne_all"))
+    custom_columns = axes_choice.split(utils.CUSTOM_AXES_SEPARATOR)
+    is_custom = len(custom_columns) == 2 and set(custom_columns) <= valid_feature_columns
+    if axes_choice not in valid_axes_choices and not is_custom:
+        raise ValueError(f"'axes' must be one of: {', '.join(sorted(valid_axes_choices))} "
+                         f"or two plant_features columns separated by '{utils.CUSTOM_AXES_SEPARATOR}'")
+
+    sim_diff_names = find_sim_diff_names(plant_name=plant_names[0], axes_choice=axes_choice)
+    n_similar = len(sim_diff_names) // 2
+    return {"plant": plant_names[0], "axes": axes_choice,
+            "similar": sim_diff_names[:n_similar], "different": sim_diff_names[n_similar:]}
+
+
+def api_search(params: dict) -> dict:
+    """Case insensitive search of the latin and common names (same as the search dropdown)."""
+    query = str(params.get("q", "")).upper()
+    try:
+        limit = int(params.get("limit", 10))
+    except (TypeError, ValueError):
+        raise ValueError("'limit' must be an integer.")
+    if limit < 1:
+        raise ValueError("'limit' must be at least 1.")
+    limit = min(limit, API_MAX_SEARCH_LIMIT)
+
+    matches = [o["value"] for o in plant_search_options if query in o["label"].upper()]
+    return {"q": params.get("q", ""), "results": matches[:limit]}
+
+
+api_endpoints = {
+    "recommend": api_recommend,
+    "details": api_details,
+    "similar": api_similar,
+    "search": api_search,
+}
+
+
+def _query_params() -> dict:
+    """URL query parameters as a dict, "plant" can be given multiple times."""
+    params = request.args.to_dict()
+    if "plant" in request.args:
+        params["plant"] = request.args.getlist("plant")
+    return params
+
+
+@app.server.route("/api/<endpoint>", methods=["GET"])
+def api_single(endpoint):
+    """e.g. /api/recommend?plant=Aloe%20vera&plant=Ficus%20elastica"""
+    if endpoint == "batch":
+        return jsonify(error="/api/batch only accepts POST requests."), 405, {"Allow": "POST"}
+    if endpoint not in api_endpoints:
+        return jsonify(error=f"Unknown endpoint: {endpoint}"), 404
+    try:
+        return jsonify(api_endpoints[endpoint](_query_params()))
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+
+
+@app.server.route("/api/batch", methods=["POST"])
+def api_batch():
+    """
+    Run several requests in one go. Body must be a JSON list, e.g.:
+    [{"endpoint": "recommend", "plant": ["Aloe vera"]}, {"endpoint": "search", "q": "fig"}]
+    Results are returned in the same order, failed requests give an "error" instead
+    (without failing the rest of the batch).
+    """
+    batch = request.get_json(silent=True)
+    if not isinstance(batch, list):
+        return jsonify(error="Request body must be a JSON list of requests."), 400
+
+    results = []
+    for params in batch:
+        endpoint = params.get("endpoint") if isinstance(params, dict) else None
+        if not isinstance(endpoint, str) or endpoint not in api_endpoints:
+            results.append({"error": f"Unknown endpoint: {endpoint}"})
+            continue
+        try:
+            results.append(api_endpoints[endpoint](params))
+        except ValueError as error:
+            results.append({"error": str(error)})
+        except Exception:  # a bug for one request should not lose the results of the others.
+            app.server.logger.exception(f"API batch request failed: {params}")
+            results.append({"error": "Internal error."})
+
+    return jsonify(results)
+
+
 ################## End of app ##################
 if __name__ == "__main__":
     app.run_server(debug=False)
@@ -0,0 +1,74 @@
+/*
+Lazy loading for the plant card images (see: make_card_image in app.py).
+
+Each card image is first rendered with a tiny placeholder and the real image
+sources stored in "data-src"/"data-srcset". Dash's html.Img has no "loading" prop,
+so this script sets loading="lazy" and swaps the real sources in, letting the
+browser only fetch images that are close to being scrolled into view.
+Browsers without native lazy loading fall back to an IntersectionObserver.
+*/
+(function () {
+    var nativeLazy = "loading" in HTMLImageElement.prototype;
+
+    function loadImage(img) {
+        var picture = img.parentNode;
+        if (picture && picture.tagName === "PICTURE") {
+            picture.querySelectorAll("source[data-srcset]").forEach(function (source) {
+                source.srcset = source.getAttribute("data-srcset");
+            });
+        }
+        img.src = img.getAttribute("data-src");
+        img.setAttribute("data-loaded-src", img.getAttribute("data-src"));
+    }
+
+    var observer = null;
+    if (!nativeLazy && "IntersectionObserver" in window) {
+        observer = new IntersectionObserver(function (entries) {
+            entries.forEach(function (entry) {
+                if (entry.isIntersecting) {
+                    observer.unobserve(entry.target);
+                    loadImage(entry.target);
+                }
+            });
+        }, { rootMargin: "200px 0px" });
+    }
+
+    function prepareImage(img) {
+        // React reuses the same <img> when a card changes plant, so compare with the last loaded src.
+        if (img.getAttribute("data-loaded-src") === img.getAttribute("data-src")) {
+            return;
+        }
+        if (nativeLazy) {
+            img.loading = "lazy";
+            loadImage(img);
+        } else if (observer) {
+            observer.observe(img);
+        } else {
+            loadImage(img);
+        }
+    }
+
+    function scan(root) {
+        if (root.matches && root.matches("img.lazy-card-img[data-src]")) {
+            prepareImage(root);
+        } else if (root.querySelectorAll) {
+            root.querySelectorAll("img.lazy-card-img[data-src]").forEach(prepareImage);
+        }
+    }
+
+    new MutationObserver(function (mutations) {
+        mutations.forEach(function (mutation) {
+            if (mutation.type === "attributes") {
+                if (mutation.target.classList.contains("lazy-card-img")) {
+                    prepareImage(mutation.target);
+                }
+            } else {
+                mutation.addedNodes.forEach(scan);
+            }
+        });
+    }).observe(document.documentElement, {
+        childList: true, subtree: true, attributes: true, attributeFilter: ["data-src"]
+    });
+
+    scan(document);
+})();
@@ -4,7 +4,7 @@ Functions to support the main Dash application in app.py
 1. get_plant_details(plant_name, plant_df, image_df)
     Given a plant name, return details about the plant.
 
-2. get_sim_opp_plant_names(selected_plant, plotting_df, axes_choice)
+2. get_sim_opp_plant_names(selected_plant, plotting_df, axes_choice, features_df)
     Obtain the names of the three most similar and three most different plants.
 
 3. recommend_plants(plant_df, plants_selected, cosine_sim)
@@ -12,7 +12,36 @@ Functions to support the main Dash application in app.py
 
 4. _plant_recommend_scores(plant_df, plant_name, cosine_sim)
     Determine the recommendation scores for a single plant.
+
+5. ScatterIndex(names, x, y)
+    Spatial index over the points of a scatter graph, used by get_sim_opp_plant_names.
+
+6. build_feature_codes(plant_df, plotting_df)
+    Integer codes of the plant details used to summarise a scatter graph selection.
+
+7. summarise_selection(selected_idxs, names, feature_codes, page, page_size)
+    Summary statistics and a page of plant names for the plants selected on a scatter graph.
+
+8. get_scatter_index(plotting_df, axes_choice, features_df)
+    Return the (cached) ScatterIndex for one of the scatter graphs.
+
+9. level_of_detail(scatter_index, x_range, y_range, max_points, n_bins)
+    Decide which plants (or aggregated bins of plants) to draw for the part of a scatter graph in view.
+
+10. custom_axes_choice(x_column, y_column)
+    Axes choice for a scatter graph of any two plant_features columns.
+
+11. get_feature_axis(features_df, plotting_df, column)
+    Jittered values of a plant_features column, for user chosen scatter graph axes.
+
+12. CosineRows(feature_array)
+    Stands in for the cosine similarity matrix of catalogs too large to hold it in memory.
+
+13. plotting_fingerprint(plotting_df)
+    Hash of the plant names and scatter graph coordinates, to tell if tables made from them are out of date.
 """
+import hashlib
+import zlib
 from typing import Tuple, Union
 import numpy as np
 import pandas as pd
@@ -49,6 +78,15 @@ def get_plant_details(plant_name: str, plant_df: pd.DataFrame, image_df: pd.Data
     plant_details["image_source"] = filtered_image_df["Website"].values[0]
     plant_details["image_path"] = filtered_image_df["File_Path"].values[0]
 
+    # resized copies and placeholders, only present once
+    # Database/generate_image_variants.py and generate_image_placeholders.py have been run.
+    for column in ["Webp_Srcset", "Avif_Srcset", "Placeholder"]:
+        if column in filtered_image_df:
+            value = filtered_image_df[column].values[0]
+            plant_details[column.lower()] = value if isinstance(value, str) else ""
+        else:
+            plant_details[column.lower()] = ""
+
     common_names = filtered_plant_df["Common_Names"].values[0]
     plant_details["common_names"] = str(common_names).replace(",", ", ")
 
@@ -66,11 +104,17 @@ def get_plant_details(plant_name: str, plant_df: pd.DataFrame, image_df: pd.Data
     return plant_details
 
 
-def get_sim_opp_plant_names(selected_plant: str, plotting_df: pd.DataFrame, axes_choice: str) -> list:
+def get_sim_opp_plant_names(selected_plant: str, plotting_df: pd.DataFrame, axes_choice: str,
+                            features_df: pd.DataFrame = None) -> list:
     """
     Obtain the names of the three most similar and three most different plants
     according to the plant currently selected. As this works with the scatter graph
-    selection, the similarity is based on the proximty of the scatter points.
+    selection, the similarity is based on the proximty of the scatter points
+    (manhattan distance).
+
+    A spatial index for each scatter graph is built the first time it is needed
+    (see: ScatterIndex), so each call only looks at the points close to the selected plant
+    and a handful of candidates for the most different plants.
 
     Parameters
     ----------
@@ -82,52 +126,416 @@ def get_sim_opp_plant_names(selected_plant: str, plotting_df: pd.DataFrame, axes
 
     axes_choice: str
         What are the x and y axes currently in use by the scatter plot.
+        Either one of the keys of AXES_COLUMNS or any two plant_features columns
+        (see: custom_axes_choice).
+
+    features_df: pd.DataFrame
+        Contains the features of each plant (plant_features table), only needed for
+        axes choices made from two plant_features columns.
 
     Returns
     ----------
     list[str]
         6 Plant names, first 3 are most similar plants, last 3 are most different.
     """
+    scatter_index = get_scatter_index(
+        plotting_df=plotting_df, axes_choice=axes_choice, features_df=features_df)
+    target_index = scatter_index.name_to_index[selected_plant]
+
+    similar_names = scatter_index.names[scatter_index.nearest(target_index, k=3)]
+    different_names = scatter_index.names[scatter_index.farthest(target_index, k=3)]
+
+    return list(similar_names) + list(different_names)
+
+
+# x and y axis columns (from the "plotting" table) for each scatter graph.
+AXES_COLUMNS = {
+    "tsne_all": ("all_tsne_1", "all_tsne_2"),
+    "sunlight_water": ("Watering_jittered", "Sunlight_jittered"),
+    "heights_spreads": ("Max_Spread_Capped_jittered", "Max_Height_Capped_jittered"),
+}
+
+# separates the two plant_features column names of a user chosen axes choice.
+CUSTOM_AXES_SEPARATOR = "|"
+
+# Built spatial indexes, keys are the x and y columns and values are the
+# dataframe(s) used to build the index and the index itself.
+_scatter_indexes = {}
+
+# Jittered plant_features columns, keys are the column names and values are the
+# dataframes used and the values (in plotting_df row order).
+_feature_axes = {}
+
+
+def custom_axes_choice(x_column: str, y_column: str) -> str:
+    """Axes choice for a scatter graph of any two plant_features columns."""
+    return x_column + CUSTOM_AXES_SEPARATOR + y_column
+
+
+def get_feature_axis(features_df: pd.DataFrame, plotting_df: pd.DataFrame, column: str) -> np.ndarray:
+    """
+    Values of a plant_features column in plotting_df row order, ready to use as a scatter graph axis.
+    Made the first time a column is used and then cached.
+
+    Like the jittered columns in the plotting table, a small random amount is added
+    to each value so that plants with the same value don't sit on top of one another.
+    The random amounts are seeded by the column name, so are the same every time.
+    """
+    cached = _feature_axes.get(column)
+    if cached is None or cached[0] is not features_df or cached[1] is not plotting_df:
+        values = (features_df.set_index("Plant_Name")[column]
+                  .reindex(plotting_df["Plant_Name"]).to_numpy(dtype=float))
+
+        # jitter by up to 35% of the smallest gap between values (as done in Step 3 for the ordinals).
+        unique_values = np.unique(values[~np.isnan(values)])
+        gap = np.diff(unique_values).min() if len(unique_values) > 1 else 1.0
+        rng = np.random.default_rng(zlib.crc32(column.encode()))
+        values = values + rng.uniform(-0.35 * gap, 0.35 * gap, len(values))
 
-    if axes_choice == "tsne_all":
-        df = plotting_df[["Plant_Name", "all_tsne_1", "all_tsne_2"]]
-        df.columns = ["Plant_Name", "x", "y"]
+        cached = (features_df, plotting_df, values)
+        _feature_axes[column] = cached
 
-    elif axes_choice == "sunlight_water":
-        df = plotting_df[["Plant_Name",
-                          "Watering_jittered", "Sunlight_jittered"]]
-        df.columns = ["Plant_Name", "x", "y"]
+    return cached[2]
 
+
+def plotting_fingerprint(plotting_df: pd.DataFrame) -> str:
+    """
+    Hash of the plant names and the coordinates of the scatter graphs in AXES_COLUMNS (in row order).
+    Saved with tables made from the plotting table (e.g. sim_diff_lookup), so they can be ignored
+    once the plotting table is changed (e.g. by Database/embeddings.py or Database/place_new_plants.py).
+    """
+    columns = ["Plant_Name"] + [column for axes in AXES_COLUMNS.values() for column in axes]
+    row_hashes = pd.util.hash_pandas_object(plotting_df[columns], index=False)
+    return hashlib.sha256(row_hashes.to_numpy().tobytes()).hexdigest()
+
+
+def get_scatter_index(plotting_df: pd.DataFrame, axes_choice: str,
+                      features_df: pd.DataFrame = None) -> "ScatterIndex":
+    """
+    Return the spatial index for a scatter graph, building it if not done already
+    (or if a different plotting_df/features_df is given).
+    For the axes choices in AXES_COLUMNS, the coordinates come from plotting_df, otherwise
+    the axes choice is two plant_features columns and the coordinates come from features_df.
+    """
+    if CUSTOM_AXES_SEPARATOR in axes_choice:
+        x_column, y_column = axes_choice.split(CUSTOM_AXES_SEPARATOR)
+        key = ("plant_features", x_column, y_column)
     else:
-        df = plotting_df[[
-            "Plant_Name", "Max_Spread_Capped_jittered", "Max_Height_Capped_jittered"]]
-        df.columns = ["Plant_Name", "x", "y"]
-
-    # determine values for the plant target.
-    target_index = df.loc[df["Plant_Name"] == selected_plant].index.values[0]
-    x_target = df.loc[df["Plant_Name"] == selected_plant]["x"].values[0]
-    y_target = df.loc[df["Plant_Name"] == selected_plant]["y"].values[0]
-
-    # determine magnitude of diff for each plant and find the smallest and largest.
-    diffs = abs(df["x"] - x_target) + abs(df["y"] - y_target)
-    # taking 4 as searched plant will be one of them...
-    most_similar = diffs.nsmallest(n=4).index.values
-    most_different = diffs.nlargest(n=3).index.values
-
-    # Counting deals with possible issue that the target plant may not be one of the top 4 plants
-    # (if several plants have a delta of 0).
-    i = 0
-    similar_names = []
-    for idx in most_similar:
-        if idx != target_index:
-            i = + 1
-            similar_names.append(df.iloc[idx]["Plant_Name"])
-        if i == 3:
-            break
+        x_column, y_column = AXES_COLUMNS.get(axes_choice, AXES_COLUMNS["heights_spreads"])
+        key = ("plotting", x_column, y_column)
+
+    cached = _scatter_indexes.get(key)
+    if cached is None or cached[0] is not plotting_df or cached[1] is not features_df:
+        if key[0] == "plant_features":
+            x = get_feature_axis(features_df=features_df, plotting_df=plotting_df, column=x_column)
+            y = get_feature_axis(features_df=features_df, plotting_df=plotting_df, column=y_column)
+        else:
+            x, y = plotting_df[x_column].values, plotting_df[y_column].values
+
+        scatter_index = ScatterIndex(names=plotting_df["Plant_Name"].values, x=x, y=y)
+        cached = (plotting_df, features_df, scatter_index)
+        _scatter_indexes[key] = cached
+
+    return cached[2]
+
+
+class ScatterIndex:
+    """
+    Spatial index over the points of a scatter graph, for exact k-nearest and
+    k-farthest queries with the manhattan distance.
+
+    Nearest: Points are bucketed into a uniform grid (~2 points per cell), a query searches
+    rings of cells around the target until no unsearched cell can hold a closer point.
+
+    Farthest: The manhattan distance to the target is the largest of the 4 projections
+    (+/-x +/-y) minus that of the target, so the k farthest points are always among the
+    top k points of one of the 4 projections. These orders are sorted once, each query
+    then only checks those few candidates.
+
+    Ties (equal distances) are resolved by the row order, lowest index first.
+    The target point itself is never returned.
+    """
+
+    def __init__(self, names: np.ndarray, x: np.ndarray, y: np.ndarray):
+        self.names = np.asarray(names, dtype=object)
+        self.coords = np.column_stack([x, y]).astype(float)
+        n_points = len(self.coords)
+        row_idxs = np.arange(n_points)
+
+        # first row for each name, same as searching the df for the name.
+        self.name_to_index = {}
+        for idx, name in enumerate(self.names):
+            self.name_to_index.setdefault(name, idx)
+
+        # grid with ~2 points per cell.
+        self.n_cells = max(1, int(np.ceil(np.sqrt(n_points / 2))))
+        self.grid_min = self.coords.min(axis=0) if n_points else np.zeros(2)
+        span = (self.coords.max(axis=0) - self.grid_min) if n_points else np.zeros(2)
+        self.cell_size = np.where(span > 0, span / self.n_cells, 1.0)
+
+        cells = self._cell_of(self.coords)
+        cell_ids = cells[:, 0] * self.n_cells + cells[:, 1]
+        self.cell_order = np.argsort(cell_ids, kind="stable")
+        self.cell_starts = np.searchsorted(
+            cell_ids[self.cell_order], np.arange(self.n_cells ** 2 + 1))
+
+        # each of the 4 projections sorted from largest to smallest (ties by row order).
+        self.projection_orders = []
+        for sign_x, sign_y in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
+            projection = sign_x * self.coords[:, 0] + sign_y * self.coords[:, 1]
+            self.projection_orders.append(np.lexsort((row_idxs, -projection)))
+
+    def _cell_of(self, coords: np.ndarray) -> np.ndarray:
+        """Grid cell (column, row) for each point."""
+        cells = np.floor((coords - self.grid_min) / self.cell_size).astype(int)
+        return np.clip(cells, 0, self.n_cells - 1)
+
+    def _distances(self, target_index: int, idxs: np.ndarray) -> np.ndarray:
+        """Manhattan distance from the target to each point requested."""
+        deltas = np.abs(self.coords[idxs] - self.coords[target_index])
+        return deltas[:, 0] + deltas[:, 1]
+
+    def _ring(self, cell: np.ndarray, radius: int) -> np.ndarray:
+        """Row indexes of all points in cells exactly "radius" cells away from the given cell."""
+        lows = np.maximum(cell - radius, 0)
+        highs = np.minimum(cell + radius, self.n_cells - 1)
+
+        idxs = []
+        for cell_x in range(lows[0], highs[0] + 1):
+            on_edge = abs(cell_x - cell[0]) == radius
+            # middle columns only have the top and bottom cell in the ring.
+            cell_ys = range(lows[1], highs[1] + 1) if on_edge else \
+                {cell[1] - radius, cell[1] + radius} & set(range(lows[1], highs[1] + 1))
+            for cell_y in cell_ys:
+                cell_id = cell_x * self.n_cells + cell_y
+                idxs.append(self.cell_order[self.cell_starts[cell_id]:self.cell_starts[cell_id + 1]])
+
+        return np.concatenate(idxs) if idxs else np.array([], dtype=int)
+
+    def nearest(self, target_index: int, k: int) -> np.ndarray:
+        """
+        Row indexes of the k points closest to the target point, closest first.
+        """
+        cell = self._cell_of(self.coords[target_index][None, :])[0]
+        min_cell_size = self.cell_size.min()
+
+        candidates = []
+        radius = 0
+        while radius <= self.n_cells:
+            candidates.append(self._ring(cell, radius))
+            found = np.concatenate(candidates)
+            found = found[found != target_index]
+
+            if len(found) >= k:
+                kth_distance = np.sort(self._distances(target_index, found))[k - 1]
+                # any point in a cell further out is at least this far away.
+                if kth_distance < radius * min_cell_size:
+                    break
+            radius += 1
+
+        found = np.concatenate(candidates)
+        found = found[found != target_index]
+        distances = self._distances(target_index, found)
+        return found[np.lexsort((found, distances))][:k]
+
+    def farthest(self, target_index: int, k: int) -> np.ndarray:
+        """
+        Row indexes of the k points furthest from the target point, furthest first.
+        """
+        # a few extra per projection to be safe with ties and rounding.
+        n_take = 2 * (k + 1)
+        found = np.unique(np.concatenate(
+            [order[:n_take] for order in self.projection_orders]))
+        found = found[found != target_index]
+        distances = self._distances(target_index, found)
+        return found[np.lexsort((found, -distances))][:k]
+
+    def within_box(self, x_range: list, y_range: list) -> np.ndarray:
+        """
+        Row indexes (in order) of all points inside a rectangle (e.g. a box selection).
+        Only the grid cells overlapping the rectangle are checked.
+        """
+        if len(self.coords) == 0:
+            return np.array([], dtype=int)
+
+        lows = np.array([min(x_range), min(y_range)], dtype=float)
+        highs = np.array([max(x_range), max(y_range)], dtype=float)
+        low_cell, high_cell = self._cell_of(np.vstack([lows, highs]))
+
+        candidates = []
+        for cell_x in range(low_cell[0], high_cell[0] + 1):
+            first_id = cell_x * self.n_cells + low_cell[1]
+            last_id = cell_x * self.n_cells + high_cell[1]
+            # cells in the same column are next to each other in cell_order.
+            candidates.append(
+                self.cell_order[self.cell_starts[first_id]:self.cell_starts[last_id + 1]])
+        candidates = np.concatenate(candidates)
+
+        coords = self.coords[candidates]
+        inside = np.all((coords >= lows) & (coords <= highs), axis=1)
+        return np.sort(candidates[inside])
+
+    def within_polygon(self, xs: list, ys: list) -> np.ndarray:
+        """
+        Row indexes (in order) of all points inside a polygon (e.g. a lasso selection).
+        Points in the polygon's bounding box are found with within_box and then ray casting is
+        used to check which are inside.
+        """
+        xs, ys = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+        candidates = self.within_box([xs.min(), xs.max()], [ys.min(), ys.max()])
+        point_xs, point_ys = self.coords[candidates, 0], self.coords[candidates, 1]
+
+        inside = np.zeros(len(candidates), dtype=bool)
+        for x_1, y_1, x_2, y_2 in zip(xs, ys, np.roll(xs, -1), np.roll(ys, -1)):
+            crosses = (y_1 > point_ys) != (y_2 > point_ys)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_cross = x_1 + (point_ys - y_1) * (x_2 - x_1) / (y_2 - y_1)
+            inside ^= crosses & (point_xs < x_cross)
+
+        return candidates[inside]
+
+
+def level_of_detail(scatter_index: ScatterIndex, x_range: Union[None, list], y_range: Union[None, list],
+                    max_points: int, n_bins: int) -> Tuple[np.ndarray, dict]:
+    """
+    Decide what to draw for the part of a scatter graph in view, so the amount of data sent to
+    the browser stays bounded however many plants there are.
+    If there are at most "max_points" plants in view, each is drawn. Otherwise the view is
+    split into a grid of n_bins x n_bins and one aggregated point is drawn per non-empty bin.
+
+    Parameters
+    ----------
+    scatter_index : ScatterIndex
+        Spatial index of the scatter graph.
+
+    x_range, y_range : Union[None, list]
+        [min, max] of each axis currently in view. None for the whole graph.
+
+    max_points : int
+        Max number of individual plants to draw.
+
+    n_bins : int
+        Number of bins along each axis if aggregating.
 
-    different_names = [df.iloc[idx]["Plant_Name"] for idx in most_different]
+    Returns
+    ----------
+    np.ndarray
+        Row indexes of the plants to draw individually (empty if aggregating).
+
+    dict[str, np.ndarray]
+        Aggregated bins (empty if not aggregating). Keys are: "x" and "y" (mean position of
+        the plants in each bin), "count" and "row_idxs" (row indexes of the plants in each bin).
+    """
+    coords = scatter_index.coords
+    if x_range is None or y_range is None:
+        in_view = np.arange(len(coords))
+    else:
+        in_view = scatter_index.within_box(x_range=x_range, y_range=y_range)
+
+    if len(in_view) <= max_points:
+        return in_view, {}
+
+    view_coords = coords[in_view]
+    lows = view_coords.min(axis=0)
+    span = view_coords.max(axis=0) - lows
+    bin_size = np.where(span > 0, span / n_bins, 1.0)
+    bin_cells = np.clip(np.floor((view_coords - lows) / bin_size).astype(int), 0, n_bins - 1)
+    bin_ids = bin_cells[:, 0] * n_bins + bin_cells[:, 1]
 
-    return similar_names + different_names
+    counts = np.bincount(bin_ids, minlength=n_bins ** 2)
+    occupied = np.nonzero(counts)[0]
+    sums_x = np.bincount(bin_ids, weights=view_coords[:, 0], minlength=n_bins ** 2)
+    sums_y = np.bincount(bin_ids, weights=view_coords[:, 1], minlength=n_bins ** 2)
+
+    order = np.argsort(bin_ids, kind="stable")
+    row_idxs = np.split(in_view[order], np.cumsum(counts)[:-1])
+
+    bins = {
+        "x": sums_x[occupied] / counts[occupied],
+        "y": sums_y[occupied] / counts[occupied],
+        "count": counts[occupied],
+        "row_idxs": [row_idxs[bin_id] for bin_id in occupied],
+    }
+    return np.array([], dtype=int), bins
+
+
+def build_feature_codes(plant_df: pd.DataFrame, plotting_df: pd.DataFrame) -> dict:
+    """
+    Convert the plant details used in the scatter graph selection summaries into integer codes,
+    in the same row order as plotting_df (and so the same as the ScatterIndex row indexes).
+    Done once, so summarising a selection is just counting codes.
+
+    Parameters
+    ----------
+    plant_df : pd.DataFrame
+        Contains basic info about each plant (e.g. sunlight, watering etc..)
+
+    plotting_df: pd.DataFrame
+        Contains axis values for the possible scatter plots that can be made.
+
+    Returns
+    ----------
+    dict[str, tuple]
+        Keys are the summary labels, values are a tuple of the integer code for each plant
+        and the list of category names (a code is the position in this list).
+    """
+    details = plant_df.set_index("Plant_Name").reindex(plotting_df["Plant_Name"])
+
+    feature_codes = {}
+    for label, column in [("Maintenance", "Maintenance"), ("Sunlight", "Sunlight"),
+                          ("Watering", "Watering"), ("Plant Type", "Plant_Type")]:
+        codes, categories = pd.factorize(details[column].fillna("None"), sort=True)
+        feature_codes[label] = (codes, list(categories))
+
+    return feature_codes
+
+
+def summarise_selection(selected_idxs: np.ndarray, names: np.ndarray, feature_codes: dict,
+                        page: int = 1, page_size: int = 10) -> dict:
+    """
+    Summary statistics and a page of plant names for the plants selected on a scatter graph.
+
+    Parameters
+    ----------
+    selected_idxs : np.ndarray
+        Row indexes of the selected plants (see: ScatterIndex.within_box/within_polygon).
+
+    names : np.ndarray
+        Plant names, in the same row order.
+
+    feature_codes : dict
+        Output of build_feature_codes.
+
+    page : int
+        Page of the plant names to return, starting from 1.
+
+    page_size : int
+        Number of plant names per page.
+
+    Returns
+    ----------
+    dict
+        "count": number of plants selected, "breakdowns": dict of how many plants are in each
+        category for each label in feature_codes (largest first), "plants": the page of plant names
+        (alphabetical order), "page" and "n_pages".
+    """
+    breakdowns = {}
+    for label, (codes, categories) in feature_codes.items():
+        counts = np.bincount(codes[selected_idxs], minlength=len(categories))
+        order = np.argsort(-counts, kind="stable")
+        breakdowns[label] = {categories[idx]: int(counts[idx]) for idx in order if counts[idx] > 0}
+
+    n_pages = max(1, int(np.ceil(len(selected_idxs) / page_size)))
+    page = min(max(1, page), n_pages)
+    selected_names = np.sort(names[selected_idxs].astype(str))
+
+    return {
+        "count": int(len(selected_idxs)),
+        "breakdowns": breakdowns,
+        "plants": list(selected_names[(page - 1) * page_size:page * page_size]),
+        "page": page,
+        "n_pages": n_pages,
+    }
 
 
 def recommend_plants(plant_df: pd.DataFrame, plants_selected: Union[str, list], cosine_sim: np.ndarray) -> list:
@@ -236,3 +644,35 @@ def _plant_recommend_scores(plant_df: pd.DataFrame, plant_name: str, cosine_sim:
     # matches are already ordered from best to worst.
     matches = {idxs[i]: scores[i] for i in range(len(idxs))}
     return search_idx, matches
+
+
+class CosineRows:
+    """
+    Stands in for the cosine similarity matrix of a catalog too large to hold the full matrix
+    (100k plants is 80GB), each row is worked out when it is indexed (cosine_sim[idx]),
+    which is all recommend_plants needs.
+    The features are scaled the same way as Database/generate_cosine_sim.py.
+
+    Parameters
+    ----------
+    feature_array : np.ndarray
+        Features of each plant (plant_features table without the Plant_Name column),
+        in the same row order as plant_raw_data.
+    """
+
+    def __init__(self, feature_array: np.ndarray):
+        feature_array = np.asarray(feature_array, dtype=float)
+        mins = feature_array.min(axis=0)
+        spans = feature_array.max(axis=0) - mins
+        spans[spans == 0] = 1.0
+        features_scaled = (feature_array - mins) / spans
+
+        norms = np.linalg.norm(features_scaled, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.features_normed = features_scaled / norms
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        return self.features_normed @ self.features_normed[idx]
+
+    def __len__(self) -> int:
+        return len(self.features_normed)